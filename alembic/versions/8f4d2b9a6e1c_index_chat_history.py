@@ -0,0 +1,40 @@
+"""Index chat history by user and timestamp
+
+Revision ID: 8f4d2b9a6e1c
+Revises: c3bedb61262e
+Create Date: 2026-10-17 02:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f4d2b9a6e1c'
+down_revision: Union[str, None] = 'c3bedb61262e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = 'ix_chatbot_interactions_user_id_timestamp'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Built concurrently on Postgres so chat requests keep writing during the build,
+    # which cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            INDEX_NAME,
+            'chatbot_interactions',
+            ['user_id', sa.text('"timestamp" DESC'), sa.text('id DESC')],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(INDEX_NAME, table_name='chatbot_interactions', postgresql_concurrently=True)
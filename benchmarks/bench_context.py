@@ -0,0 +1,114 @@
+"""
+Context packing benchmark.
+
+Retrieves chunks for every question in the fixed set and compares the prompt sent to
+the LLM with the full chunks against the packed context:
+- prompt tokens per request (mean/p95) and packing time
+- whether the expected page still contributes to the packed context
+- with --with-llm: LLM latency for both prompts and answer quality, measured as the
+  cosine similarity of the packed-context answer to the full-context answer
+
+Usage (needs the index built by `python -m rag.ingest`):
+    python -m benchmarks.bench_context --budget 512 768 1024 --with-llm
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+from llama_index.core import Settings
+from llama_index.core.schema import MetadataMode
+
+from benchmarks.questions import QUESTIONS, is_hit
+from rag.memory import count_tokens
+from rag.postprocessors import ContextPackingPostprocessor
+from rag.prompts import TEXT_QA_TEMPLATE
+from rag.query_engine import SIMILARITY_TOP_K, configure_settings, load_index
+
+
+def node_source(node_with_score) -> str:
+    node = node_with_score.node
+    return node.metadata.get("url") or node.ref_doc_id or ""
+
+
+def prompt_messages(nodes: list, question: str) -> list:
+    context = "\n\n".join(n.node.get_content(metadata_mode=MetadataMode.LLM) for n in nodes)
+    return TEXT_QA_TEMPLATE.format_messages(context_str=context, query_str=question)
+
+
+def prompt_tokens(messages: list) -> int:
+    return sum(count_tokens(message.content or "") for message in messages)
+
+
+def answer(messages: list) -> tuple:
+    start = time.perf_counter()
+    text = str(Settings.llm.chat(messages).message.content)
+    return text, (time.perf_counter() - start) * 1000
+
+
+def cosine(a: str, b: str) -> float:
+    x, y = (np.asarray(Settings.embed_model.get_text_embedding(text)) for text in (a, b))
+    return float(x @ y / (np.linalg.norm(x) * np.linalg.norm(y)))
+
+
+def summary(values: list) -> tuple:
+    values = sorted(values)
+    return statistics.mean(values), values[int(0.95 * (len(values) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure prompt tokens and answer quality with context packing")
+    parser.add_argument("--budget", type=int, nargs="+", default=[512, 768, 1024])
+    parser.add_argument("--with-llm", action="store_true", help="Also answer every question and compare answers")
+    args = parser.parse_args()
+
+    embed_model = configure_settings()
+    retriever = load_index(embed_model=embed_model).as_retriever(similarity_top_k=SIMILARITY_TOP_K)
+    retrieved = [(item, retriever.retrieve(item["question"])) for item in QUESTIONS]
+
+    full_tokens, full_answers, full_latency = [], [], []
+    for item, nodes in retrieved:
+        messages = prompt_messages(nodes, item["question"])
+        full_tokens.append(prompt_tokens(messages))
+        if args.with_llm:
+            text, elapsed = answer(messages)
+            full_answers.append(text)
+            full_latency.append(elapsed)
+
+    header = f"{'budget':<8}{'tokens':>9}{'p95':>7}{'saved':>8}{'pack ms':>9}{'hit':>6}"
+    if args.with_llm:
+        header += f"{'llm ms':>9}{'answer cos':>12}"
+    print(header)
+    mean_tokens, p95_tokens = summary(full_tokens)
+    row = f"{'full':<8}{mean_tokens:>9.0f}{p95_tokens:>7.0f}{'':>8}{'':>9}"
+    row += f"{sum(any(is_hit(node_source(n), item['expected']) for n in nodes) for item, nodes in retrieved) / len(QUESTIONS):>6.2f}"
+    if args.with_llm:
+        row += f"{statistics.mean(full_latency):>9.0f}{1.0:>12.3f}"
+    print(row)
+
+    for budget in args.budget:
+        packer = ContextPackingPostprocessor(token_budget=budget)
+        tokens, pack_ms, hits, latencies, similarities = [], [], 0, [], []
+        for position, (item, nodes) in enumerate(retrieved):
+            start = time.perf_counter()
+            packed = packer.postprocess_nodes(nodes, query_str=item["question"])
+            pack_ms.append((time.perf_counter() - start) * 1000)
+            hits += any(is_hit(node_source(n), item["expected"]) for n in packed)
+            messages = prompt_messages(packed, item["question"])
+            tokens.append(prompt_tokens(messages))
+            if args.with_llm:
+                text, elapsed = answer(messages)
+                latencies.append(elapsed)
+                similarities.append(cosine(full_answers[position], text))
+
+        mean_tokens, p95_tokens = summary(tokens)
+        saved = 1 - sum(tokens) / sum(full_tokens)
+        row = f"{budget:<8}{mean_tokens:>9.0f}{p95_tokens:>7.0f}{saved:>8.0%}{statistics.mean(pack_ms):>9.1f}{hits / len(QUESTIONS):>6.2f}"
+        if args.with_llm:
+            row += f"{statistics.mean(latencies):>9.0f}{statistics.mean(similarities):>12.3f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Crawler benchmark against a local HTTP fixture site.
+
+Serves a generated docs-like site (every page links to a shared sidebar plus a few
+neighbours, with trailing-slash and fragment variants) from a local threaded HTTP
+server that adds a fixed per-request latency, then crawls it at several concurrency
+levels. Concurrency 1 matches the old sequential crawler.
+
+Usage:
+    python -m benchmarks.bench_crawler --pages 300 --latency-ms 20
+"""
+
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+from rag.crawler import crawl_website
+
+
+def make_handler(pages: int, latency: float):
+    sidebar = "".join(f'<a href="/docs/page{i}/">Page {i}</a>' for i in range(0, pages, max(1, pages // 50)))
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency)
+            if self.path == "/robots.txt":
+                body, content_type = b"User-agent: *\nDisallow: /private\n", "text/plain"
+            elif self.path == "/sitemap.xml":
+                self.send_response(404)
+                self.end_headers()
+                return
+            else:
+                try:
+                    number = int(self.path.strip("/").split("page")[-1] or 0)
+                except ValueError:
+                    number = 0
+                neighbours = "".join(
+                    f'<a href="/docs/page{(number + step) % pages}#section">next</a>' for step in (1, 2, 7)
+                )
+                body = f"<html><body><nav>{sidebar}</nav><main>Page {number}{neighbours}</main></body></html>".encode()
+                content_type = "text/html; charset=utf-8"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return FixtureHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the crawler against a local fixture site")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.pages, args.latency_ms / 1000))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    start_url = f"http://127.0.0.1:{server.server_address[1]}/docs/page0"
+
+    try:
+        print(f"{'concurrency':>12}{'pages':>8}{'seconds':>10}{'pages/s':>10}")
+        for concurrency in args.concurrency:
+            start = time.perf_counter()
+            links = crawl_website(start_url, concurrency=concurrency, max_pages=args.pages * 2)
+            elapsed = time.perf_counter() - start
+            print(f"{concurrency:>12}{len(links):>8}{elapsed:>10.2f}{len(links) / elapsed:>10.1f}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Embedding backend parity, latency and memory benchmark.
+
+Compares the ONNX backend (fp32 and int8) against the torch backend:
+- parity: cosine similarity between backends on the question set and indexed chunks;
+  exits non-zero when the minimum falls below --min-cosine
+- latency: single-query embedding (mean/p95) and batch throughput
+- memory: peak RSS of a fresh process that loads each backend and embeds one query
+
+Usage (export the ONNX model first with `python -m rag.embeddings export`):
+    python -m benchmarks.bench_embeddings --threads 4
+"""
+
+import argparse
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.questions import QUESTIONS
+from rag.bm25 import get_sparse_index
+from rag.embeddings import OnnxEmbedding, build_torch_embed_model
+
+
+def as_embed_fn(model):
+    """Query/batch embedding functions for either a llama_index or a LangChain model"""
+    if hasattr(model, "get_query_embedding"):
+        return model.get_query_embedding, model.get_text_embedding_batch
+    return model.embed_query, model.embed_documents
+
+
+def sample_texts(limit: int) -> list:
+    texts = [item["question"] for item in QUESTIONS]
+    sparse_index = get_sparse_index()
+    if sparse_index is not None:
+        node_ids = sorted(sparse_index.records)[:limit]
+        texts += [sparse_index.get_node(node_id).get_content() for node_id in node_ids]
+    return texts
+
+
+def cosine_rows(a, b) -> np.ndarray:
+    a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+def latency(embed_query, embed_batch, queries: list, repeats: int, batch_size: int) -> dict:
+    embed_query(queries[0])  # Warm up
+    timings = []
+    for _ in range(repeats):
+        for query in queries:
+            start = time.perf_counter()
+            embed_query(query)
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    batch = (queries * batch_size)[:batch_size]
+    start = time.perf_counter()
+    embed_batch(batch)
+    return {
+        "mean_ms": statistics.mean(timings),
+        "p95_ms": timings[int(0.95 * (len(timings) - 1))],
+        "batch_per_s": batch_size / (time.perf_counter() - start),
+    }
+
+
+def build(backend: str, threads: int):
+    if backend == "torch":
+        return build_torch_embed_model(num_threads=threads)
+    return OnnxEmbedding(quantized=backend == "onnx-int8", num_threads=threads)
+
+
+def peak_rss_mb(backend: str, threads: int) -> float:
+    """Loads backend in a fresh interpreter so the numbers are not polluted by the other models"""
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_embeddings", "--memory-only", backend, "--threads", str(threads)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])["peak_rss_mb"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare torch and ONNX embedding backends")
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--chunks", type=int, default=200, help="Indexed chunks to include in the parity check")
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    parser.add_argument("--memory-only", choices=["torch", "onnx", "onnx-int8"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.memory_only:
+        embed_query, _ = as_embed_fn(build(args.memory_only, args.threads))
+        embed_query("How do I verify a BVN?")
+        print(json.dumps({"peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+        return
+
+    texts = sample_texts(args.chunks)
+    queries = [item["question"] for item in QUESTIONS]
+    backends = ["torch", "onnx", "onnx-int8"]
+    embeddings, results = {}, {}
+    for backend in backends:
+        embed_query, embed_batch = as_embed_fn(build(backend, args.threads))
+        embeddings[backend] = embed_batch(texts)
+        results[backend] = latency(embed_query, embed_batch, queries, args.repeats, args.batch_size)
+        results[backend]["peak_rss_mb"] = peak_rss_mb(backend, args.threads)
+
+    print(f"{'backend':<11}{'cos mean':>10}{'cos min':>10}{'mean ms':>10}{'p95 ms':>9}{'batch/s':>10}{'RSS MB':>9}")
+    parity_ok = True
+    for backend in backends:
+        cosines = cosine_rows(embeddings["torch"], embeddings[backend])
+        parity_ok &= backend == "torch" or float(cosines.min()) >= args.min_cosine
+        result = results[backend]
+        print(
+            f"{backend:<11}{cosines.mean():>10.4f}{cosines.min():>10.4f}{result['mean_ms']:>10.1f}"
+            f"{result['p95_ms']:>9.1f}{result['batch_per_s']:>10.1f}{result['peak_rss_mb']:>9.0f}"
+        )
+
+    if not parity_ok:
+        print(f"FAIL: an ONNX backend is below the minimum cosine similarity of {args.min_cosine} to torch")
+        sys.exit(1)
+    print(f"OK: ONNX backends match torch to at least {args.min_cosine} cosine similarity on {len(texts)} texts")
+
+
+if __name__ == "__main__":
+    main()
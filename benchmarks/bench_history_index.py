@@ -0,0 +1,137 @@
+"""
+Chat history index benchmark.
+
+Seeds chatbot_interactions with --rows rows spread over --users users, then times
+the history queries the API runs, first without and then with the
+(user_id, timestamp DESC, id DESC) index:
+- recent turns: `load_history`, run on every /chatbot/ request
+- history page: the keyset page of /chatbot/history/ (keys, then the projected rows)
+- older page: the same page from a cursor halfway through a user's history
+
+Uses SQLite in a scratch directory unless --database-url points at a local Postgres;
+the tables are created there and dropped again at the end.
+
+Usage:
+    python -m benchmarks.bench_history_index --rows 1000000 --users 1000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+SEED_BATCH_SIZE = 10000
+
+
+def seed(engine, rows: int, users: int, response_chars: int) -> tuple:
+    """
+    Bulk-inserts users and interactions with one-second spaced timestamps; returns the
+    user ids and the timestamp halfway through the seeded history
+    """
+    from models.models import ChatbotInteraction, User, utc_now
+
+    user_ids = [str(uuid4()) for _ in range(users)]
+    now = utc_now()
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {"id": user_id, "first_name": "Bench", "last_name": "User", "email": f"{user_id}@example.com",
+             "password": "x", "role": "STAFF", "is_active": True, "is_superuser": False, "is_verified": False}
+            for user_id in user_ids
+        ])
+    start = now - timedelta(seconds=rows)
+    response = "x" * response_chars
+    for offset in range(0, rows, SEED_BATCH_SIZE):
+        with engine.begin() as connection:
+            connection.execute(ChatbotInteraction.__table__.insert(), [
+                {"id": str(uuid4()), "user_id": user_ids[i % users], "user_input": f"Question {i}",
+                 "response": response, "timestamp": start + timedelta(seconds=i)}
+                for i in range(offset, min(offset + SEED_BATCH_SIZE, rows))
+            ])
+    return user_ids, start + timedelta(seconds=rows // 2)
+
+
+async def time_queries(session_factory, user_ids: list, middle: datetime, samples: int) -> dict:
+    from routers.chatbot import HISTORY_FIELDS, history_page_keys, load_history, load_history_rows
+
+    timings: dict = {"recent turns": [], "history page": [], "older page": []}
+    async with session_factory() as db:
+        for _ in range(samples):
+            user_id = random.choice(user_ids)
+
+            start = time.perf_counter()
+            await load_history(db, user_id)
+            timings["recent turns"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            keys, _ = await history_page_keys(db, user_id, 20, None, None)
+            await load_history_rows(db, keys, list(HISTORY_FIELDS))
+            timings["history page"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            keys, _ = await history_page_keys(db, user_id, 20, (middle, ""), None)
+            await load_history_rows(db, keys, list(HISTORY_FIELDS))
+            timings["older page"].append(time.perf_counter() - start)
+
+    results = {}
+    for name, values in timings.items():
+        values.sort()
+        results[name] = (statistics.median(values) * 1000, values[int(0.95 * (len(values) - 1))] * 1000)
+    return results
+
+
+async def compare_phases(history_index, user_ids: list, middle: datetime, samples: int) -> dict:
+    """Times the queries without the history index, builds it, then times them again"""
+    from config.database import AsyncSessionLocal, engine
+
+    phases = {"no index": await time_queries(AsyncSessionLocal, user_ids, middle, samples)}
+    start = time.perf_counter()
+    await asyncio.to_thread(history_index.create, bind=engine)
+    print(f"Built the history index in {time.perf_counter() - start:.1f}s")
+    phases["with index"] = await time_queries(AsyncSessionLocal, user_ids, middle, samples)
+    return phases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time chat history queries with and without the history index")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--response-chars", type=int, default=200)
+    parser.add_argument("--samples", type=int, default=200, help="Timed lookups per query and phase")
+    parser.add_argument("--database-url", help="Defaults to SQLite in a scratch directory")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="history-bench-") as workdir:
+        # Must be set before the app's database module is imported
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'history.sqlite3')}"
+        from config.database import engine
+        from models.models import Base, ChatbotInteraction
+
+        history_index = next(
+            index for index in ChatbotInteraction.__table__.indexes if index.name == "ix_chatbot_interactions_user_id_timestamp"
+        )
+        Base.metadata.create_all(bind=engine)
+        history_index.drop(bind=engine)
+        try:
+            start = time.perf_counter()
+            user_ids, middle = seed(engine, args.rows, args.users, args.response_chars)
+            print(f"Seeded {args.rows} rows for {args.users} users in {time.perf_counter() - start:.1f}s")
+
+            phases = asyncio.run(compare_phases(history_index, user_ids, middle, args.samples))
+        finally:
+            if args.database_url:
+                Base.metadata.drop_all(bind=engine)
+
+    print(f"{'query':<15}{'phase':<12}{'p50 ms':>10}{'p95 ms':>10}")
+    for query in phases["no index"]:
+        for phase, results in phases.items():
+            p50, p95 = results[query]
+            print(f"{query:<15}{phase:<12}{p50:>10.2f}{p95:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Dense vs hybrid (BM25 + dense, reciprocal rank fusion) retrieval benchmark.
+
+Reports recall@k and retrieval latency on the fixed question set for several
+values of k, to pick the smallest SIMILARITY_TOP_K that keeps recall.
+
+Usage (needs the index and BM25 index built by `python -m rag.ingest`):
+    python -m benchmarks.bench_hybrid --top-k 1 2 3 5
+"""
+
+import argparse
+import statistics
+import time
+
+from benchmarks.questions import QUESTIONS, is_hit
+from rag.bm25 import get_sparse_index
+from rag.query_engine import HYBRID_CANDIDATES, configure_settings, load_index
+from rag.retrievers import HybridRetriever
+
+
+def node_source(node_with_score) -> str:
+    node = node_with_score.node
+    return node.metadata.get("url") or node.ref_doc_id or ""
+
+
+def run(retriever) -> dict:
+    hits, latencies = 0, []
+    for item in QUESTIONS:
+        start = time.perf_counter()
+        nodes = retriever.retrieve(item["question"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += any(is_hit(node_source(n), item["expected"]) for n in nodes)
+    latencies.sort()
+    return {
+        "recall": hits / len(QUESTIONS),
+        "mean_ms": statistics.mean(latencies),
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare dense and hybrid retrieval recall@k and latency")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 2, 3, 5])
+    parser.add_argument("--candidates", type=int, default=HYBRID_CANDIDATES,
+                        help="Results taken from each retriever before fusion")
+    args = parser.parse_args()
+
+    embed_model = configure_settings()
+    index = load_index(embed_model=embed_model)
+    sparse_index = get_sparse_index()
+    if sparse_index is None:
+        raise SystemExit("No BM25 index found, run `python -m rag.ingest` first")
+
+    print(f"{'retriever':<10}{'k':>4}{'recall@k':>10}{'mean ms':>10}{'p95 ms':>10}")
+    for top_k in args.top_k:
+        retrievers = {
+            "dense": index.as_retriever(similarity_top_k=top_k),
+            "hybrid": HybridRetriever(
+                index.as_retriever(similarity_top_k=max(args.candidates, top_k)),
+                sparse_index,
+                top_k=top_k,
+                candidate_k=max(args.candidates, top_k),
+            ),
+        }
+        for name, retriever in retrievers.items():
+            result = run(retriever)
+            print(f"{name:<10}{top_k:>4}{result['recall']:>10.2f}{result['mean_ms']:>10.1f}{result['p95_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
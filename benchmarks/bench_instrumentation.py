@@ -0,0 +1,137 @@
+"""
+Instrumentation overhead check.
+
+Measures what the metrics add to one /chatbot/ request, in two parts:
+- the auth, chatbot and retrieve/synthesize stage timers, replayed on histograms that
+  mirror the ones in routers/ and rag/query_engine.py (so no database is needed)
+- the node postprocessing stages, run through the real `TimedQueryEngine` with the
+  context packer on two fixture pages, against calling the packer directly. The pack
+  itself is computed once and replayed, since its ~1 ms of identical work on both
+  sides would only add noise to a difference of a few microseconds
+
+Chat token counts are taken off the request path, so only their `observe` calls are
+replayed. Exits non-zero when the added time per request exceeds --max-us, so it can
+gate CI.
+
+Usage:
+    python -m benchmarks.bench_instrumentation --requests 20000 --max-us 50
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from contextlib import nullcontext
+
+from dependencies.metrics import Histogram, render_metrics, traced_stage
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "docs.json")
+FIXTURE_QUESTION = "How do I verify a customer's BVN and what does the response contain?"
+
+AUTH_STAGE_SECONDS = Histogram("bench_auth_stage_seconds", "auth_stage_seconds", labelnames=("stage",))
+CHATBOT_STAGE_SECONDS = Histogram("bench_chatbot_stage_seconds", "chatbot_stage_seconds", labelnames=("stage",))
+QUERY_STAGE_SECONDS = Histogram("bench_rag_query_stage_seconds", "rag_query_stage_seconds", labelnames=("stage",))
+CHATBOT_TOKENS = Histogram("bench_chatbot_tokens", "chatbot_tokens", labelnames=("kind",), buckets=(16, 64, 256, 1024))
+
+# Postprocessor stages are timed by the real engine below
+REQUEST_STAGES = (
+    [(AUTH_STAGE_SECONDS, stage) for stage in ("jwt_decode", "user_lookup")]
+    + [(CHATBOT_STAGE_SECONDS, stage) for stage in ("history", "condense", "cache_lookup", "query", "cache_store", "commit")]
+    + [(QUERY_STAGE_SECONDS, stage) for stage in ("retrieve", "synthesize")]
+)
+
+
+def instrumented_request():
+    for histogram, stage in REQUEST_STAGES:
+        with traced_stage(histogram, stage):
+            pass
+    CHATBOT_TOKENS.observe(12, kind="question")
+    CHATBOT_TOKENS.observe(180, kind="response")
+
+
+def bare_request():
+    for _ in REQUEST_STAGES:
+        with nullcontext():
+            pass
+
+
+def postprocessing_pair():
+    """(instrumented, bare) callables applying the context packer's result on two fixture pages"""
+    from llama_index.core import get_response_synthesizer
+    from llama_index.core.llms import MockLLM
+    from llama_index.core.retrievers import BaseRetriever
+    from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+    from rag.postprocessors import CONTEXT_TOKEN_BUDGET, ContextPackingPostprocessor
+    from rag.query_engine import TimedQueryEngine
+
+    class NoRetriever(BaseRetriever):
+        def _retrieve(self, query_bundle):
+            return []
+
+    with open(FIXTURE_PATH) as f:
+        pages = {page["url"].rsplit("/", 1)[-1]: page for page in json.load(f)}
+    nodes = [
+        NodeWithScore(node=TextNode(text=pages[name]["text"], metadata={"url": pages[name]["url"]}), score=1.0 / (rank + 1))
+        for rank, name in enumerate(("bvnVerification", "ninVerification"))
+    ]
+    query_bundle = QueryBundle(FIXTURE_QUESTION)
+    packed = ContextPackingPostprocessor(token_budget=CONTEXT_TOKEN_BUDGET).pack(nodes, query_bundle)
+
+    class ReplayPacker(ContextPackingPostprocessor):
+        def pack(self, nodes, query_bundle=None):
+            return packed
+
+    packer = ReplayPacker(token_budget=CONTEXT_TOKEN_BUDGET)
+    engine = TimedQueryEngine(
+        NoRetriever(),
+        response_synthesizer=get_response_synthesizer(llm=MockLLM()),
+        node_postprocessors=[packer],
+    )
+    return (
+        lambda: engine._apply_node_postprocessors(nodes, query_bundle),
+        lambda: packer.pack(nodes, query_bundle)[0],
+    )
+
+
+def overhead_us(instrumented, bare, requests: int, batch: int = 1) -> tuple:
+    """Median per-request time of both paths, timed alternately so drift and caching hit them equally"""
+    instrumented_us, bare_us = [], []
+    for _ in range(requests // batch):
+        for fn, samples in ((instrumented, instrumented_us), (bare, bare_us)):
+            start = time.perf_counter()
+            for _ in range(batch):
+                fn()
+            samples.append((time.perf_counter() - start) / batch * 1e6)
+    return statistics.median(instrumented_us), statistics.median(bare_us)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the per-request cost of the metrics instrumentation")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--max-us", type=float, default=50.0, help="Allowed instrumentation overhead per request")
+    args = parser.parse_args()
+
+    stages, stages_bare = overhead_us(instrumented_request, bare_request, args.requests, batch=100)
+    engine, engine_bare = overhead_us(*postprocessing_pair(), args.requests, batch=100)
+    overhead = (stages - stages_bare) + (engine - engine_bare)
+
+    start = time.perf_counter()
+    body = render_metrics()
+    render_ms = (time.perf_counter() - start) * 1000
+
+    print(f"request stage timers:   {stages:.2f} us (uninstrumented {stages_bare:.2f} us)")
+    print(f"postprocessing:         {engine:.2f} us (uninstrumented {engine_bare:.2f} us)")
+    print(f"overhead per request:   {overhead:.2f} us (limit {args.max_us} us)")
+    print(f"/metrics render:        {render_ms:.2f} ms ({len(body)} bytes)")
+
+    if overhead > args.max_us:
+        print("FAIL: instrumentation overhead is above the limit")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""
+Offline end-to-end benchmark of the API.
+
+Runs the real `main.app` without Groq, Pinecone or a remote Postgres:
+- a deterministic fake LLM with configurable latency and token rate
+- a hashed bag-of-words embedding, the local vector store and a BM25 index built
+  from the fixture corpus in benchmarks/fixtures/docs.json
+- SQLite in a scratch directory, or any database given with --database-url
+
+It reports p50/p95/p99 latency and throughput for `/auth/login`, `/chatbot/` and
+`/chatbot/history/` (a full page, and a revalidation answered with 304) at each
+--concurrency and saves the results as JSON. A saved file can be compared with a
+later run via --compare. --seed-history gives every user that many past
+interactions, to check history latency stays flat as history grows.
+
+Usage:
+    python -m benchmarks.bench_offline --concurrency 1 8 32 --requests 200
+    python -m benchmarks.bench_offline --compare storage/benchmarks/offline-<commit>.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from itertools import count
+
+import httpx
+
+from benchmarks.load_test import percentile
+from benchmarks.questions import QUESTIONS
+
+FIXTURE_CORPUS = os.path.join(os.path.dirname(__file__), "fixtures", "docs.json")
+RESULTS_DIR = "storage/benchmarks"
+ENDPOINTS = ("login", "chatbot", "history", "history_304")
+PASSWORD = "offline-benchmark"
+
+
+def bench_environment(args, workdir: str) -> dict:
+    """Environment for the app under test; must be in place before any app module is imported"""
+    return {
+        "DATABASE_URL": args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.sqlite3')}",
+        "JWT_SECRET_KEY": "offline-benchmark",
+        "JWT_ALGORITHM": "HS256",
+        "VECTOR_STORE_BACKEND": "local",
+        "LOCAL_INDEX_DIR": os.path.join(workdir, "vector_index"),
+        "BM25_INDEX_PATH": os.path.join(workdir, "bm25_index.json.gz"),
+        "INDEX_MANIFEST_PATH": os.path.join(workdir, "index_manifest.json"),
+        "QUERY_EMBEDDING_CACHE_PATH": os.path.join(workdir, "query_embeddings.sqlite3"),
+        "ANSWER_CACHE_BACKEND": args.answer_cache,
+        "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "FAKE_LLM_TOKENS_PER_S": str(args.llm_tokens_per_s),
+        "FAKE_LLM_RESPONSE_TOKENS": str(args.llm_response_tokens),
+    }
+
+
+def build_fixture_index(corpus_path: str, copies: int):
+    """Chunks and embeds the fixture corpus into the local vector store and BM25 index"""
+    from llama_index.core import Document, VectorStoreIndex
+
+    from benchmarks.fakes import FakeLLM, HashEmbedding
+    from rag.bm25 import BM25_INDEX_PATH, BM25Index
+    from rag.extract import url_metadata
+    from rag.indexing import chunk_document
+    from rag.query_engine import LOCAL_INDEX_DIR, configure_settings, get_vector_store
+
+    with open(corpus_path) as f:
+        pages = json.load(f)
+    embed_model = configure_settings(llm=FakeLLM(), base_embed_model=HashEmbedding())
+    vector_store, _ = get_vector_store()
+    index = VectorStoreIndex.from_vector_store(vector_store=vector_store, embed_model=embed_model)
+    sparse_index = BM25Index()
+    for copy in range(copies):
+        for page in pages:
+            # Copies differ only in the query string, which keeps their metadata
+            url = page["url"] + (f"?copy={copy}" if copy else "")
+            nodes = chunk_document(Document(text=page["text"], id_=url, metadata=url_metadata(url)))
+            index.insert_nodes(nodes)
+            sparse_index.add(nodes)
+    vector_store.persist(LOCAL_INDEX_DIR)
+    sparse_index.save(BM25_INDEX_PATH)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_ready(client: httpx.AsyncClient, server: subprocess.Popen, timeout: float = 120.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"Server exited with code {server.returncode}")
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.25)
+    raise SystemExit("Server did not start in time")
+
+
+async def create_users(client: httpx.AsyncClient, number: int) -> list:
+    """Signs up `number` users and returns (email, bearer headers) pairs"""
+    run_id = int(time.time())
+    users = []
+    for i in range(number):
+        email = f"bench-{run_id}-{i}@example.com"
+        response = await client.post(
+            "/auth/signup",
+            json={"first_name": "Bench", "last_name": f"User{i}", "email": email, "password": PASSWORD},
+        )
+        response.raise_for_status()
+        response = await client.post("/auth/login", data={"username": email, "password": PASSWORD})
+        response.raise_for_status()
+        users.append((email, {"Authorization": f"Bearer {response.json()['access_token']}"}))
+    return users
+
+
+def seed_history(users: list, rows: int, response_chars: int = 2000):
+    """Inserts `rows` past interactions for every user directly into the database"""
+    from datetime import timedelta
+    from uuid import uuid4
+
+    from config.database import SessionLocal
+    from models.models import ChatbotInteraction, User, utc_now
+
+    db = SessionLocal()
+    try:
+        start = utc_now() - timedelta(seconds=rows)
+        for email, _ in users:
+            user_id = db.query(User.id).filter(User.email == email).scalar()
+            db.bulk_insert_mappings(ChatbotInteraction, [
+                {"id": str(uuid4()), "user_id": user_id, "user_input": f"Seeded question {i}",
+                 "response": "x" * response_chars, "timestamp": start + timedelta(seconds=i)}
+                for i in range(rows)
+            ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def request_factory(endpoint: str, client: httpx.AsyncClient, users: list):
+    """Returns a coroutine function issuing the i-th request of a run against endpoint"""
+    etags: dict = {}
+    async def login(i: int):
+        email, _ = users[i % len(users)]
+        return await client.post("/auth/login", data={"username": email, "password": PASSWORD})
+
+    async def chatbot(i: int):
+        _, headers = users[i % len(users)]
+        question = QUESTIONS[i % len(QUESTIONS)]["question"]
+        return await client.post("/chatbot/", json={"user_input": question}, headers=headers)
+
+    async def history(i: int):
+        _, headers = users[i % len(users)]
+        return await client.get("/chatbot/history/", headers=headers, params={"limit": 20})
+
+    async def history_304(i: int):
+        email, headers = users[i % len(users)]
+        if email not in etags:
+            etags[email] = (await history(i)).headers["ETag"]
+        return await client.get(
+            "/chatbot/history/", headers={**headers, "If-None-Match": etags[email]}, params={"limit": 20}
+        )
+
+    return {"login": login, "chatbot": chatbot, "history": history, "history_304": history_304}[endpoint]
+
+
+async def run_scenario(send, requests: int, concurrency: int) -> dict:
+    """Issues `requests` requests from `concurrency` workers and summarizes their latency"""
+    latencies, errors = [], 0
+    next_request = count()
+
+    async def worker():
+        nonlocal errors
+        while (i := next(next_request)) < requests:
+            start = time.perf_counter()
+            try:
+                response = await send(i)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+    }
+
+
+async def run_benchmarks(args, client: httpx.AsyncClient) -> dict:
+    users = await create_users(client, max(args.concurrency))
+    if args.seed_history:
+        seed_history(users, args.seed_history)
+    results: dict = {}
+    for endpoint in args.endpoints:
+        results[endpoint] = {}
+        for concurrency in args.concurrency:
+            send = request_factory(endpoint, client, users)
+            await run_scenario(send, min(args.warmup, args.requests), concurrency)
+            result = await run_scenario(send, args.requests, concurrency)
+            results[endpoint][str(concurrency)] = result
+            print(
+                f"{endpoint:<10}{concurrency:>6}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+                f"{result['p99_ms']:>10}{result['throughput_rps']:>10}{result['errors']:>8}"
+            )
+    return results
+
+
+async def run(args, env: dict) -> dict:
+    print(f"{'endpoint':<10}{'conc':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}")
+    if args.in_process:
+        # Client and app share one event loop: quicker to run, but less faithful under load
+        from benchmarks.offline_app import app
+
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://offline", timeout=120) as client:
+                return await run_benchmarks(args, client)
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.offline_app:app", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        env={**os.environ, **env},
+    )
+    try:
+        limits = httpx.Limits(max_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+            await wait_until_ready(client, server)
+            return await run_benchmarks(args, client)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline_path: str):
+    """Prints the change of each latency percentile and throughput against a saved run"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nChange vs {baseline_path} (commit {baseline.get('commit')}):")
+    print(f"{'endpoint':<10}{'conc':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}")
+    for endpoint, by_concurrency in results.items():
+        for concurrency, result in by_concurrency.items():
+            before = baseline["results"].get(endpoint, {}).get(concurrency)
+            if not before:
+                continue
+            deltas = [
+                (result[key] - before[key]) / before[key] if before[key] else 0.0
+                for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")
+            ]
+            print(f"{endpoint:<10}{concurrency:>6}" + "".join(f"{delta:>+9.1%}" for delta in deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API offline with local stand-ins for Groq and Pinecone")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per endpoint and concurrency")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0, help="Fake LLM time to first token")
+    parser.add_argument("--llm-tokens-per-s", type=float, default=250.0)
+    parser.add_argument("--llm-response-tokens", type=int, default=120)
+    parser.add_argument("--seed-history", type=int, default=0, help="Past interactions inserted for every user")
+    parser.add_argument("--corpus-copies", type=int, default=1, help="Index the fixture corpus this many times")
+    parser.add_argument("--answer-cache", choices=["none", "memory", "disk"], default="none")
+    parser.add_argument("--database-url", help="Defaults to SQLite in the scratch directory, e.g. a local Postgres URL")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--in-process", action="store_true", help="Call the app through ASGI instead of a uvicorn server")
+    parser.add_argument("--output", help=f"Results file, defaults to {RESULTS_DIR}/offline-<commit>.json")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="offline-bench-") as workdir:
+        env = bench_environment(args, workdir)
+        os.environ.update(env)
+        build_fixture_index(FIXTURE_CORPUS, args.corpus_copies)
+        results = asyncio.run(run(args, env))
+
+    commit = git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"offline-{commit}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    with open(output, "w") as f:
+        json.dump(
+            {"commit": commit, "created_at": datetime.now(timezone.utc).isoformat(), "config": config, "results": results},
+            f,
+            indent=2,
+        )
+    print(f"Saved results to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
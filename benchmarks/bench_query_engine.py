@@ -0,0 +1,51 @@
+"""
+Benchmark for per-request query engine construction.
+
+Compares building a query engine from the index on every request (the old
+`index.as_query_engine()` path) against handing out the engine built once in
+`lifespan`. Runs fully offline with llama_index mock embeddings and LLM.
+
+Usage:
+    python -m benchmarks.bench_query_engine --requests 2000
+"""
+
+import argparse
+import time
+
+from llama_index.core import Document, Settings, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.llms import MockLLM
+
+
+def build_index(num_docs: int) -> VectorStoreIndex:
+    Settings.embed_model = MockEmbedding(embed_dim=768)
+    Settings.llm = MockLLM()
+    docs = [Document(text=f"CreditChek documentation page {i}. " * 50, id_=str(i)) for i in range(num_docs)]
+    return VectorStoreIndex.from_documents(docs)
+
+
+def time_per_call(fn, requests: int) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        fn()
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-request query engine construction overhead")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--docs", type=int, default=100)
+    args = parser.parse_args()
+
+    index = build_index(args.docs)
+    cached_engine = index.as_query_engine(similarity_top_k=2, response_mode="compact")
+
+    per_request = time_per_call(lambda: index.as_query_engine(), args.requests)
+    cached = time_per_call(lambda: cached_engine, args.requests)
+
+    print(f"build per request: {per_request * 1e6:10.1f} us/request")
+    print(f"cached engine:     {cached * 1e6:10.3f} us/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Cross-encoder reranking benchmark.
+
+Compares sending the top SIMILARITY_TOP_K dense hits to the LLM against retrieving
+RERANK_CANDIDATES hits and letting the reranker keep up to SIMILARITY_TOP_K of them
+(score-gap cutoff), on the fixed question set:
+- per-stage time: retrieve, rerank and, with --with-llm, the LLM call
+- chunks and prompt tokens sent to the LLM, and whether the expected page is among them
+- with --with-llm: answer similarity of the reranked answer to the baseline answer
+
+Rerank pays off when its time is below the LLM time it saves on the shorter prompt.
+
+Usage (needs the index built by `python -m rag.ingest` and sentence-transformers):
+    python -m benchmarks.bench_rerank --gap 0.2 0.3 0.5 --with-llm
+"""
+
+import argparse
+import statistics
+import time
+
+from benchmarks.bench_context import answer, cosine, node_source, prompt_messages, prompt_tokens
+from benchmarks.questions import QUESTIONS, is_hit
+from rag.postprocessors import RERANK_CANDIDATES, CrossEncoderRerank
+from rag.query_engine import SIMILARITY_TOP_K, configure_settings, load_index
+
+
+def timed(fn, *args, **kwargs) -> tuple:
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure reranking cost against the LLM tokens and time it saves")
+    parser.add_argument("--gap", type=float, nargs="+", default=[0.2, 0.3, 0.5], help="Score gaps to compare")
+    parser.add_argument("--candidates", type=int, default=RERANK_CANDIDATES)
+    parser.add_argument("--with-llm", action="store_true", help="Also answer every question and compare answers")
+    args = parser.parse_args()
+
+    embed_model = configure_settings()
+    index = load_index(embed_model=embed_model)
+    baseline_retriever = index.as_retriever(similarity_top_k=SIMILARITY_TOP_K)
+    candidate_retriever = index.as_retriever(similarity_top_k=max(args.candidates, SIMILARITY_TOP_K))
+
+    baseline, candidates = [], []
+    for item in QUESTIONS:
+        nodes, retrieve_ms = timed(baseline_retriever.retrieve, item["question"])
+        baseline.append({"nodes": nodes, "retrieve_ms": retrieve_ms})
+        nodes, retrieve_ms = timed(candidate_retriever.retrieve, item["question"])
+        candidates.append({"nodes": nodes, "retrieve_ms": retrieve_ms})
+
+    reranker = CrossEncoderRerank(top_n=SIMILARITY_TOP_K)
+    reranker.postprocess_nodes(candidates[0]["nodes"], query_str=QUESTIONS[0]["question"])  # Load the model
+
+    header = f"{'config':<12}{'retrieve ms':>12}{'rerank ms':>11}{'chunks':>8}{'tokens':>8}{'hit':>6}"
+    if args.with_llm:
+        header += f"{'llm ms':>9}{'answer cos':>12}"
+    print(header)
+
+    baseline_answers = []
+    rows = [("baseline", None)] + [(f"gap {gap}", gap) for gap in args.gap]
+    for name, gap in rows:
+        retrieve_ms, rerank_ms, chunks, tokens, hits, llm_ms, similarities = [], [], [], [], 0, [], []
+        for position, item in enumerate(QUESTIONS):
+            if gap is None:
+                nodes = baseline[position]["nodes"]
+                retrieve_ms.append(baseline[position]["retrieve_ms"])
+                rerank_ms.append(0.0)
+            else:
+                reranker.score_gap = gap
+                nodes, elapsed = timed(reranker.postprocess_nodes, candidates[position]["nodes"], query_str=item["question"])
+                retrieve_ms.append(candidates[position]["retrieve_ms"])
+                rerank_ms.append(elapsed)
+            messages = prompt_messages(nodes, item["question"])
+            chunks.append(len(nodes))
+            tokens.append(prompt_tokens(messages))
+            hits += any(is_hit(node_source(n), item["expected"]) for n in nodes)
+            if args.with_llm:
+                text, elapsed = answer(messages)
+                llm_ms.append(elapsed)
+                if gap is None:
+                    baseline_answers.append(text)
+                similarities.append(1.0 if gap is None else cosine(baseline_answers[position], text))
+
+        row = (
+            f"{name:<12}{statistics.mean(retrieve_ms):>12.1f}{statistics.mean(rerank_ms):>11.1f}"
+            f"{statistics.mean(chunks):>8.2f}{statistics.mean(tokens):>8.0f}{hits / len(QUESTIONS):>6.2f}"
+        )
+        if args.with_llm:
+            row += f"{statistics.mean(llm_ms):>9.0f}{statistics.mean(similarities):>12.3f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Retrieval quality and latency benchmark on the fixed question set.
+
+Compares retrieving with the persona prompt prepended to every question (the old
+`query_engine.query(prompt + user_input)` path) against retrieving with the question
+alone. Reports recall@k, mean retrieval latency, tokens embedded per query and
+context tokens that would be sent to the LLM.
+
+Usage (needs the same environment as the server to load the index):
+    python -m benchmarks.bench_retrieval --top-k 2
+"""
+
+import argparse
+import time
+
+from llama_index.core.utils import get_tokenizer
+
+from benchmarks.questions import QUESTIONS, is_hit
+from rag.prompts import SYSTEM_PROMPT
+from rag.query_engine import configure_settings, load_index
+
+
+def node_source(node_with_score) -> str:
+    node = node_with_score.node
+    return node.metadata.get("url") or node.ref_doc_id or ""
+
+
+def run_mode(retriever, make_query, tokenizer):
+    hits, latencies, query_tokens, context_tokens = 0, [], 0, 0
+    for item in QUESTIONS:
+        query = make_query(item["question"])
+        start = time.perf_counter()
+        nodes = retriever.retrieve(query)
+        latencies.append(time.perf_counter() - start)
+        hits += any(is_hit(node_source(n), item["expected"]) for n in nodes)
+        query_tokens += len(tokenizer(query))
+        context_tokens += sum(len(tokenizer(n.node.get_content())) for n in nodes)
+    count = len(QUESTIONS)
+    return {
+        "recall": hits / count,
+        "latency_ms": sum(latencies) / count * 1000,
+        "query_tokens": query_tokens / count,
+        "context_tokens": context_tokens / count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare retrieval with and without the persona prefix")
+    parser.add_argument("--top-k", type=int, default=2)
+    args = parser.parse_args()
+
+    embed_model = configure_settings()
+    index = load_index(embed_model=embed_model)
+    retriever = index.as_retriever(similarity_top_k=args.top_k)
+    tokenizer = get_tokenizer()
+
+    modes = {
+        "persona + question": lambda question: SYSTEM_PROMPT + question,
+        "question only": lambda question: question,
+    }
+    print(f"{'mode':<22}{'recall@' + str(args.top_k):>10}{'latency ms':>12}{'query tok':>11}{'context tok':>13}")
+    for name, make_query in modes.items():
+        result = run_mode(retriever, make_query, tokenizer)
+        print(
+            f"{name:<22}{result['recall']:>10.2f}{result['latency_ms']:>12.1f}"
+            f"{result['query_tokens']:>11.0f}{result['context_tokens']:>13.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
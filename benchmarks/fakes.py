@@ -0,0 +1,132 @@
+"""
+Deterministic local stand-ins for Groq and the sentence-transformers model, used by
+the offline benchmarks so the real app can run without network access or a GPU.
+"""
+
+import asyncio
+import hashlib
+import math
+import re
+import time
+from typing import Any, List, Sequence
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.base.llms.generic_utils import (
+    astream_completion_response_to_chat_response,
+    completion_response_to_chat_response,
+)
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    CompletionResponse,
+    CompletionResponseAsyncGen,
+    CompletionResponseGen,
+    LLMMetadata,
+)
+from llama_index.core.llms import CustomLLM
+from llama_index.core.llms.callbacks import llm_chat_callback, llm_completion_callback
+
+WORD_PATTERN = re.compile(r"[A-Za-z0-9_]+")
+
+
+class FakeLLM(CustomLLM):
+    """LLM that answers with words taken from its prompt after a configurable delay.
+
+    A response takes `latency_ms` until the first token, then streams `response_tokens`
+    tokens at `tokens_per_second`. The async methods sleep without blocking the event
+    loop, the way a network-bound Groq call behaves.
+    """
+
+    latency_ms: float = 300.0
+    tokens_per_second: float = 250.0
+    response_tokens: int = 120
+    context_window: int = 4000
+    num_output: int = 1024
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(context_window=self.context_window, num_output=self.num_output, model_name="fake-llm")
+
+    def _tokens(self, prompt: str) -> list:
+        words = WORD_PATTERN.findall(prompt)[-200:] or ["answer"]
+        offset = int(hashlib.blake2b(prompt.encode(), digest_size=4).hexdigest(), 16)
+        return [words[(offset + i) % len(words)] + " " for i in range(self.response_tokens)]
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        time.sleep(self.latency_ms / 1000 + self.response_tokens / self.tokens_per_second)
+        return CompletionResponse(text="".join(self._tokens(prompt)))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        def gen() -> CompletionResponseGen:
+            time.sleep(self.latency_ms / 1000)
+            text = ""
+            for token in self._tokens(prompt):
+                time.sleep(1 / self.tokens_per_second)
+                text += token
+                yield CompletionResponse(text=text, delta=token)
+
+        return gen()
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        await asyncio.sleep(self.latency_ms / 1000 + self.response_tokens / self.tokens_per_second)
+        return CompletionResponse(text="".join(self._tokens(prompt)))
+
+    @llm_completion_callback()
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseAsyncGen:
+        async def gen() -> CompletionResponseAsyncGen:
+            await asyncio.sleep(self.latency_ms / 1000)
+            text = ""
+            for token in self._tokens(prompt):
+                await asyncio.sleep(1 / self.tokens_per_second)
+                text += token
+                yield CompletionResponse(text=text, delta=token)
+
+        return gen()
+
+    @llm_chat_callback()
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        prompt = self.messages_to_prompt(messages)
+        return completion_response_to_chat_response(await self.acomplete(prompt, formatted=True, **kwargs))
+
+    @llm_chat_callback()
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        prompt = self.messages_to_prompt(messages)
+        return astream_completion_response_to_chat_response(await self.astream_complete(prompt, formatted=True, **kwargs))
+
+
+class HashEmbedding(BaseEmbedding):
+    """Hashed bag-of-words embedding: deterministic, instant, and good enough for lexical retrieval"""
+
+    dimensions: int = 384
+
+    def __init__(self, dimensions: int = 384, **kwargs: Any):
+        super().__init__(model_name="hash-embedding", dimensions=dimensions, **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashEmbedding"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for word in WORD_PATTERN.findall(text.lower()):
+            bucket = int(hashlib.blake2b(word.encode(), digest_size=4).hexdigest(), 16)
+            vector[bucket % self.dimensions] += 1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
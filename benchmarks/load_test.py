@@ -0,0 +1,107 @@
+"""
+Load test for the chat endpoint.
+
+Measures the latency of unrelated endpoints (`/` and `/auth/user/me`) on their own,
+then again while a batch of `/chatbot/` requests is in flight. With the query engine
+running off the event loop, p99 of the probe endpoints should stay flat.
+
+Usage (against a running server):
+    python -m benchmarks.load_test --email you@example.com --password secret --chat-concurrency 16
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples, pct):
+    """Returns the pct-th percentile of samples (nearest-rank)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 2) if samples else 0.0,
+    }
+
+
+async def login(client: httpx.AsyncClient, email: str, password: str) -> str:
+    response = await client.post("/auth/login", data={"username": email, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def probe(client: httpx.AsyncClient, headers: dict, duration: float, interval: float):
+    """Repeatedly hits cheap endpoints and records their latency"""
+    samples = {"/": [], "/auth/user/me": []}
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        for path in samples:
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            response.raise_for_status()
+            samples[path].append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    return samples
+
+
+async def chat_worker(client: httpx.AsyncClient, headers: dict, question: str, stop: asyncio.Event, latencies: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.post("/chatbot/", json={"user_input": question}, headers=headers, timeout=120)
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - start)
+
+
+async def run(args):
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30) as client:
+        token = await login(client, args.email, args.password)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        baseline = await probe(client, headers, args.duration, args.interval)
+
+        stop = asyncio.Event()
+        chat_latencies: list = []
+        workers = [
+            asyncio.create_task(chat_worker(client, headers, args.question, stop, chat_latencies))
+            for _ in range(args.chat_concurrency)
+        ]
+        # Give the chat requests a moment to reach the query engine before probing
+        await asyncio.sleep(1)
+        loaded = await probe(client, headers, args.duration, args.interval)
+        stop.set()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    print(f"{'endpoint':<16}{'phase':<10}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for path in baseline:
+        for phase, samples in (("idle", baseline[path]), ("loaded", loaded[path])):
+            stats = summarize(samples)
+            print(f"{path:<16}{phase:<10}{stats['count']:>8}{stats['p50_ms']:>10}{stats['p99_ms']:>10}")
+    chat = summarize(chat_latencies)
+    print(f"{'/chatbot/':<16}{'loaded':<10}{chat['count']:>8}{chat['p50_ms']:>10}{chat['p99_ms']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Probe endpoint latency while chat requests are in flight")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--question", default="How do I verify a BVN?")
+    parser.add_argument("--chat-concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds to probe in each phase")
+    parser.add_argument("--interval", type=float, default=0.05, help="Pause between probe rounds")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""
+The real FastAPI app (`main.app`) wired to the local stand-ins from benchmarks.fakes.
+
+Importing this module imports `main`, so the environment (DATABASE_URL,
+VECTOR_STORE_BACKEND=local, LOCAL_INDEX_DIR, ...) must be prepared first;
+benchmarks.bench_offline does that and serves it with:
+    uvicorn benchmarks.offline_app:app
+
+FAKE_LLM_LATENCY_MS, FAKE_LLM_TOKENS_PER_S and FAKE_LLM_RESPONSE_TOKENS shape the fake
+Groq responses.
+"""
+
+import os
+
+from benchmarks.fakes import FakeLLM, HashEmbedding
+from main import app
+
+app.state.llm = FakeLLM(
+    latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", 300)),
+    tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_S", 250)),
+    response_tokens=int(os.getenv("FAKE_LLM_RESPONSE_TOKENS", 120)),
+)
+app.state.base_embed_model = HashEmbedding()
@@ -0,0 +1,36 @@
+"""
+Fixed question set shared by the retrieval benchmarks.
+
+Each entry lists URL fragments of the documentation pages that answer the question;
+a retrieval counts as a hit when any retrieved chunk comes from one of them.
+"""
+
+QUESTIONS = [
+    {"question": "How do I verify a BVN?", "expected": ["nigeria/identity/bvnVerification"]},
+    {"question": "What is the base URL for identity verification?", "expected": ["nigeria/identity", "auth", "intro"]},
+    {"question": "How do I verify a NIN?", "expected": ["nigeria/identity/ninVerification"]},
+    {"question": "How do I verify a driver's license?", "expected": ["nigeria/identity/driverVerification"]},
+    {"question": "How do I verify a bank account number?", "expected": ["nigeria/identity/accountVerification"]},
+    {"question": "How do I authenticate API requests?", "expected": ["auth"]},
+    {"question": "How do I get a CRC premium credit report for an individual?", "expected": ["nigeria/credit/individuals/crc"]},
+    {"question": "How do I pull a First Central premium report?", "expected": ["first central/firstCentralPremium", "first%20central/firstCentralPremium"]},
+    {"question": "How do I get an SME credit report from CRC for a business?", "expected": ["nigeria/credit/business/smeCrc"]},
+    {"question": "How do I verify a business in Kenya?", "expected": ["kenya/identity/businessVerification"]},
+    {"question": "How do I get a mobile loan score in Kenya?", "expected": ["kenya/credit/mobileLoanScore"]},
+    {"question": "How do I place a mandate with RecovaPro?", "expected": ["nigeria/recovaPro/api.md/placeMandate"]},
+    {"question": "How do I cancel a RecovaPro mandate?", "expected": ["otherActions.md/cancelMandate"]},
+    {"question": "How do I reinstate a mandate?", "expected": ["otherActions.md/reinstateMandate"]},
+    {"question": "How do I get income insights for a borrower?", "expected": ["nigeria/income/incomeInsights"]},
+    {"question": "How do I calculate the debt burden ratio?", "expected": ["nigeria/income/dbr"]},
+    {"question": "How do I list a borrower's linked bank accounts?", "expected": ["income/getAllLinkedAccount", "income/getBorrowerAccounts"]},
+    {"question": "How do I purchase an ERM insurance policy?", "expected": ["nigeria/erm/purchasePolicy"]},
+    {"question": "How do I upload an attachment for an ERM claim?", "expected": ["nigeria/erm/attachmentUpload"]},
+    {"question": "How do I use the Radar service?", "expected": ["nigeria/radar/getRadar", "category/radar-service"]},
+    {"question": "How do I set up the CreditChek widget on the server side?", "expected": ["widget/getStarted/serverSide"]},
+    {"question": "What does the CreditChek widget do?", "expected": ["widget/overview"]},
+]
+
+
+def is_hit(source: str, expected: list) -> bool:
+    """Returns True when a retrieved source URL matches one of the expected fragments"""
+    return any(fragment in (source or "") for fragment in expected)
@@ -13,5 +13,5 @@ db_host = os.getenv('DB_HOST')
 db_port = os.getenv('DB_PORT')
 db_user = os.getenv('DB_USERNAME')
 
-# Construct the SQLAlchemy database URL
-DATABASE_URL = f'postgresql+psycopg2://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}?sslmode=require'
+# Construct the SQLAlchemy database URL; DATABASE_URL overrides it (e.g. SQLite for local benchmarks)
+DATABASE_URL = os.getenv('DATABASE_URL') or f'postgresql+psycopg2://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}?sslmode=require'
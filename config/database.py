@@ -1,12 +1,90 @@
-from sqlalchemy import MetaData, create_engine
+import os
+
+from sqlalchemy import MetaData, create_engine, event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from dependencies.metrics import Counter, Gauge
 from .config import DATABASE_URL
 
-engine = create_engine(DATABASE_URL)
+# Pool settings for the async engine used by the API. Connections (and their TLS
+# sessions) stay open in the pool and are reused across requests.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))  # Connections kept open per worker
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))  # Extra connections opened under bursts, closed when returned
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))  # Seconds to wait for a free connection before failing
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # Reconnect after this many seconds, ahead of server/proxy idle timeouts
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"  # Check connections on checkout and replace dead ones
+
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Async engine pool connections, by state (checked_out, idle, overflow)",
+    labelnames=("state",),
+)
+DB_POOL_CAPACITY = Gauge("db_pool_capacity", "Connections the async engine pool can hand out (pool size + max overflow)")
+DB_POOL_CONNECTS = Counter(
+    "db_pool_connects_total",
+    "New database connections opened by the async engine (each one pays connection and TLS setup)",
+)
+
+
+def async_database_url(url: str) -> URL:
+    """The async driver equivalent of a sync database URL: asyncpg for Postgres, aiosqlite for SQLite"""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    if url.get_backend_name() == "postgresql":
+        # asyncpg takes the libpq sslmode values as `ssl`
+        query = dict(url.query)
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        return url.set(drivername="postgresql+asyncpg", query=query)
+    return url
+
+
+# The sync engine serves table creation/reflection at startup, Alembic and scripts
+# SQLite connections are shared with FastAPI's threadpool, so allow cross-thread use
+connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+engine = create_engine(DATABASE_URL, connect_args=connect_args, pool_pre_ping=True)
 metadata = MetaData()
 metadata.reflect(bind=engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The async engine serves the API, so DB I/O does not block the event loop
+ASYNC_DATABASE_URL = async_database_url(DATABASE_URL)
+pool_args = {} if ASYNC_DATABASE_URL.get_backend_name() == "sqlite" else {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+}
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    pool_recycle=DB_POOL_RECYCLE,
+    **pool_args,
+)
+# expire_on_commit=False keeps loaded objects (e.g. the current user) usable after a
+# commit without another round-trip
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+def record_pool_usage():
+    """Samples the async engine pool into the db_pool_* gauges; called on each /metrics scrape"""
+    pool = async_engine.sync_engine.pool
+    if not isinstance(pool, QueuePool):  # SQLite opens a connection per checkout (NullPool)
+        return
+    DB_POOL_CAPACITY.set(pool.size() + DB_MAX_OVERFLOW)
+    DB_POOL_CONNECTIONS.set(pool.checkedout(), state="checked_out")
+    DB_POOL_CONNECTIONS.set(pool.checkedin(), state="idle")
+    DB_POOL_CONNECTIONS.set(max(pool.overflow(), 0), state="overflow")
+
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def record_connect(dbapi_connection, connection_record):
+    DB_POOL_CONNECTS.inc()
+
+
 # Dependency to get the database session
 def get_session():
     db = SessionLocal()
@@ -15,6 +93,11 @@ def get_session():
     finally:
         db.close()
 
+# Dependency to get an async database session
+async def get_async_session():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Dependency to get the metadata
 def get_metadata():
-    return metadata
\ No newline at end of file
+    return metadata
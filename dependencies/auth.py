@@ -6,7 +6,8 @@ from datetime import datetime, timedelta
 import bcrypt
 from dotenv import load_dotenv
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .error import httpError
 from models.models import User
@@ -17,7 +18,7 @@ secret_key = os.getenv("JWT_SECRET_KEY")
 algorithm = os.getenv("JWT_ALGORITHM")
 
 
-def check_userSignupSchema(user: dict, db: Session):
+async def check_userSignupSchema(user: dict, db: AsyncSession):
     """
     Checks if all required fields are provided for user registration
     and confirms if the user exists
@@ -34,7 +35,7 @@ def check_userSignupSchema(user: dict, db: Session):
     elif user.get("password") is None or len(user.get("password")) == 0: # type: ignore
         # Checks if password is provided
         raise httpError(status_code=400, detail="Business name is required")
-    elif db.query(User).filter(User.email == user.get("email")).first() is not None: # type: ignore
+    elif (await db.execute(select(User.id).where(User.email == user.get("email")))).first() is not None: # type: ignore
         # Checks if user already exists with supplied email address
         raise httpError(status_code=400, detail="User already exists")
 
@@ -0,0 +1,206 @@
+"""
+This module provides lightweight in-process metrics (counters, gauges and histograms)
+rendered in the Prometheus text exposition format.
+
+With TRACING_ENABLED, request stages timed by `traced_stage` are also recorded as
+OpenTelemetry spans. opentelemetry-api is optional and only imported in that case;
+exporters are configured through the usual OTEL_* environment variables.
+"""
+
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger("metrics")
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REGISTRY: dict = {}
+
+
+def _format_labels(labelnames: tuple, key: tuple, extra: str = "") -> str:
+    """Formats a label set as {name="value",...}"""
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, key)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base class for all metrics, registers the metric on creation"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def _key(self, labels: dict) -> tuple:
+        if not self.labelnames:
+            return ()
+        if len(self.labelnames) == 1:  # The common case (stage, kind, ...), on every request
+            return (str(labels.get(self.labelnames[0], "")),)
+        return tuple([str(labels.get(name, "")) for name in self.labelnames])
+
+    def render(self) -> list:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> list:
+        # Snapshot under the lock: scrapes run in the threadpool while other threads add series
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict = {}
+
+    def observe(self, value: float, **labels):
+        self._observe(self._key(labels), value)
+
+    def _observe(self, key: tuple, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the wall-clock duration of the wrapped block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def render(self) -> list:
+        with self._lock:
+            series = [(key, list(bucket_counts), total, count) for key, (bucket_counts, total, count) in self._series.items()]
+        lines = []
+        for key, bucket_counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def render_metrics() -> str:
+    """Renders every registered metric in the Prometheus text format"""
+    lines = []
+    for metric in list(REGISTRY.values()):
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+_tracer = None
+
+def get_tracer():
+    """Returns the OpenTelemetry tracer when TRACING_ENABLED, else None"""
+    global _tracer
+    if _tracer is None and TRACING_ENABLED:
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            logger.warning("TRACING_ENABLED requires opentelemetry-api: pip install opentelemetry-api")
+            return None
+        _tracer = trace.get_tracer("chatbot")
+    return _tracer
+
+
+class _StageTimer:
+    """
+    Context manager behind traced_stage; a plain class is several times cheaper than
+    @contextmanager. It observes on the label key directly, skipping the kwargs dict
+    and key lookup of Histogram.observe.
+    """
+
+    __slots__ = ("observe", "key", "span", "start")
+
+    def __init__(self, histogram: Histogram, stage: str, span):
+        self.observe = histogram._observe
+        self.key = (stage,)
+        self.span = span
+
+    def __enter__(self):
+        if self.span is not None:
+            self.span.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.observe(self.key, time.perf_counter() - self.start)
+        if self.span is not None:
+            return self.span.__exit__(*exc_info)
+        return False
+
+
+def traced_stage(histogram: Histogram, stage: str) -> _StageTimer:
+    """
+    Observes the duration of a request stage on histogram, whose only label is `stage`,
+    inside a trace span when tracing
+    """
+    if not TRACING_ENABLED:
+        return _StageTimer(histogram, stage, None)
+    tracer = get_tracer()
+    return _StageTimer(histogram, stage, tracer.start_as_current_span(stage) if tracer is not None else None)
@@ -1,3 +1,5 @@
+import json
+
 import streamlit as st
 import requests
 
@@ -83,6 +85,29 @@ def get_user():
     else:
         st.error(response.json().get("detail", "Failed to fetch user details ❌"))
 
+def stream_chat(user_input, headers, placeholder, country=None):
+    """Streams the bot's answer from /chatbot/stream into placeholder as tokens arrive"""
+    answer = ""
+    event = None
+    payload = {"user_input": user_input, "country": country}
+    with requests.post(f"{BASE_URL}/chatbot/stream", json=payload, headers=headers, stream=True) as response:
+        if response.status_code != 200:
+            return False
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[len("data:"):])
+                if event == "error":
+                    return False
+                if event is None:
+                    answer += data["token"]
+                    placeholder.markdown(f"**Bot:** {answer}▌")
+            elif not line:
+                event = None  # A blank line terminates each event
+    placeholder.markdown(f"**Bot:** {answer}")
+    return True
+
 def chatbot_page():
     st.subheader("🤖 Chatbot")
     token = st.session_state.get("token")
@@ -92,20 +117,31 @@ def chatbot_page():
     
     headers = {"Authorization": f"Bearer {token}"}
     
-    # Fetch chat history
-    response = requests.get(f"{BASE_URL}/chatbot/history/", headers=headers)
+    # Add a dropdown to select the number of messages to display
+    max_messages = st.selectbox(
+        "Show last messages:",
+        options=[10, 15, 20, 25],
+        index=0  # Default to 10 messages
+    )
+
+    # Fetch only the last `max_messages` messages, revalidating the copy from the previous rerun
+    cached = st.session_state.get("history_cache")
+    history_headers = dict(headers)
+    if cached and cached["limit"] == max_messages and cached["etag"]:
+        history_headers["If-None-Match"] = cached["etag"]
+    response = requests.get(f"{BASE_URL}/chatbot/history/", headers=history_headers, params={"limit": max_messages})
     if response.status_code == 200:
-        chat_history = response.json()
-        
-        # Add a dropdown to select the number of messages to display
-        max_messages = st.selectbox(
-            "Show last messages:",
-            options=[10, 15, 20, 25],
-            index=0  # Default to 10 messages
-        )
-        
-        # Display only the last `max_messages` messages
-        for chat in chat_history[-max_messages:]:
+        chat_history = response.json()["items"]
+        st.session_state["history_cache"] = {
+            "limit": max_messages, "etag": response.headers.get("ETag"), "items": chat_history
+        }
+    elif response.status_code == 304:
+        chat_history = cached["items"]
+    else:
+        chat_history = None
+
+    if chat_history is not None:
+        for chat in chat_history:
             st.write(f"**You:** {chat['user_input']}")
             st.write(f"**Bot:** {chat['response']}")
             st.write(f"*{chat['timestamp']}*")
@@ -115,15 +151,15 @@ def chatbot_page():
     
     # Chat input
     user_input = st.text_input("Type your message here...")
+    country = st.selectbox("🌍 Country docs", ["Auto", "Nigeria", "Kenya"], index=0)
     if st.button("Send"):
         if user_input.strip():
-            with st.spinner("🤖 Bot is thinking..."):
-                response = requests.post(f"{BASE_URL}/chatbot/", json={"user_input": user_input}, headers=headers)
-                if response.status_code == 200:
-                    st.write(f"**Bot:** {response.json()['response']}")
-                    st.rerun()  # Rerun the app to refresh the chat history
-                else:
-                    st.error("Waiting for responses... ⏳")
+            placeholder = st.empty()
+            placeholder.markdown("🤖 Bot is thinking...")
+            if stream_chat(user_input, headers, placeholder, None if country == "Auto" else country.lower()):
+                st.rerun()  # Rerun the app to refresh the chat history
+            else:
+                st.error("Waiting for responses... ⏳")
 
         else:
             st.warning("Please enter a message.")
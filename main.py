@@ -2,9 +2,11 @@
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
 
-from config.database import engine
+from config.database import engine, record_pool_usage
+from dependencies.metrics import render_metrics
 from models import models
 from routers import auth, chatbot
 from rag.query_engine import lifespan
@@ -35,3 +37,9 @@ app.include_router(chatbot.router)
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
+
+# Prometheus scrape endpoint: stage latencies, token counts, cache hit/miss counters and DB pool usage
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    record_pool_usage()
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
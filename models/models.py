@@ -6,7 +6,8 @@ from sqlalchemy import (
     DateTime,
     String,
     ForeignKey,
-    Enum
+    Enum,
+    Index
 )
 
 from enum import Enum as PyEnum
@@ -18,12 +19,16 @@ from config.database import SessionLocal
 
 Base = declarative_base()
 
+def utc_now() -> datetime:
+    """Current UTC time as a naive datetime: the DateTime columns are `timestamp without time zone`"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class Basemodel:
     """Basemodel for other database tables to inherit"""
 
     id = Column(String(60), index=True, primary_key=True, default=lambda: str(uuid4()))  # object's unique id
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))  # object's creation date
-    updated_at = Column(DateTime, default=datetime.now(timezone.utc))  # object's update date
+    created_at = Column(DateTime, default=utc_now)  # object's creation date
+    updated_at = Column(DateTime, default=utc_now)  # object's update date
 
     def __init__(self, **kwargs):
         for key, value in kwargs.items():
@@ -32,7 +37,7 @@ class Basemodel:
     
     def save(self, session: SessionLocal): # type: ignore
         """Save object to database"""
-        self.updated_at = datetime.now(timezone.utc)
+        self.updated_at = utc_now()
         session.add(self)
         session.commit()
     
@@ -72,6 +77,14 @@ class ChatbotInteraction(Basemodel, Base):
     user_id = Column(String(60), ForeignKey("users.id"), nullable=False)
     user_input = Column(String(15000), nullable=False)  # User's question
     response = Column(String(15000), nullable=False)  # Chatbot's reply
-    timestamp = Column(DateTime, default=datetime.now(timezone.utc))
+    timestamp = Column(DateTime, default=utc_now)
 
     user = relationship("User", back_populates="chatbot_interactions")
+
+# Serves the per-user history queries: WHERE user_id = ? ORDER BY timestamp DESC, id DESC
+Index(
+    "ix_chatbot_interactions_user_id_timestamp",
+    ChatbotInteraction.user_id,
+    ChatbotInteraction.timestamp.desc(),
+    ChatbotInteraction.id.desc(),
+)
@@ -1,14 +1,27 @@
-from pydantic import BaseModel, EmailStr, UUID4
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, UUID4, field_serializer
+from datetime import datetime, timezone
+from typing import Optional
+
+def utc_isoformat(value: datetime) -> str:
+    """ISO 8601 with a Z suffix; naive datetimes are UTC, as stored in the database"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat() + "Z"
 
 class ChatbotRequest(BaseModel):
     user_input: str
+    country: Optional[str] = None # Restrict retrieval to one country's docs, e.g. "nigeria" or "kenya"
+    service: Optional[str] = None # Restrict retrieval to one service, e.g. "identity" or "credit"
 
 class ChatbotResponse(BaseModel):
     user_input: str
     response: str
     timestamp: datetime
 
+    @field_serializer("timestamp")
+    def serialize_timestamp(self, value: datetime) -> str:
+        return utc_isoformat(value)
+
     class Config:
         from_attributes = True  # Enables compatibility with SQLAlchemy models
         arbitrary_types_allowed = True
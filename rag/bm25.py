@@ -0,0 +1,166 @@
+"""
+In-process BM25 index over the same chunks as the vector index.
+
+API-doc questions are full of exact identifiers (`bvnIgree`, `firstCentralIscore`,
+`placeMandate`) that dense embeddings match poorly. The sparse index is built and
+updated by `python -m rag.ingest` next to the vector index and persisted as a
+gzipped JSON file of node records; postings are rebuilt in memory on load.
+"""
+
+# Standard library imports
+from collections import Counter, defaultdict
+import gzip
+import heapq
+import json
+import logging
+import math
+import os
+import re
+
+# llama_index imports
+from llama_index.core.schema import BaseNode, MetadataMode
+from llama_index.core.vector_stores.simple import _build_metadata_filter_fn
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+
+
+logger = logging.getLogger("rag_engine")
+
+# Sparse index configuration
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", "storage/bm25_index.json.gz")
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+WORD_PATTERN = re.compile(r"[A-Za-z0-9_]+")
+CAMEL_CASE_PATTERN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it of on or the this to what when where which "
+    "with you your".split()
+)
+
+
+def tokenize(text: str) -> list:
+    """
+    Lowercased word tokens; identifiers are also split on camelCase, so
+    `firstCentralIscore` matches both itself and "first central iscore"
+    """
+    tokens = []
+    for word in WORD_PATTERN.findall(text):
+        tokens.append(word.lower())
+        parts = CAMEL_CASE_PATTERN.findall(word)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts)
+    return [token for token in tokens if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over chunk text and embedded metadata, with incremental add/remove"""
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.records: dict = {}  # node id -> node_to_metadata_dict() record, enough to rebuild the node
+        self.postings: dict = defaultdict(dict)  # term -> {node id: term frequency}
+        self.lengths: dict = {}  # node id -> number of tokens
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self.records
+
+    @staticmethod
+    def _node_text(node: BaseNode) -> str:
+        return node.get_content(metadata_mode=MetadataMode.EMBED)
+
+    def _index(self, node_id: str, text: str):
+        terms = Counter(tokenize(text))
+        for term, frequency in terms.items():
+            self.postings[term][node_id] = frequency
+        self.lengths[node_id] = sum(terms.values())
+        self.total_length += self.lengths[node_id]
+
+    def add(self, nodes: list):
+        for node in nodes:
+            if node.node_id in self.records:
+                self.remove([node.node_id])
+            self.records[node.node_id] = node_to_metadata_dict(node, remove_text=False)
+            self._index(node.node_id, self._node_text(node))
+
+    def remove(self, node_ids: list):
+        for node_id in node_ids:
+            record = self.records.pop(node_id, None)
+            if record is None:
+                continue
+            for term in set(tokenize(self._node_text(metadata_dict_to_node(record)))):
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(node_id, None)
+                    if not postings:
+                        del self.postings[term]
+            self.total_length -= self.lengths.pop(node_id)
+
+    def clear(self):
+        self.records.clear()
+        self.postings.clear()
+        self.lengths.clear()
+        self.total_length = 0
+
+    def get_node(self, node_id: str) -> BaseNode:
+        return metadata_dict_to_node(self.records[node_id])
+
+    def search(self, query: str, top_k: int, filters=None) -> list:
+        """Returns up to top_k (node id, score) pairs, best first"""
+        if not self.records:
+            return []
+        count = len(self.records)
+        average_length = self.total_length / count
+        scores: dict = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for node_id, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[node_id] / average_length)
+                scores[node_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        if filters is not None:
+            filter_fn = _build_metadata_filter_fn(lambda node_id: self.records[node_id], filters)
+            scores = {node_id: score for node_id, score in scores.items() if filter_fn(node_id)}
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def save(self, path: str = BM25_INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "records": self.records}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = BM25_INDEX_PATH) -> "BM25Index":
+        """Loads the index from path, or returns an empty one if nothing is saved there yet"""
+        if not os.path.exists(path):
+            return cls()
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        for node_id, record in data["records"].items():
+            index.records[node_id] = record
+            index._index(node_id, cls._node_text(metadata_dict_to_node(record)))
+        return index
+
+
+_sparse_index = None
+
+
+def get_sparse_index(reload: bool = False):
+    """
+    Returns the process-wide BM25 index, or None when ingestion has not built one yet.
+    reload re-reads it from disk, e.g. after `python -m rag.ingest` has updated it.
+    """
+    global _sparse_index
+    if (_sparse_index is None or reload) and os.path.exists(BM25_INDEX_PATH):
+        _sparse_index = BM25Index.load(BM25_INDEX_PATH)
+        logger.info(f"Loaded BM25 index from {BM25_INDEX_PATH} ({len(_sparse_index)} chunks)")
+    return _sparse_index
@@ -0,0 +1,417 @@
+# Standard library imports
+import asyncio
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Third-party imports
+import numpy as np
+from llama_index.core import Settings
+
+# Local or project-specific imports
+from dependencies.metrics import Counter
+from rag.indexing import index_version
+
+
+logger = logging.getLogger("rag_engine")
+
+# Answer cache configuration
+ANSWER_CACHE_BACKEND = os.getenv("ANSWER_CACHE_BACKEND", "memory")  # memory, disk or none
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "cache/answers.sqlite3")
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", 24 * 60 * 60))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 1024))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95))
+SCOPE_SEPARATOR = "\x1f"  # Separates a cache scope from the normalized query in cache keys
+
+# Query embedding cache configuration
+QUERY_EMBEDDING_CACHE_PATH = os.getenv("QUERY_EMBEDDING_CACHE_PATH", "cache/query_embeddings.sqlite3")
+QUERY_EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_EMBEDDING_CACHE_MAX_ENTRIES", 100_000))
+QUERY_EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.getenv("QUERY_EMBEDDING_CACHE_MEMORY_ENTRIES", 4096))
+QUERY_EMBEDDING_CACHE_DTYPE = os.getenv("QUERY_EMBEDDING_CACHE_DTYPE", "float16")  # float16 or float32
+
+QUERY_EMBEDDING_CACHE_REQUESTS = Counter(
+    "query_embedding_cache_requests_total",
+    "Query embedding cache lookups by result (memory_hit, disk_hit, miss)",
+    ("result",),
+)
+
+ANSWER_CACHE_REQUESTS = Counter(
+    "answer_cache_requests_total",
+    "Answer cache lookups by result (exact_hit, semantic_hit, miss)",
+    ("result",),
+)
+
+
+def normalize_query(text: str) -> str:
+    """Lowercases, collapses whitespace and drops trailing punctuation"""
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip(" ?!.")
+
+
+class MemoryCacheBackend:
+    """In-process LRU store for cached answers"""
+
+    blocking = False  # Calls are cheap enough to make on the event loop
+
+    def __init__(self):
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: dict, max_entries: int):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+            self._version += 1
+
+    def delete(self, keys: list):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+            self._version += 1
+
+    def version(self):
+        """Changes whenever the set of entries changes"""
+        return self._version
+
+    def vectors(self) -> list:
+        """(key, embedding, created_at) of every entry that has an embedding"""
+        with self._lock:
+            return [
+                (key, entry["embedding"], entry["created_at"])
+                for key, entry in self._entries.items() if entry["embedding"] is not None
+            ]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version += 1
+
+
+class DiskCacheBackend:
+    """SQLite-backed LRU store, shared by every worker on the host"""
+
+    blocking = True  # SQLite I/O, run off the event loop
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, answer TEXT NOT NULL, embedding BLOB, "
+            "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    @staticmethod
+    def _to_entry(answer, embedding, created_at) -> dict:
+        return {
+            "answer": answer,
+            "embedding": np.frombuffer(embedding, dtype=np.float32) if embedding else None,
+            "created_at": created_at,
+        }
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, embedding, created_at FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (time.time(), key))
+            return self._to_entry(*row)
+
+    def set(self, key: str, entry: dict, max_entries: int):
+        embedding = entry["embedding"]
+        blob = np.asarray(embedding, dtype=np.float32).tobytes() if embedding is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, answer, embedding, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, entry["answer"], blob, entry["created_at"], time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM answers WHERE key NOT IN (SELECT key FROM answers ORDER BY last_used DESC LIMIT ?)",
+                (max_entries,),
+            )
+            self._writes += 1
+
+    def delete(self, keys: list):
+        with self._lock:
+            self._conn.executemany("DELETE FROM answers WHERE key = ?", [(key,) for key in keys])
+            self._writes += 1
+
+    def version(self):
+        """Changes whenever this or another worker's connection changes the table"""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0], self._writes
+
+    def vectors(self) -> list:
+        """(key, embedding, created_at) of every entry that has an embedding; answers are not read"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, embedding, created_at FROM answers WHERE embedding IS NOT NULL"
+            ).fetchall()
+        return [(key, np.frombuffer(embedding, dtype=np.float32), created_at) for key, embedding, created_at in rows]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._writes += 1
+
+
+class QueryEmbeddingCache:
+    """Query embeddings keyed on model and normalized text.
+
+    An in-process LRU sits in front of a SQLite file shared by every worker on the
+    host. Vectors are kept as float16 (or float32) arrays in memory and blobs on
+    disk, and only become lists of floats when returned. Entries for any other
+    model are dropped on open, so changing the embedding model or backend
+    invalidates the cache.
+    """
+
+    PRUNE_EVERY = 1000  # Inserts between trims of the SQLite table to max_entries
+
+    def __init__(self, path: str, model: str, max_entries: int = QUERY_EMBEDDING_CACHE_MAX_ENTRIES,
+                 memory_entries: int = QUERY_EMBEDDING_CACHE_MEMORY_ENTRIES, dtype: str = QUERY_EMBEDDING_CACHE_DTYPE):
+        self.model = model
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.dtype = np.dtype(dtype)
+        self._memory = MemoryCacheBackend()
+        self._inserts = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, dtype TEXT NOT NULL, embedding BLOB NOT NULL, "
+            "last_used REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM query_embeddings WHERE model != ?", (model,)).rowcount
+        if deleted:
+            logger.info(f"Embedding model changed to {model}, dropped {deleted} cached query embeddings")
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        # Only whitespace is normalized: anything else can change the embedding
+        return re.sub(r"\s+", " ", text).strip()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model}\x00{self.normalize(text)}".encode("utf-8")).hexdigest()
+
+    def get_from_memory(self, text: str):
+        """Returns the embedding if it is in the in-process LRU, without touching SQLite"""
+        entry = self._memory.get(self._key(text))
+        if entry is None:
+            return None
+        QUERY_EMBEDDING_CACHE_REQUESTS.inc(result="memory_hit")
+        return entry["embedding"].astype(np.float32).tolist()
+
+    def get(self, text: str):
+        """Returns the cached embedding as a list of floats, or None"""
+        embedding = self.get_from_memory(text)
+        if embedding is not None:
+            return embedding
+
+        key = self._key(text)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT dtype, embedding FROM query_embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE query_embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+        if row is None:
+            QUERY_EMBEDDING_CACHE_REQUESTS.inc(result="miss")
+            return None
+
+        vector = np.frombuffer(row[1], dtype=row[0]).astype(self.dtype)
+        self._memory.set(key, {"embedding": vector}, self.memory_entries)
+        QUERY_EMBEDDING_CACHE_REQUESTS.inc(result="disk_hit")
+        return vector.astype(np.float32).tolist()
+
+    def put(self, text: str, embedding: list):
+        key = self._key(text)
+        vector = np.asarray(embedding, dtype=self.dtype)
+        self._memory.set(key, {"embedding": vector}, self.memory_entries)
+        blob = vector.tobytes()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, model, dtype, embedding, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, self.model, self.dtype.name, blob, time.time()),
+            )
+            self._inserts += 1
+            if self._inserts % self.PRUNE_EVERY == 0:
+                self._conn.execute(
+                    "DELETE FROM query_embeddings WHERE key NOT IN "
+                    "(SELECT key FROM query_embeddings ORDER BY last_used DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+
+    def clear(self):
+        self._memory.clear()
+        with self._lock:
+            self._conn.execute("DELETE FROM query_embeddings")
+
+
+class AnswerCache:
+    """Caches final answers keyed on the normalized query.
+
+    A lookup first tries an exact match on the normalized text, then falls back to
+    the closest cached query by embedding cosine similarity above `similarity_threshold`.
+    The embeddings are held in memory as one normalized matrix per scope, rebuilt only
+    when the backend changes, so a semantic lookup is a single matmul and reads just
+    the winning answer from the backend.
+
+    Entries belong to one version of the index (see `rag.indexing.index_version`).
+    The query engine calls `reset` once it has reloaded a newer index, and answers
+    generated from an older one are never stored.
+    """
+
+    def __init__(self, backend, ttl_seconds: int, max_entries: int, similarity_threshold: float):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.index_version = index_version()
+        self._vectors: dict = {}  # scope -> (keys, normalized embedding matrix, created_at array)
+        self._vectors_version = None
+
+    async def _call(self, fn, *args):
+        """Runs a backend call, off the event loop when the backend does blocking I/O"""
+        if self.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def _expired(self, entry: dict) -> bool:
+        return time.time() - entry["created_at"] > self.ttl_seconds
+
+    @staticmethod
+    def _key(query: str, scope: str = "") -> str:
+        return f"{scope}{SCOPE_SEPARATOR}{normalize_query(query)}" if scope else normalize_query(query)
+
+    def _load_vectors(self) -> dict:
+        """Returns the per-scope embedding matrices, rebuilding them if the backend changed"""
+        version = self.backend.version()
+        if version == self._vectors_version:
+            return self._vectors
+
+        by_scope: dict = {}
+        for key, embedding, created_at in self.backend.vectors():
+            by_scope.setdefault(key.rpartition(SCOPE_SEPARATOR)[0], []).append((key, embedding, created_at))
+        vectors = {}
+        for scope, rows in by_scope.items():
+            matrix = np.stack([np.asarray(embedding, dtype=np.float32) for _, embedding, _ in rows])
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            vectors[scope] = ([key for key, _, _ in rows], matrix, np.array([created_at for _, _, created_at in rows]))
+        self._vectors, self._vectors_version = vectors, version
+        return vectors
+
+    async def lookup(self, query: str, scope: str = ""):
+        """
+        Returns (answer, embedding); answer is None on a miss. On a miss, embedding is
+        the vector of query itself, for retrieval to reuse. Answers are only matched
+        within the same scope, e.g. the retrieval filters they were generated with.
+        """
+        key = self._key(query, scope)
+        entry = await self._call(self.backend.get, key)
+        if entry is not None and not self._expired(entry):
+            ANSWER_CACHE_REQUESTS.inc(result="exact_hit")
+            return entry["answer"], entry["embedding"]
+
+        # The question as retrieval will see it, so the engine can reuse this vector
+        embedding = np.asarray(await Settings.embed_model.aget_query_embedding(query), dtype=np.float32)
+        embedding /= np.linalg.norm(embedding) or 1.0
+
+        best_answer = None
+        vectors = (await self._call(self._load_vectors)).get(scope)
+        if vectors is not None:
+            keys, matrix, created_at = vectors
+            scores = matrix @ embedding
+            expired = time.time() - created_at > self.ttl_seconds
+            if expired.any():
+                await self._call(self.backend.delete, [keys[i] for i in np.flatnonzero(expired)])
+                scores[expired] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity_threshold:
+                # None if another worker evicted it since the matrix was built
+                cached = await self._call(self.backend.get, keys[best])
+                if cached is not None and not self._expired(cached):
+                    best_answer = cached["answer"]
+
+        ANSWER_CACHE_REQUESTS.inc(result="semantic_hit" if best_answer is not None else "miss")
+        return best_answer, embedding
+
+    async def store(self, query: str, answer: str, embedding=None, scope: str = "", version=None):
+        """
+        Caches answer unless the index has changed since version, the index_version
+        read before the answer was generated
+        """
+        if version is not None and (version != self.index_version or index_version() != version):
+            logger.info("Index changed while the answer was generated, not caching it")
+            return
+        await self._call(
+            self.backend.set,
+            self._key(query, scope),
+            {"answer": answer, "embedding": embedding, "created_at": time.time()},
+            self.max_entries,
+        )
+
+    def clear(self):
+        self.backend.clear()
+
+    async def reset(self, version):
+        """Drops every entry once the query engine has reloaded the index at version"""
+        if version != self.index_version:
+            logger.info("Index changed since answers were cached, clearing answer cache")
+            await self._call(self.clear)
+            self.index_version = version
+
+
+_answer_cache = None
+
+
+def get_answer_cache():
+    """Returns the process-wide answer cache, or None when caching is disabled"""
+    global _answer_cache
+    if _answer_cache is None and ANSWER_CACHE_BACKEND != "none":
+        if ANSWER_CACHE_BACKEND == "disk":
+            backend = DiskCacheBackend(ANSWER_CACHE_PATH)
+        elif ANSWER_CACHE_BACKEND == "memory":
+            backend = MemoryCacheBackend()
+        else:
+            raise ValueError(f"Unknown ANSWER_CACHE_BACKEND: {ANSWER_CACHE_BACKEND}")
+        logger.info(f"Answer cache enabled ({ANSWER_CACHE_BACKEND} backend)")
+        _answer_cache = AnswerCache(
+            backend,
+            ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+            max_entries=ANSWER_CACHE_MAX_ENTRIES,
+            similarity_threshold=ANSWER_CACHE_SIMILARITY,
+        )
+    return _answer_cache
+
+
+def invalidate_answer_cache():
+    """Drops every cached answer, called whenever the index is rebuilt"""
+    cache = get_answer_cache()
+    if cache is not None:
+        logger.info("Invalidating answer cache")
+        cache.clear()
@@ -1,54 +1,208 @@
-import requests
+"""
+Concurrent, polite crawler used to build the list of documentation pages to ingest.
+
+Fetches pages with a pooled async HTTP client, limits concurrency per host, honours
+robots.txt, seeds the frontier from sitemap.xml and stops at max depth/max pages.
+
+Usage:
+    python -m rag.crawler https://docs.creditchek.africa/ --output rag/data/extractions.py
+"""
+
+import argparse
+import asyncio
+import logging
+from urllib.parse import urljoin, urlparse, urlunparse, parse_qsl, urlencode
+from urllib.robotparser import RobotFileParser
+import xml.etree.ElementTree as ET
+
+import httpx
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
 
-def crawl_website(start_url):
+logger = logging.getLogger("rag_crawler")
+
+USER_AGENT = "CreditChekDocsCrawler/1.0"
+DEFAULT_MAX_PAGES = 500
+DEFAULT_MAX_DEPTH = 10
+DEFAULT_CONCURRENCY = 8  # Concurrent requests per host
+SKIPPED_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".svg", ".ico", ".css", ".js", ".pdf", ".zip", ".xml", ".json")
+
+
+def normalize_url(url: str) -> str:
     """
-    Crawls the website starting from start_url and returns a list of all unique internal links.
+    Canonical form used for de-duplication: lowercase scheme and host, no default
+    port, no fragment, no trailing slash (except the root) and sorted query parameters
     """
-    visited = set()      # Track visited URLs to avoid revisiting
-    links_found = set()  # Use a set to store unique links
-    to_visit = [start_url]
+    parts = urlparse(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not (scheme == "http" and parts.port == 80) and not (scheme == "https" and parts.port == 443):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunparse((scheme, host, path, "", query, ""))
 
-    # Get the domain of the starting URL to restrict crawling to the same domain
-    domain = urlparse(start_url).netloc
 
-    while to_visit:
-        current_url = to_visit.pop(0)
-        if current_url in visited:
-            continue
-        visited.add(current_url)
+def extract_links(base_url: str, html: bytes) -> list:
+    """Returns the absolute URLs of every <a href> on a page"""
+    soup = BeautifulSoup(html, "html.parser")
+    return [urljoin(base_url, a_tag["href"]) for a_tag in soup.find_all("a", href=True)]
 
+
+class Crawler:
+    """Breadth-first crawler restricted to the start URL's host"""
+
+    def __init__(self, start_url: str, max_pages: int = DEFAULT_MAX_PAGES, max_depth: int = DEFAULT_MAX_DEPTH,
+                 concurrency: int = DEFAULT_CONCURRENCY, timeout: float = 10.0, use_sitemap: bool = True,
+                 respect_robots: bool = True):
+        self.start_url = normalize_url(start_url)
+        self.domain = urlparse(self.start_url).netloc
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.use_sitemap = use_sitemap
+        self.respect_robots = respect_robots
+
+        self.frontier = asyncio.Queue()  # FIFO (deque-backed) of (url, depth) pairs waiting to be fetched
+        self.seen: set = set()  # every URL ever queued, so each page is fetched once
+        self.pages: list = []  # HTML pages successfully fetched, in crawl order
+        self.robots = None
+        self.sitemaps: list = []
+
+    def _allowed(self, url: str) -> bool:
+        if urlparse(url).netloc != self.domain:
+            return False
+        if urlparse(url).path.lower().endswith(SKIPPED_EXTENSIONS):
+            return False
+        return self.robots is None or self.robots.can_fetch(USER_AGENT, url)
+
+    def _enqueue(self, url: str, depth: int):
+        url = normalize_url(url)
+        if url in self.seen or depth > self.max_depth or len(self.seen) >= self.max_pages:
+            return
+        if not self._allowed(url):
+            return
+        self.seen.add(url)
+        self.frontier.put_nowait((url, depth))
+
+    async def _load_robots(self, client: httpx.AsyncClient):
+        robots_url = urljoin(self.start_url, "/robots.txt")
         try:
-            response = requests.get(current_url, timeout=5)
-            # Proceed only if the content is HTML
-            if "text/html" not in response.headers.get("Content-Type", ""):
-                continue
-        except Exception as e:
-            print(f"Failed to fetch {current_url}: {e}")
-            continue
-
-        soup = BeautifulSoup(response.content, "html.parser")
-        for a_tag in soup.find_all("a", href=True):
-            href = a_tag["href"]
-            # Convert relative URL to absolute URL
-            full_url = urljoin(current_url, href)
-            # Ensure the link is within the same domain
-            if urlparse(full_url).netloc != domain:
-                continue
-            # Remove any URL fragments (e.g., "#section") to avoid duplicates
-            full_url = full_url.split("#")[0]
-            if full_url not in visited and full_url not in to_visit:
-                links_found.add(full_url)
-                to_visit.append(full_url)
-
-    # Return the links as a list
-    return list(links_found)
+            response = await client.get(robots_url)
+        except httpx.HTTPError as e:
+            logger.info(f"No robots.txt at {robots_url}: {e}")
+            return
+        if response.status_code != 200:
+            return
+        self.robots = RobotFileParser()
+        self.robots.parse(response.text.splitlines())
+        self.sitemaps = list(self.robots.site_maps() or [])
+
+    async def _load_sitemap(self, client: httpx.AsyncClient, sitemap_url: str, remaining: int = 5):
+        """Queues every <loc> in a sitemap, following nested sitemap indexes"""
+        try:
+            response = await client.get(sitemap_url)
+            if response.status_code != 200:
+                return
+            root = ET.fromstring(response.content)
+        except (httpx.HTTPError, ET.ParseError) as e:
+            logger.info(f"Could not read sitemap {sitemap_url}: {e}")
+            return
+        namespace = root.tag.split("}")[0] + "}" if root.tag.startswith("{") else ""
+        locations = [loc.text.strip() for loc in root.iter(f"{namespace}loc") if loc.text]
+        if root.tag.endswith("sitemapindex"):
+            if remaining > 0:
+                for location in locations:
+                    await self._load_sitemap(client, location, remaining - 1)
+            return
+        for location in locations:
+            self._enqueue(location, 1)
+
+    async def _fetch(self, client: httpx.AsyncClient, url: str, depth: int):
+        try:
+            response = await client.get(url)
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to fetch {url}: {e}")
+            return
+        # Proceed only if the content is HTML
+        if response.status_code != 200 or "text/html" not in response.headers.get("Content-Type", ""):
+            return
+        self.pages.append(url)
+        if depth < self.max_depth:
+            for link in extract_links(str(response.url), response.content):
+                self._enqueue(link, depth + 1)
+
+    async def _worker(self, client: httpx.AsyncClient):
+        while True:
+            url, depth = await self.frontier.get()
+            try:
+                await self._fetch(client, url, depth)
+            except Exception as e:
+                logger.warning(f"Error crawling {url}: {e}")
+            finally:
+                self.frontier.task_done()
+
+    async def crawl(self) -> list:
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT}, timeout=self.timeout, limits=limits, follow_redirects=True
+        ) as client:
+            if self.respect_robots:
+                await self._load_robots(client)
+            self._enqueue(self.start_url, 0)
+            if self.use_sitemap:
+                for sitemap_url in self.sitemaps or [urljoin(self.start_url, "/sitemap.xml")]:
+                    await self._load_sitemap(client, sitemap_url)
+
+            # All pages are on one host, so the worker count is the per-host concurrency limit
+            workers = [asyncio.create_task(self._worker(client)) for _ in range(self.concurrency)]
+            await self.frontier.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return sorted(self.pages)
+
+
+def crawl_website(start_url, **kwargs):
+    """
+    Crawls the website starting from start_url and returns a list of all unique internal pages.
+    """
+    return asyncio.run(Crawler(start_url, **kwargs).crawl())
+
+
+def write_manifest(links: list, path: str):
+    """Writes the crawled pages as a Python module in the format of rag/data/extractions.py"""
+    with open(path, "w") as f:
+        f.write("extractions = [\n")
+        for link in links:
+            f.write(f"    {link!r},\n")
+        f.write("]\n")
+
 
 if __name__ == "__main__":
-    start_url = "https://example.com"  # Replace with your target URL
-    all_links = crawl_website(start_url)
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Crawl a docs site and list its pages")
+    parser.add_argument("start_url")
+    parser.add_argument("--max-pages", type=int, default=DEFAULT_MAX_PAGES)
+    parser.add_argument("--max-depth", type=int, default=DEFAULT_MAX_DEPTH)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--no-sitemap", action="store_true")
+    parser.add_argument("--output", help="Write the pages as an extractions module (e.g. rag/data/extractions.py)")
+    args = parser.parse_args()
 
-    print("Found links:")
-    for link in all_links:
-        print(link)
+    all_links = crawl_website(
+        args.start_url,
+        max_pages=args.max_pages,
+        max_depth=args.max_depth,
+        concurrency=args.concurrency,
+        use_sitemap=not args.no_sitemap,
+    )
+    if args.output:
+        write_manifest(all_links, args.output)
+        print(f"Wrote {len(all_links)} links to {args.output}")
+    else:
+        print("Found links:")
+        for link in all_links:
+            print(link)
@@ -0,0 +1,192 @@
+"""
+Near-duplicate detection for the ingestion pipeline.
+
+Many docs URLs render (almost) the same page, e.g. `category/erm` and
+`category/erm/`, or `income/getExistingInsightData` and
+`nigeria/income/getExistingInsightData`. Documents and chunks are compared by
+MinHash signatures over word shingles, with LSH banding to find candidate pairs,
+and each group of near-duplicates is collapsed to one canonical copy whose
+`source_urls` metadata lists every page it came from.
+
+Signatures can be passed in precomputed (e.g. cached in the index manifest for
+pages that have not changed), so only new or changed text is hashed.
+"""
+
+# Standard library imports
+import base64
+import hashlib
+import logging
+import os
+import re
+
+# Third-party imports
+import numpy as np
+from llama_index.core.schema import MetadataMode
+
+
+logger = logging.getLogger("rag_ingest")
+
+# Deduplication configuration
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.9))  # Estimated Jaccard similarity above which texts are merged
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16  # 4 rows per band: pairs at 0.9 similarity become candidates with probability > 0.99
+SHINGLE_SIZE = 5
+MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+
+class MinHasher:
+    """MinHash signatures over word shingles using universal hashing (a * x + b) mod p"""
+
+    def __init__(self, num_perm: int = MINHASH_PERMUTATIONS, shingle_size: int = SHINGLE_SIZE, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.shingle_size = shingle_size
+
+    def shingles(self, text: str) -> set:
+        tokens = re.findall(r"\w+", text.lower())
+        size = self.shingle_size
+        return {" ".join(tokens[start:start + size]) for start in range(max(len(tokens) - size + 1, 1))}
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.array(
+            [
+                int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little") % MERSENNE_PRIME
+                for shingle in self.shingles(text)
+            ],
+            dtype=np.uint64,
+        )
+        # Both factors are below 2**31, so the products fit in uint64
+        return ((np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME).min(axis=0)
+
+
+def encode_signature(signature: np.ndarray) -> str:
+    # Values are below 2**31, so they fit in uint32
+    return base64.b64encode(signature.astype("<u4").tobytes()).decode("ascii")
+
+
+def decode_signature(encoded: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(encoded), dtype="<u4").astype(np.uint64)
+
+
+def similarity(signature_a: np.ndarray, signature_b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the two shingle sets"""
+    return float(np.mean(signature_a == signature_b))
+
+
+def near_duplicate_groups(signatures: list, threshold: float = DEDUP_THRESHOLD, bands: int = LSH_BANDS) -> list:
+    """Groups indexes of signatures whose similarity is at least threshold; singletons are omitted"""
+    rows = len(signatures[0]) // bands if signatures else 0
+    parent = list(range(len(signatures)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    buckets: dict = {}
+    for i, signature in enumerate(signatures):
+        for band in range(bands):
+            buckets.setdefault((band, signature[band * rows:(band + 1) * rows].tobytes()), []).append(i)
+
+    for members in buckets.values():
+        for other in members[1:]:
+            root_a, root_b = find(members[0]), find(other)
+            if root_a != root_b and similarity(signatures[members[0]], signatures[other]) >= threshold:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    groups: dict = {}
+    for i in range(len(signatures)):
+        groups.setdefault(find(i), []).append(i)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def source_urls(item) -> list:
+    return item.metadata.get("source_urls") or [item.metadata.get("url") or item.ref_doc_id]
+
+
+def merge_source_urls(canonical, duplicates: list):
+    """Records every page of a group on the canonical copy, without changing its embedded text"""
+    urls = set(source_urls(canonical))
+    for duplicate in duplicates:
+        urls.update(source_urls(duplicate))
+    canonical.metadata = {**canonical.metadata, "source_urls": sorted(urls)}
+    for keys in (canonical.excluded_embed_metadata_keys, canonical.excluded_llm_metadata_keys):
+        if "source_urls" not in keys:
+            keys.append("source_urls")
+
+
+def canonical_key(item):
+    """Prefers the most specific page (e.g. with a country), then URLs without a trailing slash, then the shortest"""
+    url = item.metadata.get("url") or item.ref_doc_id or item.node_id
+    return -len(item.metadata), url.endswith("/"), len(url), url
+
+
+def dedup_documents(docs: list, threshold: float = DEDUP_THRESHOLD, signatures: list | None = None):
+    """
+    Collapses near-identical documents to their canonical copy.
+    signatures optionally holds a precomputed signature (or None) per document;
+    missing ones are computed and filled in.
+    Returns (kept documents in input order, {dropped doc id: canonical doc id}).
+    """
+    hasher = MinHasher()
+    if signatures is None:
+        signatures = [None] * len(docs)
+    for i, doc in enumerate(docs):
+        if signatures[i] is None:
+            signatures[i] = hasher.signature(doc.get_content(metadata_mode=MetadataMode.NONE))
+    duplicates: dict = {}
+    for group in near_duplicate_groups(signatures, threshold):
+        members = sorted((docs[i] for i in group), key=canonical_key)
+        canonical, others = members[0], members[1:]
+        merge_source_urls(canonical, others)
+        for other in others:
+            duplicates[other.doc_id] = canonical.doc_id
+
+    if duplicates:
+        logger.info(f"Collapsed {len(duplicates)} near-duplicate pages into {len(set(duplicates.values()))}")
+    return [doc for doc in docs if doc.doc_id not in duplicates], duplicates
+
+
+def dedup_chunks(chunks: dict, threshold: float = DEDUP_THRESHOLD, signatures: dict | None = None, load=None) -> tuple:
+    """
+    Drops near-identical chunks across (and within) documents, keeping the copy
+    from the most specific page. chunks maps doc id -> nodes and is updated in
+    place.
+
+    signatures optionally maps doc id -> precomputed signatures of its chunks, in
+    order; missing ones are computed and added. A document may map to None in
+    chunks when its signatures are given: it is only chunked, by load(doc id), if
+    one of its chunks has a near-duplicate.
+
+    Returns (number of chunks dropped, ids of the documents with a near-duplicate chunk).
+    """
+    hasher = MinHasher()
+    if signatures is None:
+        signatures = {}
+    positions, flat = [], []
+    for doc_id, doc_nodes in chunks.items():
+        if doc_id not in signatures:
+            signatures[doc_id] = [hasher.signature(node.get_content(metadata_mode=MetadataMode.NONE)) for node in doc_nodes]
+        positions.extend((doc_id, position) for position in range(len(signatures[doc_id])))
+        flat.extend(signatures[doc_id])
+
+    groups = near_duplicate_groups(flat, threshold)
+    grouped = {positions[i][0] for group in groups for i in group}
+    for doc_id in grouped:
+        if chunks[doc_id] is None:
+            chunks[doc_id] = load(doc_id)
+
+    dropped: set = set()
+    for group in groups:
+        members = sorted((chunks[doc_id][position] for doc_id, position in (positions[i] for i in group)), key=canonical_key)
+        canonical, others = members[0], members[1:]
+        merge_source_urls(canonical, others)
+        dropped.update(id(node) for node in others)
+
+    if dropped:
+        for doc_id in grouped:
+            chunks[doc_id] = [node for node in chunks[doc_id] if id(node) not in dropped]
+        logger.info(f"Dropped {len(dropped)} near-duplicate chunks")
+    return len(dropped), grouped
@@ -0,0 +1,376 @@
+"""
+Embedding model backends.
+
+EMBEDDING_BACKEND selects how the sentence-transformers model runs:
+- torch (default): HuggingFaceEmbeddings on torch, CUDA when available
+- onnx: the same model exported to ONNX and run with onnxruntime on CPU,
+  optionally dynamically quantized to int8. Neither torch nor
+  sentence-transformers is imported, which keeps per-worker memory down.
+
+onnxruntime is an optional dependency (`pip install onnxruntime onnx`). Export the
+model once with:
+    python -m rag.embeddings export            # writes model.onnx and model_int8.onnx
+
+With EMBED_BATCHING, the model is wrapped in BatchingEmbedding so concurrent
+async query embeddings are coalesced into one batched forward pass. With
+QUERY_EMBEDDING_CACHE, query embeddings are served from a persistent cache first.
+"""
+
+# Standard library imports
+import argparse
+import asyncio
+import logging
+import os
+import time
+from typing import Any, List
+
+# Third-party imports
+import numpy as np
+from pydantic import PrivateAttr
+
+# llama_index imports
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.embeddings.utils import resolve_embed_model
+
+# Local or project-specific imports
+from dependencies.metrics import Histogram
+from rag.cache import QUERY_EMBEDDING_CACHE_PATH, QueryEmbeddingCache
+
+
+logger = logging.getLogger("rag_engine")
+
+# Embedding model configuration
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-mpnet-base-v2")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch or onnx
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", 0))  # Intra-op threads, 0 lets the runtime decide
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "storage/onnx/all-mpnet-base-v2")
+ONNX_QUANTIZE = os.getenv("ONNX_QUANTIZE", "true").lower() == "true"  # Use the int8 model
+ONNX_MAX_LENGTH = 384  # all-mpnet-base-v2 max_seq_length
+
+EMBED_BATCHING = os.getenv("EMBED_BATCHING", "true").lower() == "true"
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", 32))
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", 5))  # How long the first request waits for company
+QUERY_EMBEDDING_CACHE = os.getenv("QUERY_EMBEDDING_CACHE", "true").lower() == "true"
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model_int8.onnx"
+
+EMBED_BATCH_SIZE = Histogram(
+    "embedding_batch_size",
+    "Number of query embeddings computed per micro-batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+EMBED_QUEUE_WAIT = Histogram(
+    "embedding_queue_wait_seconds",
+    "Time a query embedding waited in the micro-batching queue",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+
+
+class OnnxEmbedding(BaseEmbedding):
+    """Mean-pooled, L2-normalized sentence embeddings from an exported ONNX transformer"""
+
+    model_dir: str
+    quantized: bool = True
+    max_length: int = ONNX_MAX_LENGTH
+    num_threads: int = 0
+
+    _session: Any = PrivateAttr()
+    _tokenizer: Any = PrivateAttr()
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, model_name: str = EMBEDDING_MODEL_NAME,
+                 quantized: bool = ONNX_QUANTIZE, num_threads: int = EMBEDDING_THREADS, **kwargs: Any):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("EMBEDDING_BACKEND=onnx requires onnxruntime: pip install onnxruntime") from e
+        from transformers import AutoTokenizer
+
+        super().__init__(model_name=model_name, model_dir=model_dir, quantized=quantized, num_threads=num_threads, **kwargs)
+        path = os.path.join(model_dir, ONNX_INT8_MODEL_FILE if quantized else ONNX_MODEL_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found. Export it with `python -m rag.embeddings export`")
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self._session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self._tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "OnnxEmbedding"
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        encoded = self._tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+        inputs = {item.name: encoded[item.name].astype(np.int64) for item in self._session.get_inputs()}
+        hidden = self._session.run(None, inputs)[0]
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed([query])[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts)
+
+    # onnxruntime releases the GIL, so running in a thread keeps the event loop free
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await asyncio.to_thread(self._get_query_embedding, query)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return await asyncio.to_thread(self._get_text_embedding, text)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self._get_text_embeddings, texts)
+
+
+class BatchingEmbedding(BaseEmbedding):
+    """Coalesces concurrent async embedding calls into batches for the wrapped model.
+
+    The first queued request waits up to `max_wait_ms` for others to arrive; the
+    batch then runs in a worker thread while the next one fills up. Only one batch
+    runs at a time, since the model already uses every inference thread. Batched
+    queries are embedded as text, which is only correct for symmetric models such as
+    all-mpnet-base-v2 that use no query instruction. Sync calls go straight through.
+    """
+
+    max_batch_size: int = EMBED_BATCH_MAX_SIZE
+    max_wait_ms: float = EMBED_BATCH_MAX_WAIT_MS
+
+    _inner: Any = PrivateAttr()
+    _loop: Any = PrivateAttr(default=None)
+    _queue: Any = PrivateAttr(default=None)
+    _worker: Any = PrivateAttr(default=None)
+
+    def __init__(self, inner: BaseEmbedding, max_batch_size: int = EMBED_BATCH_MAX_SIZE,
+                 max_wait_ms: float = EMBED_BATCH_MAX_WAIT_MS, **kwargs: Any):
+        super().__init__(model_name=inner.model_name, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                         embed_batch_size=inner.embed_batch_size, **kwargs)
+        self._inner = inner
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "BatchingEmbedding"
+
+    @property
+    def inner(self) -> BaseEmbedding:
+        return self._inner
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._inner.get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._inner.get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._inner.get_text_embedding_batch(texts)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await self._submit(query)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return await self._submit(text)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self._inner.get_text_embedding_batch, texts)
+
+    async def _submit(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        # The queue and worker belong to one event loop; recreate them if the loop changed
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        future = loop.create_future()
+        self._queue.put_nowait((text, future, time.perf_counter()))
+        return await future
+
+    async def _next_batch(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                EMBED_QUEUE_WAIT.observe(started - enqueued)
+            EMBED_BATCH_SIZE.observe(len(batch))
+            try:
+                vectors = await asyncio.to_thread(self._inner.get_text_embedding_batch, [text for text, _, _ in batch])
+            except Exception as e:
+                logger.error(f"Error embedding batch of {len(batch)}: {str(e)}", exc_info=True)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future, _), vector in zip(batch, vectors):
+                # A caller may have been cancelled (e.g. client disconnected) while waiting
+                if not future.done():
+                    future.set_result(vector)
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Serves query embeddings from a QueryEmbeddingCache before calling the wrapped model.
+
+    Only queries are cached; document embeddings at ingest time always go to the model.
+    """
+
+    _inner: Any = PrivateAttr()
+    _cache: Any = PrivateAttr()
+
+    def __init__(self, inner: BaseEmbedding, cache: QueryEmbeddingCache, **kwargs: Any):
+        super().__init__(model_name=inner.model_name, embed_batch_size=inner.embed_batch_size, **kwargs)
+        self._inner = inner
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def cache(self) -> QueryEmbeddingCache:
+        return self._cache
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        embedding = self._cache.get(query)
+        if embedding is None:
+            embedding = self._inner.get_query_embedding(query)
+            self._cache.put(query, embedding)
+        return embedding
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        # Memory hits are served inline; SQLite reads and writes run off the event loop
+        embedding = self._cache.get_from_memory(query)
+        if embedding is None:
+            embedding = await asyncio.to_thread(self._cache.get, query)
+        if embedding is None:
+            embedding = await self._inner.aget_query_embedding(query)
+            await asyncio.to_thread(self._cache.put, query, embedding)
+        return embedding
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._inner.get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._inner.get_text_embedding_batch(texts)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return await self._inner.aget_text_embedding(text)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await self._inner.aget_text_embedding_batch(texts)
+
+
+def embedding_model_id(backend: str = EMBEDDING_BACKEND) -> str:
+    """Identifies the model and backend that produced a vector, e.g. for cache invalidation"""
+    if backend == "onnx":
+        return f"{EMBEDDING_MODEL_NAME}:onnx" + (":int8" if ONNX_QUANTIZE else "")
+    return f"{EMBEDDING_MODEL_NAME}:{backend}"
+
+
+def build_torch_embed_model(model_name: str = EMBEDDING_MODEL_NAME, num_threads: int = EMBEDDING_THREADS):
+    from langchain_huggingface import HuggingFaceEmbeddings
+    import torch
+
+    device = "cuda:0" if torch.cuda.is_available() else "cpu"
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    logger.info(f"Using device: {device}")
+    return HuggingFaceEmbeddings(model_name=model_name, model_kwargs={"device": device})
+
+
+def build_embed_model(backend: str = EMBEDDING_BACKEND, batching: bool = EMBED_BATCHING, cache: bool = QUERY_EMBEDDING_CACHE,
+                      base_model: BaseEmbedding | None = None):
+    """
+    Builds the embedding model for the configured backend, wrapped for micro-batching
+    and caching if enabled. base_model replaces the backend's model (e.g. a local
+    stand-in for benchmarks) but keeps the same wrappers.
+    """
+    if base_model is not None:
+        logger.info(f"Using embedding model {base_model.model_name}")
+        embed_model = base_model
+    elif backend == "torch":
+        logger.info(f"Initializing embedding model {EMBEDDING_MODEL_NAME} ({backend} backend)")
+        # LangChain models are adapted to a llama_index embedding
+        embed_model = resolve_embed_model(build_torch_embed_model())
+    elif backend == "onnx":
+        logger.info(f"Initializing embedding model {EMBEDDING_MODEL_NAME} ({backend} backend)")
+        embed_model = OnnxEmbedding()
+    else:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+
+    if batching:
+        logger.info(f"Micro-batching query embeddings (max_batch_size={EMBED_BATCH_MAX_SIZE}, max_wait_ms={EMBED_BATCH_MAX_WAIT_MS})")
+        embed_model = BatchingEmbedding(embed_model)
+    if cache:
+        logger.info(f"Caching query embeddings in {QUERY_EMBEDDING_CACHE_PATH}")
+        model_id = base_model.model_name if base_model is not None else embedding_model_id(backend)
+        embed_model = CachedEmbedding(embed_model, QueryEmbeddingCache(QUERY_EMBEDDING_CACHE_PATH, model_id))
+    return embed_model
+
+
+def export_onnx_model(model_name: str = EMBEDDING_MODEL_NAME, output_dir: str = ONNX_MODEL_DIR, quantize: bool = True):
+    """Exports the transformer to ONNX with dynamic batch/sequence axes, plus a dynamically quantized int8 copy"""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["export sample"], return_tensors="pt")
+
+    model_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    dynamic_axes = {"input_ids": {0: "batch", 1: "sequence"}, "attention_mask": {0: "batch", 1: "sequence"},
+                    "last_hidden_state": {0: "batch", 1: "sequence"}}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            model_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    tokenizer.save_pretrained(output_dir)
+    logger.info(f"Exported {model_name} to {model_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = os.path.join(output_dir, ONNX_INT8_MODEL_FILE)
+        quantize_dynamic(model_path, int8_path, weight_type=QuantType.QInt8)
+        logger.info(f"Wrote int8 model to {int8_path}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Manage the ONNX embedding backend")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    export = subcommands.add_parser("export", help="Export the embedding model to ONNX")
+    export.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    export.add_argument("--output", default=ONNX_MODEL_DIR)
+    export.add_argument("--no-quantize", action="store_true")
+    args = parser.parse_args()
+
+    export_onnx_model(args.model, args.output, quantize=not args.no_quantize)
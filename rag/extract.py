@@ -0,0 +1,295 @@
+"""
+Extraction stage of the ingestion pipeline for the Docusaurus docs corpus.
+
+Turns a page's HTML into a list of markdown blocks from the article body only
+(navbar, sidebars, table of contents, breadcrumbs, pagination and footer are
+dropped), removes blocks repeated across many pages, and keeps every code sample
+and table as a single block that chunking never splits.
+"""
+
+# Standard library imports
+import logging
+import os
+import re
+from urllib.parse import unquote, urlparse
+
+# Third-party imports
+from bs4 import BeautifulSoup, Comment, NavigableString, Tag
+from llama_index.core.node_parser.interface import MetadataAwareTextSplitter
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.utils import get_tokenizer
+from pydantic import Field
+
+
+logger = logging.getLogger("rag_ingest")
+
+# Extraction configuration
+BOILERPLATE_PAGE_SHARE = float(os.getenv("BOILERPLATE_PAGE_SHARE", 0.3))  # Blocks on at least this share of pages are dropped
+BOILERPLATE_MIN_PAGES = 3
+
+BOILERPLATE_TAGS = ("script", "style", "noscript", "svg", "nav", "footer", "aside", "button", "form")
+BOILERPLATE_SELECTORS = (
+    ".navbar", ".theme-doc-sidebar-container", ".theme-doc-toc-mobile", ".theme-doc-toc-desktop",
+    ".table-of-contents", ".theme-doc-breadcrumbs", ".pagination-nav", ".theme-doc-footer",
+    ".theme-edit-this-page", ".theme-last-updated", ".hash-link", "[class^=skipToContent]",
+)
+HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+BLOCK_TAGS = HEADING_TAGS + (
+    "p", "pre", "table", "ul", "ol", "li", "div", "section", "article", "blockquote", "details", "dl", "dt", "dd",
+)
+COUNTRIES = ("nigeria", "kenya")
+SERVICES = ("identity", "credit", "income", "erm", "radar", "recovapro", "widget", "webhook", "sdk")
+ATOMIC_KINDS = ("code", "table")
+
+
+def url_metadata(url: str) -> dict:
+    """
+    Derives country, service and endpoint from a docs URL, e.g.
+    /nigeria/identity/submitBorrower -> {"country": "nigeria", "service": "identity", "endpoint": "submitBorrower"}
+    """
+    segments = [unquote(segment) for segment in urlparse(url).path.split("/") if segment]
+    metadata = {"url": url}
+    if not segments:
+        return metadata
+
+    lowered = [segment.lower() for segment in segments]
+    country = next((segment for segment in lowered if segment in COUNTRIES or segment.rstrip("-") in COUNTRIES), None)
+    if country:
+        metadata["country"] = country.rstrip("-")
+
+    service = next(
+        (service for segment in lowered for service in SERVICES if segment == service or segment.startswith(service)),
+        None,
+    )
+    if service:
+        metadata["service"] = service
+
+    if lowered[0] != "category":
+        endpoint = re.sub(r"\.md$", "", segments[-1])
+        if endpoint.lower() not in COUNTRIES + SERVICES:
+            metadata["endpoint"] = endpoint
+    return metadata
+
+
+def clean_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def code_to_markdown(pre: Tag) -> str:
+    language = ""
+    for element in (pre, pre.find("code"), pre.parent):
+        for css_class in (element.get("class") or []) if element else []:
+            if css_class.startswith("language-"):
+                language = css_class[len("language-"):]
+    # Docusaurus renders each line as a span.token-line; plain <pre> blocks keep their newlines
+    lines = pre.select(".token-line")
+    if lines:
+        code = "\n".join(line.get_text() for line in lines)
+    else:
+        for br in pre.find_all("br"):
+            br.replace_with("\n")
+        code = pre.get_text()
+    return f"```{language}\n{code.strip(chr(10))}\n```"
+
+
+def table_to_markdown(table: Tag) -> str:
+    rows = []
+    for tr in table.find_all("tr"):
+        cells = [clean_text(cell.get_text(" ")).replace("|", "\\|") for cell in tr.find_all(["th", "td"])]
+        if cells:
+            rows.append(cells)
+    if not rows:
+        return ""
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    lines = ["| " + " | ".join(rows[0]) + " |", "|" + " --- |" * width]
+    lines.extend("| " + " | ".join(row) + " |" for row in rows[1:])
+    return "\n".join(lines)
+
+
+def _walk(element: Tag, blocks: list):
+    """Appends [kind, markdown] blocks for element's children in document order"""
+    inline: list = []
+
+    def flush():
+        text = clean_text(" ".join(inline))
+        inline.clear()
+        if text:
+            blocks.append(["text", text])
+
+    for child in element.children:
+        if isinstance(child, Comment):
+            continue
+        if isinstance(child, NavigableString):
+            inline.append(str(child))
+            continue
+        if not isinstance(child, Tag):
+            continue
+        if child.name not in BLOCK_TAGS and child.find(BLOCK_TAGS) is None:
+            inline.append(child.get_text(" "))
+            continue
+
+        flush()
+        if child.name == "pre":
+            blocks.append(["code", code_to_markdown(child)])
+        elif child.name == "table":
+            table = table_to_markdown(child)
+            if table:
+                blocks.append(["table", table])
+        elif child.name in HEADING_TAGS:
+            text = clean_text(child.get_text(" "))
+            if text:
+                blocks.append(["heading", "#" * int(child.name[1]) + " " + text])
+        elif child.find(BLOCK_TAGS) is None:
+            text = clean_text(child.get_text(" "))
+            if text:
+                blocks.append(["text", f"- {text}" if child.name == "li" else text])
+        else:
+            _walk(child, blocks)
+    flush()
+
+
+def html_to_blocks(html: str) -> list:
+    """Extracts the article body of a page as a list of [kind, markdown] blocks"""
+    soup = BeautifulSoup(html, "html.parser")
+    for element in soup.find_all(BOILERPLATE_TAGS):
+        element.decompose()
+    for element in soup.select(", ".join(BOILERPLATE_SELECTORS)):
+        element.decompose()
+    # Inline code keeps its backticks so identifiers stay recognisable in the text
+    for code in soup.find_all("code"):
+        if code.find_parent("pre") is None:
+            code.replace_with(f"`{code.get_text()}`")
+
+    root = soup.find("article") or soup.find("main") or soup.body or soup
+    blocks: list = []
+    _walk(root, blocks)
+    return blocks
+
+
+def remove_repeated_blocks(pages: dict, share: float = BOILERPLATE_PAGE_SHARE,
+                           min_pages: int = BOILERPLATE_MIN_PAGES) -> dict:
+    """
+    Drops blocks that appear on at least `share` of the pages (and at least min_pages
+    of them), such as category listings or banners the page-level selectors missed.
+    pages maps url -> blocks; headings are structural and always kept.
+    """
+    frequency: dict = {}
+    for blocks in pages.values():
+        for key in {tuple(block) for block in blocks if block[0] != "heading"}:
+            frequency[key] = frequency.get(key, 0) + 1
+
+    limit = max(min_pages, share * len(pages))
+    repeated = {key for key, count in frequency.items() if count >= limit}
+    if repeated:
+        logger.info(f"Dropping {len(repeated)} blocks repeated across {limit:.0f}+ of {len(pages)} pages")
+    return {
+        url: [block for block in blocks if tuple(block) not in repeated]
+        for url, blocks in pages.items()
+    }
+
+
+def render_blocks(blocks: list) -> str:
+    """Joins blocks into the markdown document that gets chunked and embedded"""
+    if not any(kind != "heading" for kind, _ in blocks):
+        return ""
+    return "\n\n".join(text for _, text in blocks)
+
+
+def split_markdown_blocks(text: str) -> list:
+    """Splits rendered markdown back into (kind, text) blocks, keeping fenced code and tables whole"""
+    blocks: list = []
+    current: list = []
+    kind = None
+
+    def flush():
+        nonlocal kind
+        if current:
+            blocks.append((kind or "text", "\n".join(current)))
+        current.clear()
+        kind = None
+
+    for line in text.split("\n"):
+        if kind == "code":
+            current.append(line)
+            if line.startswith("```"):
+                flush()
+            continue
+        if line.startswith("```"):
+            flush()
+            kind = "code"
+            current.append(line)
+        elif line.startswith("|"):
+            if kind != "table":
+                flush()
+                kind = "table"
+            current.append(line)
+        elif not line.strip():
+            flush()
+        else:
+            if kind == "table":
+                flush()
+            if line.startswith("#"):
+                flush()
+                blocks.append(("heading", line))
+            else:
+                current.append(line)
+    flush()
+    return blocks
+
+
+class MarkdownBlockSplitter(MetadataAwareTextSplitter):
+    """
+    Packs markdown blocks greedily into chunks of up to chunk_size tokens.
+
+    Code blocks and tables are never split; a chunk never ends on a heading, and a
+    new chunk starts at a top-level heading once the current one is reasonably full.
+    Only prose blocks longer than a whole chunk fall back to sentence splitting.
+    """
+
+    chunk_size: int = Field(default=1024, gt=0)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MarkdownBlockSplitter"
+
+    def split_text(self, text: str) -> list:
+        return self.split_text_metadata_aware(text, "")
+
+    def split_text_metadata_aware(self, text: str, metadata_str: str) -> list:
+        tokenizer = get_tokenizer()
+        budget = max(self.chunk_size - len(tokenizer(metadata_str)), self.chunk_size // 4)
+        sentence_splitter = SentenceSplitter(chunk_size=budget, chunk_overlap=0)
+
+        chunks: list = []
+        current: list = []
+        current_tokens = 0
+
+        def flush():
+            nonlocal current_tokens
+            # Trailing headings move to the next chunk so they stay with their content
+            trailing = []
+            while current and current[-1][0] == "heading":
+                trailing.insert(0, current.pop())
+            if current:
+                chunks.append("\n\n".join(block_text for _, block_text in current))
+            current[:] = trailing
+            current_tokens = sum(len(tokenizer(block_text)) for _, block_text in trailing)
+
+        for kind, block_text in split_markdown_blocks(text):
+            tokens = len(tokenizer(block_text))
+            if kind == "heading" and block_text.startswith(("# ", "## ")) and current_tokens > budget // 2:
+                flush()
+            if current_tokens + tokens > budget:
+                flush()
+            if tokens > budget and kind not in ATOMIC_KINDS:
+                for part in sentence_splitter.split_text(block_text):
+                    current.append((kind, part))
+                    flush()
+                continue
+            current.append((kind, block_text))
+            current_tokens += tokens
+        flush()
+        if current:
+            chunks.append("\n\n".join(block_text for _, block_text in current))
+        return chunks
@@ -0,0 +1,90 @@
+"""
+Metadata filters for retrieval by country and service.
+
+Chunks carry `country` and `service` metadata parsed from their URL at ingest
+(see rag/extract.py). A question is routed to a subset of the index either by
+explicit values on the request or by a lightweight keyword router that only
+commits to a filter when the question is unambiguous.
+
+Inferred filters are hard filters, so the keywords are limited to product names,
+codes and currencies. Everyday words ("policy", "claim", "collection", "income")
+and short codes that read as other words ("kes", "nin") would route ordinary
+questions away from the chunks that answer them.
+"""
+
+# Standard library imports
+import re
+
+# llama_index imports
+from llama_index.core.vector_stores import MetadataFilter, MetadataFilters
+
+# Local or project-specific imports
+from rag.extract import COUNTRIES, SERVICES
+
+
+COUNTRY_KEYWORDS = {
+    "nigeria": ("nigeria", "nigerian", "naira", "ngn", "bvn"),
+    "kenya": ("kenya", "kenyan", "mpesa", "m-pesa"),
+}
+SERVICE_KEYWORDS = {
+    "identity": ("kyc", "bvn", "cac", "igree"),
+    "credit": ("credit bureau", "crc", "first central", "firstcentral", "credit registry", "iscore", "fico"),
+    "income": ("open banking", "insight data"),
+    "erm": ("curacel",),
+    "recovapro": ("recovapro", "recova"),
+    "radar": ("radar",),
+    "widget": ("widget",),
+}
+
+
+def _matches(question: str, keywords_by_value: dict) -> list:
+    return [
+        value for value, keywords in keywords_by_value.items()
+        if any(re.search(rf"\b{re.escape(keyword)}\b", question) for keyword in keywords)
+    ]
+
+
+def infer_filters(question: str) -> dict:
+    """
+    Infers {"country": ..., "service": ...} from keywords in the question.
+    A key is only set when exactly one value matches, so vague or cross-cutting
+    questions still search the whole index.
+    """
+    question = question.lower()
+    filters = {}
+    countries = _matches(question, COUNTRY_KEYWORDS)
+    if len(countries) == 1:
+        filters["country"] = countries[0]
+    services = _matches(question, SERVICE_KEYWORDS)
+    if len(services) == 1:
+        filters["service"] = services[0]
+    return filters
+
+
+def resolve_filters(question: str, country: str | None = None, service: str | None = None) -> dict:
+    """Explicit values win over inferred ones; raises ValueError for an unknown country or service"""
+    filters = infer_filters(question)
+    for key, value, allowed in (("country", country, COUNTRIES), ("service", service, SERVICES)):
+        if value is None:
+            continue
+        value = value.strip().lower()
+        if value not in allowed:
+            raise ValueError(f"Unknown {key} '{value}', expected one of: {', '.join(allowed)}")
+        filters[key] = value
+    return filters
+
+
+def filters_key(filters: dict) -> tuple:
+    """Hashable, order-independent form of filters"""
+    return tuple(sorted(filters.items()))
+
+
+def filters_scope(key: tuple) -> str:
+    """Stable string form of a filters_key, e.g. "country=kenya,service=credit" """
+    return ",".join(f"{name}={value}" for name, value in key)
+
+
+def to_metadata_filters(filters: dict) -> MetadataFilters | None:
+    if not filters:
+        return None
+    return MetadataFilters(filters=[MetadataFilter(key=key, value=value) for key, value in filters_key(filters)])
@@ -0,0 +1,174 @@
+# Standard library imports
+import hashlib
+import json
+import logging
+import os
+
+# llama_index imports
+from llama_index.core import Settings
+from llama_index.core.schema import MetadataMode
+
+
+logger = logging.getLogger("rag_engine")
+
+# Incremental indexing configuration
+INDEX_MANIFEST_PATH = os.getenv("INDEX_MANIFEST_PATH", "storage/index_manifest.json")
+# Mid-run checkpoints go here, so their writes do not change index_version()
+INDEX_CHECKPOINT_PATH = INDEX_MANIFEST_PATH + ".checkpoint"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_manifest(path: str = INDEX_MANIFEST_PATH) -> dict:
+    """
+    Loads the manifest of what is currently indexed:
+    {doc_id: {"hash": <document hash>, "chunks": [<chunk ids>]}}
+    Ingestion also caches per-page deduplication inputs in each entry (see
+    rag/ingest.py), so unchanged pages are not re-chunked or re-hashed.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def index_version(path: str = INDEX_MANIFEST_PATH):
+    """
+    Identifies the indexed corpus by the manifest's mtime, which changes whenever
+    `python -m rag.ingest` writes it. None before the first ingestion.
+    """
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def save_manifest(manifest: dict, path: str = INDEX_MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def delete_vectors(vector_store, node_ids: list, namespace: str | None = None):
+    """Deletes vectors by node id, falling back to the raw client for stores without delete_nodes"""
+    if not node_ids:
+        return
+    try:
+        vector_store.delete_nodes(node_ids=node_ids)
+    except NotImplementedError:
+        vector_store.client.delete(ids=node_ids, namespace=namespace)
+
+
+def clear_vectors(vector_store, namespace: str | None = None):
+    """Removes every vector from the store"""
+    try:
+        vector_store.clear()
+    except NotImplementedError:
+        vector_store.client.delete(delete_all=True, namespace=namespace)
+
+
+def assign_chunk_ids(doc_id: str, nodes: list) -> list:
+    """
+    Derives node ids from their content and metadata, so an unchanged chunk keeps
+    its id (and its vector) across re-indexing runs
+    """
+    seen: dict = {}
+    for node in nodes:
+        chunk_hash = content_hash(node.get_content(metadata_mode=MetadataMode.ALL))[:16]
+        occurrence = seen.get(chunk_hash, 0)
+        seen[chunk_hash] = occurrence + 1
+        node.id_ = f"{doc_id}#{chunk_hash}" + (f"-{occurrence}" if occurrence else "")
+    return nodes
+
+
+def chunk_document(doc) -> list:
+    """Splits a document into nodes with content-derived ids"""
+    return assign_chunk_ids(doc.doc_id, Settings.node_parser.get_nodes_from_documents([doc]))
+
+
+def empty_report() -> dict:
+    return {
+        "documents_added": 0, "documents_changed": 0, "documents_removed": 0, "documents_unchanged": 0,
+        "chunks_embedded": 0, "chunks_deleted": 0, "chunks_unchanged": 0,
+    }
+
+
+def merge_reports(total: dict, report: dict) -> dict:
+    for key, value in report.items():
+        total[key] += value
+    return total
+
+
+def update_index(index, vector_store, docs: list, manifest: dict, namespace: str | None = None, prune: bool = True,
+                 chunks: dict | None = None) -> dict:
+    """
+    Brings the index in line with docs, embedding only new or changed chunks and
+    deleting vectors for chunks that no longer exist. With prune, pages missing from
+    docs are removed as well; pass prune=False when docs is only one batch of the
+    corpus. chunks optionally maps doc id -> pre-chunked nodes (e.g. after
+    near-duplicate removal) instead of chunking here; None marks a page whose
+    chunks are known to be the ones already in the manifest.
+    Updates manifest in place and returns a report of what changed.
+    """
+    report = empty_report()
+
+    for doc in docs:
+        doc_id = doc.doc_id
+        doc_content = doc.get_content(metadata_mode=MetadataMode.ALL)
+        previous = manifest.get(doc_id)
+        if chunks is not None:
+            # Which chunks survive deduplication depends on the rest of the corpus
+            chunk_ids = previous["chunks"] if chunks[doc_id] is None else [node.node_id for node in chunks[doc_id]]
+            doc_content += "".join(chunk_ids)
+        doc_hash = content_hash(doc_content)
+        if previous is not None and previous["hash"] == doc_hash:
+            report["documents_unchanged"] += 1
+            report["chunks_unchanged"] += len(previous["chunks"])
+            continue
+
+        nodes = chunks[doc_id] if chunks is not None else chunk_document(doc)
+        old_chunks = set(previous["chunks"]) if previous else set()
+        new_nodes = [node for node in nodes if node.node_id not in old_chunks]
+        stale = old_chunks - {node.node_id for node in nodes}
+
+        delete_vectors(vector_store, sorted(stale), namespace)
+        if new_nodes:
+            index.insert_nodes(new_nodes)
+
+        manifest[doc_id] = {"hash": doc_hash, "chunks": [node.node_id for node in nodes]}
+        report["documents_changed" if previous else "documents_added"] += 1
+        report["chunks_embedded"] += len(new_nodes)
+        report["chunks_deleted"] += len(stale)
+        report["chunks_unchanged"] += len(nodes) - len(new_nodes)
+
+    if prune:
+        merge_reports(report, remove_documents(vector_store, manifest, {doc.doc_id for doc in docs}, namespace))
+    return report
+
+
+def remove_documents(vector_store, manifest: dict, keep_ids: set, namespace: str | None = None) -> dict:
+    """Deletes the vectors of every indexed page not in keep_ids"""
+    report = empty_report()
+    for doc_id in sorted(set(manifest) - set(keep_ids)):
+        removed = manifest.pop(doc_id)
+        delete_vectors(vector_store, removed["chunks"], namespace)
+        report["documents_removed"] += 1
+        report["chunks_deleted"] += len(removed["chunks"])
+    return report
+
+
+def sync_sparse_index(sparse_index, chunks: dict, manifest: dict) -> bool:
+    """
+    Brings the BM25 index in line with the chunks recorded in the manifest, adding
+    the nodes it is missing from chunks. Returns True if anything changed.
+    """
+    live = {node_id for entry in manifest.values() for node_id in entry["chunks"]}
+    stale = [node_id for node_id in sparse_index.records if node_id not in live]
+    missing = [node for nodes in chunks.values() if nodes is not None for node in nodes if node.node_id not in sparse_index]
+    sparse_index.remove(stale)
+    sparse_index.add(missing)
+    return bool(stale or missing)
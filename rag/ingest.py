@@ -0,0 +1,252 @@
+"""
+Standalone ingestion pipeline: crawl -> extract -> dedup -> chunk -> dedup -> embed -> upsert.
+
+Runs outside the API server so building the index never blocks startup and
+multiple uvicorn workers never rebuild it concurrently. All pages are fetched and
+extracted first, since boilerplate is detected across the whole corpus; they are
+then chunked and embedded in bounded batches, checkpointing the vector store and
+manifest after each batch so an interrupted run resumes where it stopped. The
+manifest itself, whose change makes running workers reload, is written once at
+the end, after the BM25 index.
+
+Usage:
+    python -m rag.ingest                      # incremental update from rag/data/extractions.py
+    python -m rag.ingest --full               # wipe and rebuild the index
+    python -m rag.ingest --crawl https://docs.creditchek.africa/
+    python -m rag.ingest --offline            # rebuild from the local page cache only
+"""
+
+# Standard library imports
+import argparse
+import logging
+import os
+import time
+
+# Third-party imports
+from llama_index.core import VectorStoreIndex
+from llama_index.core.schema import MetadataMode
+
+# Local or project-specific imports
+from rag.bm25 import BM25_INDEX_PATH, BM25Index
+from rag.cache import invalidate_answer_cache
+from rag.crawler import crawl_website
+from rag.dedup import decode_signature, dedup_chunks, dedup_documents, encode_signature
+from rag.data.extractions import extractions
+from rag.indexing import (
+    INDEX_CHECKPOINT_PATH,
+    assign_chunk_ids,
+    chunk_document,
+    clear_vectors,
+    content_hash,
+    empty_report,
+    load_manifest,
+    merge_reports,
+    remove_documents,
+    save_manifest,
+    sync_sparse_index,
+    update_index,
+)
+from rag.loader import load_documents
+from rag.query_engine import LOCAL_INDEX_DIR, NAMESPACE, VECTOR_STORE_BACKEND, configure_settings, get_vector_store
+
+
+logger = logging.getLogger("rag_ingest")
+
+# Ingestion configuration
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 10))  # Pages chunked and embedded per batch
+INDEX_UPDATE_MODE = os.getenv("INDEX_UPDATE_MODE", "incremental")  # incremental or full
+
+
+def batched(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def has_changes(report: dict) -> bool:
+    return bool(report["chunks_embedded"] or report["chunks_deleted"])
+
+
+def page_hash(doc) -> str:
+    return content_hash(doc.get_content(metadata_mode=MetadataMode.ALL))
+
+
+def cached_page_signatures(manifest: dict) -> dict:
+    """doc id -> (page hash, MinHash signature) of every page seen last run, near-duplicates included"""
+    cached = {}
+    for doc_id, entry in manifest.items():
+        if "signature" in entry:
+            cached[doc_id] = (entry["page_hash"], entry["signature"])
+        for duplicate_id, duplicate in entry.get("duplicates", {}).items():
+            cached[duplicate_id] = (duplicate["page_hash"], duplicate["signature"])
+    return cached
+
+
+def unchanged_chunks(entry: dict | None, doc, sparse_index) -> list | None:
+    """
+    Cached chunk signatures of a page whose chunks are exactly those in the manifest:
+    same content and metadata, no near-duplicate chunk last run and fully in the BM25
+    index. None when the page has to be chunked.
+    """
+    if entry is None or entry.get("chunk_hash") != page_hash(doc) or entry.get("deduplicated", True):
+        return None
+    if any(node_id not in sparse_index for node_id in entry["chunks"]):
+        return None
+    return [decode_signature(signature) for signature in entry["chunk_signatures"]]
+
+
+def cache_dedup_inputs(manifest: dict, documents: list, page_hashes: dict, page_signatures: dict,
+                       chunk_signatures: dict, deduplicated: set, duplicates: dict) -> bool:
+    """
+    Records the deduplication inputs of every indexed page in its manifest entry, and
+    those of near-duplicate pages under their canonical page. Returns True if anything changed.
+    """
+    changed = False
+    for doc in documents:
+        entry = manifest.get(doc.doc_id)
+        if entry is None:
+            continue
+        cache = {
+            "page_hash": page_hashes[doc.doc_id],
+            "signature": encode_signature(page_signatures[doc.doc_id]),
+            "chunk_hash": page_hash(doc),
+            "chunk_signatures": [encode_signature(signature) for signature in chunk_signatures[doc.doc_id]],
+            "deduplicated": doc.doc_id in deduplicated,
+            "duplicates": {
+                duplicate_id: {"page_hash": page_hashes[duplicate_id], "signature": encode_signature(page_signatures[duplicate_id])}
+                for duplicate_id, canonical_id in sorted(duplicates.items()) if canonical_id == doc.doc_id
+            },
+        }
+        if any(entry.get(key) != value for key, value in cache.items()):
+            entry.update(cache)
+            changed = True
+    return changed
+
+
+def run_ingestion(urls: list, full: bool = False, batch_size: int = INGEST_BATCH_SIZE, offline: bool = False) -> dict:
+    """Brings the configured vector store in line with urls and returns a change report"""
+    start_time = time.time()
+    embed_model = configure_settings()
+    vector_store, vector_count = get_vector_store()
+
+    # A checkpoint is left behind by an interrupted run and matches the persisted vectors
+    manifest = load_manifest(INDEX_CHECKPOINT_PATH) if os.path.exists(INDEX_CHECKPOINT_PATH) else load_manifest()
+    if full or vector_count == 0:
+        logger.info(f"Rebuilding vector index from scratch ({VECTOR_STORE_BACKEND} backend)")
+        if vector_count:
+            clear_vectors(vector_store, NAMESPACE)
+        manifest = {}
+        sparse_index = BM25Index()
+    else:
+        logger.info(f"Incrementally updating vector index with {vector_count} vectors ({VECTOR_STORE_BACKEND} backend)")
+        sparse_index = BM25Index.load(BM25_INDEX_PATH)
+
+    index = VectorStoreIndex.from_vector_store(vector_store=vector_store, embed_model=embed_model)
+    report = empty_report()
+    # Unchanged pages come back from the page cache via a 304 and hash identically,
+    # so update_index skips re-embedding them
+    documents, removed_urls = load_documents(urls, offline=offline)
+
+    # Near-duplicate pages and chunks are collapsed before anything is embedded. MinHash
+    # signatures of unchanged pages come from the manifest, and pages whose chunks are
+    # unchanged are not chunked again unless one of their chunks has a near-duplicate
+    cached_signatures = cached_page_signatures(manifest)
+    page_hashes = {doc.doc_id: page_hash(doc) for doc in documents}
+    signatures = [
+        decode_signature(cached_signatures[doc.doc_id][1])
+        if cached_signatures.get(doc.doc_id, (None,))[0] == page_hashes[doc.doc_id] else None
+        for doc in documents
+    ]
+    all_documents = documents
+    documents, duplicates = dedup_documents(documents, signatures=signatures)
+    page_signatures = {doc.doc_id: signature for doc, signature in zip(all_documents, signatures)}
+
+    docs_by_id = {doc.doc_id: doc for doc in documents}
+    chunks, chunk_signatures = {}, {}
+    for doc in documents:
+        cached = unchanged_chunks(manifest.get(doc.doc_id), doc, sparse_index)
+        if cached is None:
+            chunks[doc.doc_id] = chunk_document(doc)
+        else:
+            chunks[doc.doc_id], chunk_signatures[doc.doc_id] = None, cached
+    skipped = set(chunk_signatures)
+    duplicate_chunks, deduplicated = dedup_chunks(
+        chunks, signatures=chunk_signatures, load=lambda doc_id: chunk_document(docs_by_id[doc_id])
+    )
+    logger.info(f"Chunked {len(documents) - len(skipped - deduplicated)} of {len(documents)} pages, the rest are unchanged")
+    for doc_id, nodes in chunks.items():
+        if nodes is not None:
+            # Merged source_urls metadata changes a chunk's id so its stored metadata is refreshed
+            assign_chunk_ids(doc_id, nodes)
+    batches = list(batched(documents, batch_size))
+
+    for number, docs in enumerate(batches, start=1):
+        batch_start = time.time()
+        batch_report = update_index(index, vector_store, docs, manifest, NAMESPACE, prune=False, chunks=chunks)
+        merge_reports(report, batch_report)
+
+        # Checkpoint so an interrupted run resumes from here. Running workers only reload
+        # once the real manifest is written, after the BM25 index is saved
+        if has_changes(batch_report):
+            vector_store.persist(LOCAL_INDEX_DIR)
+            save_manifest(manifest, INDEX_CHECKPOINT_PATH)
+        logger.info(
+            f"[{number}/{len(batches)}] {len(docs)} pages, "
+            f"{batch_report['chunks_embedded']} chunks embedded, "
+            f"{batch_report['chunks_unchanged']} unchanged "
+            f"({time.time() - batch_start:.1f}s)"
+        )
+
+    # Pages that failed to load this run are kept; pages dropped from urls, deleted
+    # upstream (404/410) or merged into a near-duplicate are removed
+    removed = remove_documents(vector_store, manifest, set(urls) - removed_urls - set(duplicates), NAMESPACE)
+    merge_reports(report, removed)
+    cache_changed = cache_dedup_inputs(
+        manifest, documents, page_hashes, page_signatures, chunk_signatures, deduplicated, duplicates
+    )
+    if has_changes(removed) or full:
+        vector_store.persist(LOCAL_INDEX_DIR)
+
+    # The BM25 index covers exactly the chunks in the manifest
+    sparse_changed = sync_sparse_index(sparse_index, chunks, manifest) or not os.path.exists(BM25_INDEX_PATH)
+    if sparse_changed:
+        sparse_index.save(BM25_INDEX_PATH)
+        logger.info(f"Saved BM25 index with {len(sparse_index)} chunks to {BM25_INDEX_PATH}")
+
+    # Running workers reload both indexes when the manifest changes, so it is written
+    # once, after the vectors and the BM25 index
+    if has_changes(report) or full or sparse_changed or cache_changed or os.path.exists(INDEX_CHECKPOINT_PATH):
+        save_manifest(manifest)
+    if os.path.exists(INDEX_CHECKPOINT_PATH):
+        os.remove(INDEX_CHECKPOINT_PATH)
+
+    if has_changes(report):
+        # Cached answers were generated from the old index
+        invalidate_answer_cache()
+
+    report["duplicate_documents"] = len(duplicates)
+    report["duplicate_chunks"] = duplicate_chunks
+    logger.info(f"Ingestion completed in {time.time() - start_time:.2f} seconds: {report}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the document vector index")
+    parser.add_argument("--full", action="store_true", default=INDEX_UPDATE_MODE == "full",
+                        help="Wipe the index and re-embed every page")
+    parser.add_argument("--crawl", metavar="START_URL",
+                        help="Discover pages by crawling START_URL instead of using rag/data/extractions.py")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--offline", action="store_true",
+                        help="Build from the local page cache only, without network access")
+    args = parser.parse_args()
+
+    urls = list(extractions)
+    if args.crawl:
+        urls = sorted(crawl_website(args.crawl))
+        logger.info(f"Crawl discovered {len(urls)} pages")
+
+    run_ingestion(urls, full=args.full, batch_size=args.batch_size, offline=args.offline)
+
+
+if __name__ == "__main__":
+    main()
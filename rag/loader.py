@@ -0,0 +1,164 @@
+# Standard library imports
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+# Third-party imports
+import httpx
+from llama_index.core import Document
+
+# Local or project-specific imports
+from rag.extract import html_to_blocks, remove_repeated_blocks, render_blocks, url_metadata
+
+
+logger = logging.getLogger("rag_ingest")
+
+# Document loader configuration
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", "cache/pages")
+LOADER_CONCURRENCY = int(os.getenv("LOADER_CONCURRENCY", 8))
+LOADER_TIMEOUT_SECONDS = float(os.getenv("LOADER_TIMEOUT_SECONDS", 15))
+
+
+class PageCache:
+    """On-disk cache of fetched pages: raw HTML, extracted blocks and validators per URL"""
+
+    def __init__(self, cache_dir: str = PAGE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url: str, suffix: str) -> str:
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.{suffix}")
+
+    def get(self, url: str):
+        """Returns the cached entry {url, etag, last_modified, fetched_at, html, blocks} or None"""
+        meta_path = self._path(url, "json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            entry = json.load(f)
+        with open(self._path(url, "html"), encoding="utf-8") as f:
+            entry["html"] = f.read()
+        blocks_path = self._path(url, "blocks.json")
+        if os.path.exists(blocks_path):
+            with open(blocks_path, encoding="utf-8") as f:
+                entry["blocks"] = json.load(f)
+        else:
+            # Entry written before extraction was cached (or by an older extractor)
+            entry["blocks"] = html_to_blocks(entry["html"])
+        return entry
+
+    def put(self, url: str, html: str, blocks: list, etag=None, last_modified=None):
+        with open(self._path(url, "html"), "w", encoding="utf-8") as f:
+            f.write(html)
+        with open(self._path(url, "blocks.json"), "w", encoding="utf-8") as f:
+            json.dump(blocks, f)
+        meta = {"url": url, "etag": etag, "last_modified": last_modified, "fetched_at": time.time()}
+        # Metadata is written last so a half-written entry is never read as valid
+        with open(self._path(url, "json"), "w") as f:
+            json.dump(meta, f)
+
+    def touch(self, url: str, entry: dict):
+        """Records a successful revalidation (304) without rewriting the body"""
+        meta = {key: entry[key] for key in ("url", "etag", "last_modified")}
+        meta["fetched_at"] = time.time()
+        with open(self._path(url, "json"), "w") as f:
+            json.dump(meta, f)
+
+    def delete(self, url: str):
+        """Forgets a page that no longer exists upstream"""
+        for suffix in ("json", "html", "blocks.json"):
+            path = self._path(url, suffix)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+async def fetch_page(client: httpx.AsyncClient, cache: PageCache, url: str, semaphore: asyncio.Semaphore):
+    """
+    Fetches one page, revalidating a cached copy with If-None-Match/If-Modified-Since.
+    Returns (blocks, status) where status is fetched, not_modified, stale, removed or failed.
+    The cached copy is only served (as stale) on network errors and other transient
+    failures; a 404 or 410 means the page was deleted upstream, so it is dropped.
+    """
+    cached = cache.get(url)
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    try:
+        async with semaphore:
+            response = await client.get(url, headers=headers)
+    except httpx.HTTPError as e:
+        logger.warning(f"Failed to fetch {url}: {e}")
+        # Fall back to the cached copy so a flaky network never drops a page from the index
+        return (cached["blocks"], "stale") if cached else (None, "failed")
+
+    if response.status_code == 304 and cached:
+        cache.touch(url, cached)
+        return cached["blocks"], "not_modified"
+    if response.status_code in (404, 410):
+        logger.warning(f"Removing {url}: HTTP {response.status_code}")
+        cache.delete(url)
+        return None, "removed"
+    if response.status_code != 200:
+        logger.warning(f"Failed to fetch {url}: HTTP {response.status_code}")
+        return (cached["blocks"], "stale") if cached else (None, "failed")
+
+    blocks = html_to_blocks(response.text)
+    cache.put(url, response.text, blocks, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    return blocks, "fetched"
+
+
+async def aload_documents(urls: list, cache: PageCache | None = None, offline: bool = False,
+                          concurrency: int = LOADER_CONCURRENCY) -> tuple:
+    """
+    Loads urls as documents, fetching concurrently and reusing cached extractions for
+    pages that have not changed. With offline, only the cache is read. Returns the
+    documents and the set of urls that no longer exist upstream (HTTP 404 or 410).
+
+    Boilerplate is detected across all of urls, so pass the whole corpus in one call.
+    """
+    cache = cache or PageCache()
+    statuses: dict = {}
+    pages: dict = {}
+
+    if offline:
+        for url in urls:
+            cached = cache.get(url)
+            if cached:
+                pages[url] = cached["blocks"]
+            statuses[url] = "cached" if cached else "failed"
+    else:
+        semaphore = asyncio.Semaphore(concurrency)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(timeout=LOADER_TIMEOUT_SECONDS, limits=limits, follow_redirects=True) as client:
+            results = await asyncio.gather(*(fetch_page(client, cache, url, semaphore) for url in urls))
+        for url, (blocks, status) in zip(urls, results):
+            if blocks is not None:
+                pages[url] = blocks
+            statuses[url] = status
+
+    counts: dict = {}
+    for status in statuses.values():
+        counts[status] = counts.get(status, 0) + 1
+    logger.info(f"Loaded {len(urls)} pages: {counts}")
+
+    documents = []
+    for url, blocks in remove_repeated_blocks(pages).items():
+        text = render_blocks(blocks)
+        if not text:
+            logger.info(f"Skipping {url}: no content left after removing boilerplate")
+            continue
+        documents.append(Document(text=text, id_=url, metadata=url_metadata(url)))
+    removed = {url for url, status in statuses.items() if status == "removed"}
+    return documents, removed
+
+
+def load_documents(urls: list, offline: bool = False) -> tuple:
+    return asyncio.run(aload_documents(urls, offline=offline))
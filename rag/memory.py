@@ -0,0 +1,173 @@
+# Standard library imports
+import asyncio
+from collections import OrderedDict, namedtuple
+import logging
+import os
+import re
+
+# Third-party imports
+from llama_index.core import Settings
+
+# Local or project-specific imports
+from rag.prompts import CONDENSE_QUESTION_PROMPT, SUMMARY_PROMPT
+
+
+logger = logging.getLogger("rag_engine")
+
+# Conversation memory configuration
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 1024))  # Max tokens of history sent when condensing
+HISTORY_TURN_TOKEN_LIMIT = int(os.getenv("HISTORY_TURN_TOKEN_LIMIT", 200))  # Max tokens kept from each past answer
+HISTORY_SUMMARY_WORDS = int(os.getenv("HISTORY_SUMMARY_WORDS", 150))
+HISTORY_MAX_USERS = int(os.getenv("HISTORY_MAX_USERS", 10000))  # Per-user summaries kept in memory
+CONDENSE_MODEL = os.getenv("CONDENSE_MODEL", "llama-3.1-8b-instant")  # Small, fast model for rewriting follow-ups
+CONDENSE_MAX_TOKENS = int(os.getenv("CONDENSE_MAX_TOKENS", 128))
+SELF_CONTAINED_MIN_WORDS = 5  # Shorter questions ("and in kenya?") are always condensed
+
+# Words a follow-up uses to lean on earlier turns ("show it in python", "what about kenya?")
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(it|its|this|that|these|those|they|them|their|there|above|previous|same|also|instead|again|else|one|ones)\b"
+    r"|^\s*(and|or|but|so|what about|how about)\b",
+    re.IGNORECASE,
+)
+
+# Plain copy of a ChatbotInteraction row, safe to use after its session is gone
+Turn = namedtuple("Turn", ["user_input", "response", "timestamp"])
+
+
+def count_tokens(text: str) -> int:
+    return len(Settings.tokenizer(text))
+
+
+def truncate_tokens(text: str, limit: int) -> str:
+    """Cuts text down to roughly `limit` tokens, proportionally by characters"""
+    token_count = count_tokens(text)
+    if token_count <= limit:
+        return text
+    return text[: len(text) * limit // token_count] + " ..."
+
+
+def is_self_contained(question: str) -> bool:
+    """True when the question can be answered without the conversation, so condensing it is skipped"""
+    return len(question.split()) >= SELF_CONTAINED_MIN_WORDS and not FOLLOW_UP_PATTERN.search(question)
+
+
+def format_turn(interaction) -> str:
+    return (
+        f"Developer: {truncate_tokens(interaction.user_input, HISTORY_TURN_TOKEN_LIMIT)}\n"
+        f"Assistant: {truncate_tokens(interaction.response, HISTORY_TURN_TOKEN_LIMIT)}"
+    )
+
+
+class ConversationMemory:
+    """Condense-question memory with a per-user running summary.
+
+    The most recent turns are sent verbatim (each answer truncated) under a strict
+    token budget. Turns that fall out of that window are folded into a summary in
+    the background, so the prompt size per turn stays bounded however long a
+    conversation gets.
+
+    Summaries live in this process only: each worker summarizes the turns that
+    expired on requests it served, and summaries are lost on restart. With several
+    workers a user's summary can miss turns folded by another worker; the recent
+    turns themselves always come from the database.
+    """
+
+    def __init__(self, max_users: int = HISTORY_MAX_USERS, llm=None):
+        self.max_users = max_users
+        self.llm = llm  # Rewrites follow-ups; Settings.llm when unset
+        self._summaries: OrderedDict = OrderedDict()  # user_id -> (last folded timestamp, summary)
+        self._folding: set = set()
+        self._pending: dict = {}  # user_id -> turns that expired while a fold was in flight
+        self._tasks: set = set()
+
+    def get_summary(self, user_id: str):
+        entry = self._summaries.get(user_id)
+        if entry is not None:
+            self._summaries.move_to_end(user_id)
+        return entry
+
+    def _set_summary(self, user_id: str, folded_until, summary: str):
+        self._summaries[user_id] = (folded_until, summary)
+        self._summaries.move_to_end(user_id)
+        while len(self._summaries) > self.max_users:
+            self._summaries.popitem(last=False)
+
+    def build_history(self, user_id: str, recent: list) -> str:
+        """Renders the summary plus as many recent turns (newest first) as fit the budget"""
+        entry = self.get_summary(user_id)
+        summary = f"Summary of earlier conversation: {truncate_tokens(entry[1], HISTORY_TOKEN_BUDGET // 2)}" if entry else ""
+        budget = HISTORY_TOKEN_BUDGET - count_tokens(summary)
+
+        turns = []
+        for interaction in reversed(recent):
+            turn = format_turn(interaction)
+            cost = count_tokens(turn)
+            if cost > budget:
+                break
+            turns.insert(0, turn)
+            budget -= cost
+        return "\n\n".join(part for part in [summary, *turns] if part)
+
+    def needs_condensing(self, user_id: str, question: str, recent: list) -> bool:
+        """False for a first question or one that does not refer back to the conversation"""
+        if not recent and self.get_summary(user_id) is None:
+            return False
+        return not is_self_contained(question)
+
+    async def condense_question(self, user_id: str, question: str, recent: list) -> str:
+        """Returns a standalone version of question given the user's history"""
+        if not self.needs_condensing(user_id, question, recent):
+            return question
+        chat_history = self.build_history(user_id, recent)
+        response = await (self.llm or Settings.llm).acomplete(
+            CONDENSE_QUESTION_PROMPT.format(chat_history=chat_history, question=question)
+        )
+        standalone = response.text.strip()
+        logger.debug(f"Condensed question: {standalone!r}")
+        return standalone or question
+
+    async def fold(self, user_id: str, expired: list):
+        """
+        Folds turns that left the recent window into the user's running summary.
+        Turns that expire while a fold for the same user is in flight are folded
+        by that fold once it finishes, so none are dropped.
+        """
+        if user_id in self._folding:
+            self._pending.setdefault(user_id, []).extend(expired)
+            return
+        self._folding.add(user_id)
+        try:
+            while expired:
+                entry = self.get_summary(user_id)
+                folded_until, summary = entry if entry else (None, "")
+                new_turns = sorted(
+                    {i for i in expired if folded_until is None or i.timestamp > folded_until},
+                    key=lambda i: i.timestamp,
+                )
+                if new_turns:
+                    response = await Settings.llm.acomplete(SUMMARY_PROMPT.format(
+                        summary=summary or "(none)",
+                        turns="\n\n".join(format_turn(i) for i in new_turns),
+                        max_words=HISTORY_SUMMARY_WORDS,
+                    ))
+                    self._set_summary(user_id, new_turns[-1].timestamp, response.text.strip())
+                expired = self._pending.pop(user_id, None)
+        except Exception as e:
+            logger.error(f"Error summarizing conversation history: {str(e)}", exc_info=True)
+        finally:
+            self._pending.pop(user_id, None)
+            self._folding.discard(user_id)
+
+    def schedule_fold(self, user_id: str, expired: list):
+        """Runs fold() in the background so summarization never delays a response"""
+        if expired:
+            task = asyncio.get_running_loop().create_task(self.fold(user_id, expired))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+
+conversation_memory = ConversationMemory()
+
+
+def get_conversation_memory():
+    return conversation_memory
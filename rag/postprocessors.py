@@ -0,0 +1,281 @@
+# Standard library imports
+import logging
+import math
+import os
+import re
+import threading
+from typing import Any, ClassVar, List, Optional
+
+# Third-party imports
+from pydantic import PrivateAttr
+
+# llama_index imports
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+
+# Local or project-specific imports
+from dependencies.metrics import Histogram
+from rag.bm25 import tokenize
+from rag.extract import ATOMIC_KINDS, split_markdown_blocks
+from rag.memory import count_tokens, truncate_tokens
+
+
+logger = logging.getLogger("rag_engine")
+
+# Context packing configuration
+CONTEXT_PACKING = os.getenv("CONTEXT_PACKING", "true").lower() == "true"
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1024))  # Max context tokens sent to the LLM
+RANK_PRIOR = 0.5  # Score bonus for units from higher-ranked chunks, divided by (1 + rank)
+DUPLICATE_JACCARD = 0.8  # Units sharing at least this share of terms with a selected one are skipped
+
+# Cross-encoder reranking configuration
+RERANK = os.getenv("RERANK", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 6))  # Chunks retrieved for the reranker to choose from
+RERANK_SCORE_GAP = float(os.getenv("RERANK_SCORE_GAP", 0.3))  # Stop at the first score drop larger than this
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", 16))
+RERANK_MAX_LENGTH = 512  # Query + chunk tokens seen by the cross-encoder
+
+RERANK_KEPT_CHUNKS = Histogram(
+    "rerank_kept_chunks",
+    "Number of chunks sent to the LLM after the reranker's score-gap cutoff",
+    buckets=(1, 2, 3, 4, 6, 8, 10),
+)
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9`\"'(\[])")
+
+
+def context_units(text: str) -> list:
+    """
+    Splits chunk text into packable units: every sentence or list item of prose, and
+    every code block or table whole. Each unit remembers its section heading and block.
+    """
+    units = []
+    heading = None
+    for block_number, (kind, block) in enumerate(split_markdown_blocks(text)):
+        if kind == "heading":
+            heading = block
+        elif kind in ATOMIC_KINDS:
+            units.append({"kind": kind, "text": block, "heading": heading, "block": block_number})
+        else:
+            for line in block.split("\n"):
+                for sentence in SENTENCE_BOUNDARY.split(line.strip()):
+                    if sentence:
+                        units.append({"kind": "text", "text": sentence, "heading": heading, "block": block_number})
+    return units
+
+
+class ContextPackingPostprocessor(BaseNodePostprocessor):
+    """Packs the most relevant parts of the retrieved chunks into a fixed token budget.
+
+    Sentences, code blocks and tables are scored by the IDF-weighted query terms they
+    contain plus a prior for their chunk's rank, near-duplicates are dropped, and units
+    are added greedily until `token_budget` is reached. Code blocks and tables from
+    chunks that contributed anything are then added while budget remains, so request
+    and response samples survive. Each chunk is rebuilt from its selected units in
+    their original order under their headings. If no unit fits (e.g. the chunk is one
+    code block larger than the budget), the top-ranked chunk is sent cut to the budget,
+    so the LLM never gets an empty context.
+    """
+
+    stage: ClassVar[str] = "pack"
+    token_budget: int = CONTEXT_TOKEN_BUDGET
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextPackingPostprocessor"
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        return self.pack(nodes, query_bundle)[0]
+
+    def pack(self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None) -> tuple:
+        """Packed nodes and the context tokens they use (None when nothing was packed)"""
+        if not nodes or query_bundle is None:
+            return nodes, None
+
+        units = []
+        for rank, node_with_score in enumerate(nodes):
+            for position, unit in enumerate(context_units(node_with_score.node.get_content())):
+                unit.update(rank=rank, position=position, terms=set(tokenize(unit["text"])))
+                units.append(unit)
+        if not units:
+            return nodes, None
+
+        document_frequency: dict = {}
+        for unit in units:
+            for term in unit["terms"]:
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+        query_terms = set(tokenize(query_bundle.query_str))
+        for unit in units:
+            matched = sum(math.log(1 + len(units) / document_frequency[term]) for term in query_terms & unit["terms"])
+            unit["relevant"] = matched > 0
+            unit["score"] = matched + RANK_PRIOR / (1 + unit["rank"])
+
+        # Without any lexical match, fall back to the top chunk in reading order
+        candidates = [unit for unit in units if unit["relevant"]] or [unit for unit in units if unit["rank"] == 0]
+        candidates.sort(key=lambda unit: (-unit["score"], unit["rank"], unit["position"]))
+
+        state = {"used": 0, "selected": [], "headings": set(), "ranks": set()}
+        for unit in candidates:
+            self._try_add(unit, nodes, state)
+        # Request/response samples of the chunks we drew from, best chunk first
+        for unit in units:
+            if unit["kind"] in ATOMIC_KINDS and unit["rank"] in state["ranks"]:
+                self._try_add(unit, nodes, state)
+
+        packed = []
+        for rank, node_with_score in enumerate(nodes):
+            selected = sorted((unit for unit in state["selected"] if unit["rank"] == rank), key=lambda unit: unit["position"])
+            if not selected:
+                continue
+            node = node_with_score.node.model_copy()
+            node.set_content(self._render(selected))
+            packed.append(NodeWithScore(node=node, score=node_with_score.score))
+        if not packed:
+            return self._truncate_top(nodes)
+
+        logger.debug(f"Packed {len(units)} units from {len(nodes)} chunks into {state['used']} tokens ({len(packed)} chunks)")
+        return packed, state["used"]
+
+    def _truncate_top(self, nodes: List[NodeWithScore]) -> tuple:
+        """The top-ranked chunk alone, cut down to the budget left after its metadata"""
+        top = nodes[0]
+        metadata_tokens = count_tokens(top.node.get_metadata_str(mode=MetadataMode.LLM))
+        limit = max(self.token_budget - metadata_tokens, 16)
+        content = text = top.node.get_content()
+        # truncate_tokens cuts proportionally by characters, so aim lower while the cut overshoots
+        target = limit
+        for _ in range(3):
+            text = truncate_tokens(content, target)
+            overshoot = count_tokens(text) - limit
+            if overshoot <= 0:
+                break
+            target -= overshoot
+        node = top.node.model_copy()
+        node.set_content(text)
+        logger.debug(f"No unit fits the {self.token_budget} token budget, sending the top chunk truncated")
+        return [NodeWithScore(node=node, score=top.score)], metadata_tokens + count_tokens(text)
+
+    def _try_add(self, unit: dict, nodes: List[NodeWithScore], state: dict):
+        if any(unit is chosen for chosen in state["selected"]):
+            return
+        for chosen in state["selected"]:
+            union = unit["terms"] | chosen["terms"]
+            if unit["text"] == chosen["text"] or (
+                union and len(unit["terms"] & chosen["terms"]) / len(union) >= DUPLICATE_JACCARD
+            ):
+                return
+
+        cost = count_tokens(unit["text"])
+        heading_key = (unit["rank"], unit["heading"])
+        if unit["heading"] and heading_key not in state["headings"]:
+            cost += count_tokens(unit["heading"])
+        if unit["rank"] not in state["ranks"]:
+            # Each chunk also brings its metadata (URL, service, endpoint) into the prompt
+            cost += count_tokens(nodes[unit["rank"]].node.get_metadata_str(mode=MetadataMode.LLM))
+        if state["used"] + cost > self.token_budget:
+            return
+
+        state["used"] += cost
+        state["selected"].append(unit)
+        state["headings"].add(heading_key)
+        state["ranks"].add(unit["rank"])
+
+    @staticmethod
+    def _render(units: list) -> str:
+        parts = []
+        heading, block = None, None
+        for unit in units:
+            if unit["heading"] and unit["heading"] != heading:
+                parts.append(unit["heading"])
+                heading = unit["heading"]
+            if unit["kind"] == "text" and unit["block"] == block and parts:
+                # Sentences from the same paragraph stay on one line
+                parts[-1] += " " + unit["text"]
+            else:
+                parts.append(unit["text"])
+            block = unit["block"]
+        return "\n\n".join(parts)
+
+
+class CrossEncoderRerank(BaseNodePostprocessor):
+    """Reorders retrieved chunks with a cross-encoder and cuts the list adaptively.
+
+    Every (query, chunk) pair is scored in batches on CPU. Chunks are kept in score
+    order up to `top_n`, stopping at the first drop between neighbours larger than
+    `score_gap`, so a confident query sends a single chunk to the LLM. The model is
+    loaded on first use; sentence-transformers is only imported when RERANK is on.
+    """
+
+    stage: ClassVar[str] = "rerank"
+    model: str = RERANK_MODEL
+    top_n: int = 2
+    score_gap: float = RERANK_SCORE_GAP
+    batch_size: int = RERANK_BATCH_SIZE
+
+    _cross_encoder: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CrossEncoderRerank"
+
+    def _get_cross_encoder(self):
+        with self._lock:
+            if self._cross_encoder is None:
+                from sentence_transformers import CrossEncoder
+
+                logger.info(f"Loading reranker {self.model}")
+                self._cross_encoder = CrossEncoder(self.model, device="cpu", max_length=RERANK_MAX_LENGTH)
+        return self._cross_encoder
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        if len(nodes) < 2 or query_bundle is None:
+            return nodes
+
+        pairs = [(query_bundle.query_str, n.node.get_content(metadata_mode=MetadataMode.EMBED)) for n in nodes]
+        # Single-label cross-encoders apply a sigmoid, so scores are comparable across queries
+        scores = self._get_cross_encoder().predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        ranked = sorted(zip(nodes, scores), key=lambda pair: pair[1], reverse=True)
+
+        kept = [ranked[0]]
+        for node_with_score, score in ranked[1:self.top_n]:
+            if kept[-1][1] - score > self.score_gap:
+                break
+            kept.append((node_with_score, score))
+
+        RERANK_KEPT_CHUNKS.observe(len(kept))
+        logger.debug(f"Reranked {len(nodes)} chunks, kept {len(kept)} (scores {[round(float(s), 3) for _, s in ranked]})")
+        return [NodeWithScore(node=n.node, score=float(score)) for n, score in kept]
+
+
+_reranker = None
+
+def get_reranker(top_n: int):
+    """Returns the shared reranker, so the cross-encoder is loaded once per worker"""
+    global _reranker
+    if _reranker is None or _reranker.top_n != top_n:
+        _reranker = CrossEncoderRerank(top_n=top_n)
+    return _reranker
+
+
+def build_node_postprocessors(top_n: int) -> list:
+    """Postprocessors applied to retrieved chunks before they reach the LLM, in order.
+
+    top_n is the most chunks the reranker may keep; without RERANK, retrieval
+    already returns that many.
+    """
+    postprocessors = []
+    if RERANK:
+        postprocessors.append(get_reranker(top_n))
+    if CONTEXT_PACKING:
+        postprocessors.append(ContextPackingPostprocessor(token_budget=CONTEXT_TOKEN_BUDGET))
+    return postprocessors
@@ -0,0 +1,76 @@
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.prompts import ChatPromptTemplate, PromptTemplate
+
+# Persona sent once as the system message. Only the user's question is embedded
+# and used for retrieval; the persona never reaches the vector store.
+SYSTEM_PROMPT = """
+You are Mark Musk, a GenAI developer assistant bot designed to assist software engineers in integrating REST API products efficiently. You provide guidance and generate sample code in various programming languages, including Python, Node.js (or NestJS), PHP Laravel, and GoLang, among others. Your goal is to help developers integrate APIs 10 times faster.
+
+When a developer asks about integrating a specific REST API, follow these steps:
+
+1. **Understand the API**: Analyze the API's functionality and its endpoints.
+
+2. **Identify the Programming Language**: Determine the developer's preferred programming language. If not specified, ask for it.
+
+3. **Provide Integration Steps**: Outline the necessary steps to integrate the API in the chosen language.
+
+4. **Generate Sample Code**: Provide a complete, functional code snippet demonstrating the integration.
+
+5. **Offer Additional Assistance**: Ask if the developer needs further help or clarification.
+
+Ensure that your responses are clear, concise, and tailored to the developer's needs.
+"""
+
+TEXT_QA_TEMPLATE = ChatPromptTemplate(message_templates=[
+    ChatMessage(role=MessageRole.SYSTEM, content=SYSTEM_PROMPT),
+    ChatMessage(
+        role=MessageRole.USER,
+        content=(
+            "Context information from the CreditChek API documentation is below.\n"
+            "---------------------\n"
+            "{context_str}\n"
+            "---------------------\n"
+            "Using the context information, answer the developer's question.\n"
+            "Question: {query_str}\n"
+            "Answer: "
+        ),
+    ),
+])
+
+REFINE_TEMPLATE = ChatPromptTemplate(message_templates=[
+    ChatMessage(role=MessageRole.SYSTEM, content=SYSTEM_PROMPT),
+    ChatMessage(
+        role=MessageRole.USER,
+        content=(
+            "The original question is: {query_str}\n"
+            "The existing answer is: {existing_answer}\n"
+            "Refine the existing answer (only if needed) using the additional context below.\n"
+            "---------------------\n"
+            "{context_msg}\n"
+            "---------------------\n"
+            "If the context isn't useful, return the existing answer unchanged.\n"
+            "Refined Answer: "
+        ),
+    ),
+])
+
+# Rewrites a follow-up into a standalone question so retrieval and the answer cache
+# only ever see a short, self-contained query
+CONDENSE_QUESTION_PROMPT = PromptTemplate(
+    "Given the conversation below and a follow-up question from the developer, rewrite the "
+    "follow-up as a standalone question that keeps every API name, endpoint, country and "
+    "programming language it depends on. Return only the question.\n\n"
+    "Conversation:\n{chat_history}\n\n"
+    "Follow-up question: {question}\n"
+    "Standalone question: "
+)
+
+# Folds turns that fall out of the recent-history window into a running summary
+SUMMARY_PROMPT = PromptTemplate(
+    "Update the running summary of a conversation between a developer and an API "
+    "integration assistant with the new turns below. Keep API names, endpoints, "
+    "languages and decisions; drop code samples and pleasantries. Stay under {max_words} words.\n\n"
+    "Current summary:\n{summary}\n\n"
+    "New turns:\n{turns}\n\n"
+    "Updated summary: "
+)
@@ -1,25 +1,36 @@
 # Standard library imports
+import asyncio
 from contextlib import asynccontextmanager
+from functools import lru_cache
 import logging
 import os
 import time
-from typing import Any
+from typing import Any, List
 
 # Third-party imports
 from fastapi import FastAPI, Request
-from langchain_huggingface import HuggingFaceEmbeddings
 from pinecone import Pinecone, ServerlessSpec
-import torch
 
 # llama_index imports (third-party but from the same package, grouped together)
 from llama_index.core import Settings, VectorStoreIndex
-from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.schema import NodeWithScore, QueryBundle
 from llama_index.llms.groq import Groq
-from llama_index.readers.web import SimpleWebPageReader
 from llama_index.vector_stores.pinecone import PineconeVectorStore
 
 # Local or project-specific imports
-from rag.data.extractions import extractions
+from dependencies.metrics import Histogram, traced_stage
+from rag.bm25 import get_sparse_index
+from rag.cache import get_answer_cache
+from rag.embeddings import build_embed_model
+from rag.extract import MarkdownBlockSplitter
+from rag.filters import to_metadata_filters
+from rag.indexing import index_version
+from rag.memory import CONDENSE_MAX_TOKENS, CONDENSE_MODEL, get_conversation_memory
+from rag.postprocessors import RERANK, RERANK_CANDIDATES, ContextPackingPostprocessor, build_node_postprocessors
+from rag.prompts import REFINE_TEMPLATE, TEXT_QA_TEMPLATE
+from rag.retrievers import HybridRetriever
+from rag.vector_stores import LocalVectorStore
 
 
 # Configure logging
@@ -34,14 +45,31 @@ logging.basicConfig(
 
 logger = logging.getLogger("rag_engine")
 
-DEVICE = "cuda:0" if torch.cuda.is_available() else "cpu"
-logger.info(f"Using device: {DEVICE}")
-
 # Vector database configuration
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone")  # pinecone or local
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "storage/vector_index")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 INDEX_NAME = "rag-documents"
 NAMESPACE = "web-extractions"
 
+# Query engine configuration
+SIMILARITY_TOP_K = int(os.getenv("SIMILARITY_TOP_K", 2))
+RESPONSE_MODE = os.getenv("RESPONSE_MODE", "compact")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")  # hybrid (BM25 + dense) or dense
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 10))  # Results taken from each retriever before fusion
+FILTERED_ENGINE_CACHE_SIZE = 32  # Query engines kept for distinct country/service filters
+
+QUERY_STAGE_SECONDS = Histogram(
+    "rag_query_stage_seconds",
+    "Time spent in each stage of a RAG query (retrieve, rerank, pack, synthesize)",
+    labelnames=("stage",),
+)
+CONTEXT_TOKENS = Histogram(
+    "rag_context_tokens",
+    "Tokens of retrieved context sent to the LLM per query",
+    buckets=(128, 256, 512, 768, 1024, 1536, 2048, 3072, 4096),
+)
+
 def initialize_vector_db():
     """Initialize Pinecone and create index if it doesn't exist"""
     try:
@@ -69,114 +97,249 @@ def initialize_vector_db():
         logger.error(f"Error initializing Pinecone: {str(e)}", exc_info=True)
         raise e
 
-def load_or_create_index(docs=None, embed_model=None, force_reload=False):
-    """Load index from vector DB or create if needed"""
-    try:
-        # Initialize Pinecone
+def get_vector_store():
+    """Return the configured vector store backend and the number of vectors it holds"""
+    if VECTOR_STORE_BACKEND == "local":
+        vector_store = LocalVectorStore.from_persist_dir(LOCAL_INDEX_DIR)
+        return vector_store, vector_store.vector_count
+    if VECTOR_STORE_BACKEND == "pinecone":
         pinecone_index = initialize_vector_db()
         stats = pinecone_index.describe_index_stats()
-        vector_count = stats.total_vector_count
-        
-        # If the index is empty or force reload is True, create and populate it
-        if vector_count == 0 or force_reload:
-            if docs is None or embed_model is None:
-                raise ValueError("Documents and embed_model must be provided for initial indexing")
-                
-            logger.info("Creating new vector store index")
-            # Create Pinecone vector store
-            vector_store = PineconeVectorStore(
-                pinecone_index=pinecone_index,
-                namespace=NAMESPACE
-            )
-            
-            # Create the index from documents
-            index = VectorStoreIndex.from_documents(
-                docs, 
-                vector_store=vector_store,
-                embed_model=embed_model
-            )
-            
-            logger.info(f"Vector index successfully created with {len(docs)} documents")
-            return index
-        else:
-            # Load existing index
-            logger.info(f"Loading existing index with {vector_count} vectors")
-            vector_store = PineconeVectorStore(
-                pinecone_index=pinecone_index,
-                namespace=NAMESPACE
-            )
-            index = VectorStoreIndex.from_vector_store(
-                vector_store=vector_store,
-                embed_model=embed_model
-            )
-            logger.info("Vector index successfully loaded from Pinecone")
-            return index
+        vector_store = PineconeVectorStore(
+            pinecone_index=pinecone_index,
+            namespace=NAMESPACE
+        )
+        return vector_store, stats.total_vector_count
+    raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {VECTOR_STORE_BACKEND}")
+
+def load_index(embed_model=None):
+    """Load the existing index from the vector DB; building it is left to `python -m rag.ingest`"""
+    try:
+        vector_store, vector_count = get_vector_store()
+        if vector_count == 0:
+            logger.warning("Vector index is empty. Run `python -m rag.ingest` to build it")
+
+        logger.info(f"Loading existing index with {vector_count} vectors")
+        index = VectorStoreIndex.from_vector_store(
+            vector_store=vector_store,
+            embed_model=embed_model
+        )
+        logger.info(f"Vector index successfully loaded ({VECTOR_STORE_BACKEND} backend)")
+        return index
     except Exception as e:
-        logger.error(f"Error in load_or_create_index: {str(e)}", exc_info=True)
+        logger.error(f"Error in load_index: {str(e)}", exc_info=True)
         raise e
 
+def configure_settings(llm=None, base_embed_model=None):
+    """
+    Initialize the embedding model and LLM and apply the global llama_index settings.
+    llm and base_embed_model replace Groq and the configured embedding backend, e.g.
+    with the local stand-ins used by the offline benchmarks. Follow-up questions are
+    rewritten by a small Groq model (CONDENSE_MODEL), or by llm when one is given.
+    """
+    # Initialize the embedding model
+    embed_model = build_embed_model(base_model=base_embed_model)
+    logger.info("Embedding model initialization completed")
+
+    # Initialize the language model
+    if llm is None:
+        logger.info("Initializing language model")
+        llm = Groq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            model="llama-3.3-70b-versatile",
+            temperature=0.1,
+            max_tokens=1024,
+            top_p=1,
+            stream=False
+        )
+        condense_llm = Groq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            model=CONDENSE_MODEL,
+            temperature=0,
+            max_tokens=CONDENSE_MAX_TOKENS,
+        )
+        logger.info("Language model initialization completed")
+    else:
+        condense_llm = llm
+
+    # Set global settings
+    logger.info("Configuring global settings")
+    Settings.llm = llm
+    Settings.embed_model = embed_model
+    Settings.node_parser = MarkdownBlockSplitter(chunk_size=1024)
+    Settings.num_output = 2048
+    Settings.context_window = 4000
+    get_conversation_memory().llm = condense_llm
+    logger.info("Global settings configured")
+
+    return embed_model
+
+class TimedQueryEngine(RetrieverQueryEngine):
+    """RetrieverQueryEngine that records how long each stage of a query takes.
+
+    Stages are `retrieve`, one per node postprocessor (`rerank`, `pack`) and
+    `synthesize` (the LLM call; for streaming engines, until the stream opens).
+    With CONTEXT_PACKING, the context tokens counted by the packer are recorded
+    too, so reranking and packing time can be weighed against the prompt tokens
+    they save. The context is not re-tokenized just for the metric.
+    """
+
+    def _apply_node_postprocessors(self, nodes: List[NodeWithScore], query_bundle: QueryBundle) -> List[NodeWithScore]:
+        context_tokens = None
+        for node_postprocessor in self._node_postprocessors:
+            with traced_stage(QUERY_STAGE_SECONDS, getattr(node_postprocessor, "stage", node_postprocessor.class_name())):
+                if isinstance(node_postprocessor, ContextPackingPostprocessor):
+                    nodes, context_tokens = node_postprocessor.pack(nodes, query_bundle)
+                else:
+                    nodes = node_postprocessor.postprocess_nodes(nodes, query_bundle=query_bundle)
+        if context_tokens is not None:
+            CONTEXT_TOKENS.observe(context_tokens)
+        return nodes
+
+    def retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        with traced_stage(QUERY_STAGE_SECONDS, "retrieve"):
+            nodes = self._retriever.retrieve(query_bundle)
+        return self._apply_node_postprocessors(nodes, query_bundle=query_bundle)
+
+    async def aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        with traced_stage(QUERY_STAGE_SECONDS, "retrieve"):
+            nodes = await self._retriever.aretrieve(query_bundle)
+        # Reranking and packing are CPU-bound, keep them off the event loop
+        return await asyncio.to_thread(self._apply_node_postprocessors, nodes, query_bundle)
+
+    def _query(self, query_bundle: QueryBundle):
+        nodes = self.retrieve(query_bundle)
+        with traced_stage(QUERY_STAGE_SECONDS, "synthesize"):
+            return self._response_synthesizer.synthesize(query=query_bundle, nodes=nodes)
+
+    async def _aquery(self, query_bundle: QueryBundle):
+        nodes = await self.aretrieve(query_bundle)
+        with traced_stage(QUERY_STAGE_SECONDS, "synthesize"):
+            return await self._response_synthesizer.asynthesize(query=query_bundle, nodes=nodes)
+
+def build_query_engine(index, streaming=False, filters=None):
+    """Build the query engine shared by every request.
+
+    Retriever and response synthesizer hold no per-query state, so a single
+    instance is safe to reuse across concurrent requests. filters restricts
+    retrieval to chunks whose metadata matches, e.g. {"country": "kenya"}.
+    With RERANK, RERANK_CANDIDATES chunks are retrieved and the reranker keeps
+    at most SIMILARITY_TOP_K of them.
+    """
+    metadata_filters = to_metadata_filters(filters)
+    sparse_index = get_sparse_index() if RETRIEVAL_MODE == "hybrid" else None
+    if RETRIEVAL_MODE == "hybrid" and sparse_index is None:
+        logger.warning("No BM25 index found, falling back to dense retrieval. Run `python -m rag.ingest` to build it.")
+
+    top_k = max(RERANK_CANDIDATES, SIMILARITY_TOP_K) if RERANK else SIMILARITY_TOP_K
+    mode = "hybrid" if sparse_index is not None else "dense"
+    logger.info(f"Building query engine (retrieval={mode}, retrieve_top_k={top_k}, rerank={RERANK}, response_mode={RESPONSE_MODE}, streaming={streaming}, filters={filters})")
+    if sparse_index is None:
+        retriever = index.as_retriever(similarity_top_k=top_k, filters=metadata_filters)
+    else:
+        retriever = HybridRetriever(
+            index.as_retriever(similarity_top_k=max(HYBRID_CANDIDATES, top_k), filters=metadata_filters),
+            sparse_index,
+            top_k=top_k,
+            candidate_k=max(HYBRID_CANDIDATES, top_k),
+            filters=metadata_filters,
+        )
+    return TimedQueryEngine.from_args(
+        retriever,
+        response_mode=RESPONSE_MODE,
+        streaming=streaming,
+        node_postprocessors=build_node_postprocessors(top_n=SIMILARITY_TOP_K),
+        text_qa_template=TEXT_QA_TEMPLATE,
+        refine_template=REFINE_TEMPLATE,
+    )
+
+@lru_cache(maxsize=FILTERED_ENGINE_CACHE_SIZE)
+def get_filtered_query_engine(index, filters_key: tuple, streaming=False):
+    """Pooled query engines per filter set, so each combination is only built once"""
+    return build_query_engine(index, streaming=streaming, filters=dict(filters_key))
+
+async def aquery_with_filters(query_engine, index, question: str, filters_key: tuple, streaming=False, embedding=None):
+    """
+    Queries only the chunks matching the filters, falling back to the whole index
+    when nothing matches (e.g. a page without country metadata). embedding is the
+    question's vector when already computed (e.g. by the answer cache lookup), so
+    retrieval does not embed it again.
+    """
+    query_bundle = QueryBundle(question, embedding=None if embedding is None else [float(x) for x in embedding])
+    if filters_key:
+        response = await get_filtered_query_engine(index, filters_key, streaming).aquery(query_bundle)
+        if response.source_nodes:
+            return response
+        logger.info(f"No chunks match {dict(filters_key)}, retrying without filters")
+    return await query_engine.aquery(query_bundle)
+
 global_index = None
+global_query_engine = None
+global_streaming_query_engine = None
+global_index_version = None
+index_reload_lock = asyncio.Lock()
+
+def load_engines(embed_model, reload_sparse_index=False):
+    """Loads the index from the stores and builds the shared query engines on it"""
+    if reload_sparse_index:
+        get_sparse_index(reload=True)
+    index = load_index(embed_model=embed_model)
+    return index, build_query_engine(index), build_query_engine(index, streaming=True)
+
+def set_engines(app: FastAPI, index, query_engine, streaming_query_engine, version):
+    global global_index, global_query_engine, global_streaming_query_engine, global_index_version
+    app.state.index = global_index = index
+    app.state.query_engine = global_query_engine = query_engine
+    app.state.streaming_query_engine = global_streaming_query_engine = streaming_query_engine
+    app.state.index_version = global_index_version = version
+
+async def reload_index_if_changed(app: FastAPI):
+    """
+    Reloads the vector and BM25 indexes and rebuilds the query engines once
+    `python -m rag.ingest` has rewritten the index manifest. Requests already
+    running finish on the engines they started with.
+    """
+    if index_version() == app.state.index_version:
+        return
+    async with index_reload_lock:
+        version = index_version()
+        if version == app.state.index_version:
+            return
+        logger.info("Index manifest changed, reloading the vector and BM25 indexes")
+        start_time = time.time()
+        engines = await asyncio.to_thread(load_engines, Settings.embed_model, True)
+        get_filtered_query_engine.cache_clear()
+        set_engines(app, *engines, version)
+        answer_cache = get_answer_cache()
+        if answer_cache is not None:
+            await answer_cache.reset(version)
+        logger.info(f"Reloaded the index in {time.time() - start_time:.2f} seconds")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global global_index
     try:
         start_time = time.time()
         
         # If we already have a global index from a previous reload, use it
-        if global_index is not None and os.getenv("FORCE_RELOAD_INDEX", "false").lower() != "true":
+        if global_index is not None:
             logger.info("Using existing index from previous server instance")
-            app.state.index = global_index
+            set_engines(app, global_index, global_query_engine, global_streaming_query_engine, global_index_version)
             logger.info("Application startup completed (using cached index)")
             yield
             return
         
-        # Initialize the embedding model
-        logger.info("Initializing embedding model")
-        embed_model = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-mpnet-base-v2",
-            model_kwargs={"device": DEVICE}
+        # app.state.llm / app.state.base_embed_model let the offline benchmarks swap in local models
+        embed_model = configure_settings(
+            llm=getattr(app.state, "llm", None),
+            base_embed_model=getattr(app.state, "base_embed_model", None),
         )
-        logger.info("Embedding model initialization completed")
 
-        # Initialize the language model
-        logger.info("Initializing language model")
-        llm = Groq(
-            api_key=os.getenv("GROQ_API_KEY"),
-            model="llama-3.3-70b-versatile",
-            temperature=0.1,
-            max_tokens=1024,
-            top_p=1,
-            stream=False
-        )
-        logger.info("Language model initialization completed")
-
-        # Set global settings
-        logger.info("Configuring global settings")
-        Settings.llm = llm
-        Settings.embed_model = embed_model
-        Settings.node_parser = SentenceSplitter(chunk_size=1024, chunk_overlap=20)
-        Settings.num_output = 2048
-        Settings.context_window = 4000
-        logger.info("Global settings configured")
-
-        # Check if we need to load documents and build index
-        force_reload = os.getenv("FORCE_RELOAD_INDEX", "false").lower()
-        if force_reload == "true":
-            logger.info("Force reload requested. Loading documents...")
-            reader = SimpleWebPageReader(html_to_text=True)
-            docs = reader.load_data(extractions)
-            logger.info(f"Document extraction completed: {len(docs)} documents loaded")
-            
-            # Create or update the index
-            index = load_or_create_index(docs=docs, embed_model=embed_model, force_reload=True)
-        else:
-            # Just load the existing index
-            index = load_or_create_index(embed_model=embed_model)
-
-        # Store the index in the app state and in global variable
-        app.state.index = index
-        global_index = index
+        # Only ever load an existing index; ingestion runs out of band so startup
+        # time does not depend on corpus size. The version is read first, so an
+        # ingestion finishing while this loads triggers a reload on the next request
+        version = index_version()
+        # Store the index and its query engines in the app state and in global variables
+        set_engines(app, *load_engines(embed_model), version)
         
         elapsed = time.time() - start_time
         logger.info(f"Application startup completed in {elapsed:.2f} seconds")
@@ -189,6 +352,16 @@ async def lifespan(app: FastAPI):
         logger.error(f"Error during application lifecycle: {str(e)}", exc_info=True)
         raise e
 
-def get_query_engine(request: Request):
+async def get_index(request: Request):
+    await reload_index_if_changed(request.app)
+    return request.app.state.index
+
+async def get_query_engine(request: Request):
     logger.debug("Query engine requested")
-    return request.app.state.index.as_query_engine()
\ No newline at end of file
+    await reload_index_if_changed(request.app)
+    return request.app.state.query_engine
+
+async def get_streaming_query_engine(request: Request):
+    logger.debug("Streaming query engine requested")
+    await reload_index_if_changed(request.app)
+    return request.app.state.streaming_query_engine
@@ -0,0 +1,55 @@
+# Standard library imports
+import logging
+from typing import List
+
+# llama_index imports
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+
+logger = logging.getLogger("rag_engine")
+
+RRF_K = 60  # Rank offset from the original reciprocal rank fusion paper
+
+
+def reciprocal_rank_fusion(rankings: list, top_k: int, k: int = RRF_K) -> list:
+    """Fuses ranked lists of node ids into (node id, score) pairs scored by sum(1 / (k + rank))"""
+    scores: dict = {}
+    for ranking in rankings:
+        for rank, node_id in enumerate(ranking, start=1):
+            scores[node_id] = scores.get(node_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+
+class HybridRetriever(BaseRetriever):
+    """Dense vector retrieval fused with BM25 keyword retrieval by reciprocal rank fusion.
+
+    Each side returns `candidate_k` results; the fused list is cut to `top_k`, so
+    exact-identifier matches from BM25 can win a slot without sending more chunks
+    to the LLM.
+    """
+
+    def __init__(self, vector_retriever: BaseRetriever, sparse_index, top_k: int, candidate_k: int, filters=None):
+        super().__init__()
+        self.vector_retriever = vector_retriever
+        self.sparse_index = sparse_index
+        self.top_k = top_k
+        self.candidate_k = candidate_k
+        self.filters = filters
+
+    def _fuse(self, dense: List[NodeWithScore], query_str: str) -> List[NodeWithScore]:
+        sparse = self.sparse_index.search(query_str, self.candidate_k, self.filters)
+        nodes = {result.node.node_id: result.node for result in dense}
+        fused = reciprocal_rank_fusion(
+            [[result.node.node_id for result in dense], [node_id for node_id, _ in sparse]], self.top_k
+        )
+        return [
+            NodeWithScore(node=nodes.get(node_id) or self.sparse_index.get_node(node_id), score=score)
+            for node_id, score in fused
+        ]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self._fuse(self.vector_retriever.retrieve(query_bundle), query_bundle.query_str)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self._fuse(await self.vector_retriever.aretrieve(query_bundle), query_bundle.query_str)
@@ -0,0 +1,216 @@
+# Standard library imports
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Any, List, Optional
+
+# Third-party imports
+import numpy as np
+from pydantic import PrivateAttr
+
+# llama_index imports
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.simple import _build_metadata_filter_fn
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+
+
+logger = logging.getLogger("rag_engine")
+
+EMBEDDINGS_FILE = "embeddings.npy"
+RECORDS_FILE = "records.json"
+CURRENT_FILE = "CURRENT"  # Names the version directory that holds the live files
+KEEP_VERSIONS = 2  # The previous version stays until the next persist, for workers still loading it
+
+
+class LocalVectorStore(BasePydanticVectorStore):
+    """In-process flat vector store persisted to a directory.
+
+    Embeddings are kept L2-normalized in a float32 matrix saved as `embeddings.npy`
+    and memory-mapped on load, so every worker shares the same pages and a query is a
+    single matrix-vector product. Node text and metadata live next to it in
+    `records.json`. Each `persist()` writes both files to a new version directory
+    and then swaps the `CURRENT` pointer, so a reader sees either the old or the new
+    pair, never one of each.
+    """
+
+    stores_text: bool = True
+    persist_dir: str
+
+    _embeddings: Any = PrivateAttr()
+    _records: list = PrivateAttr()
+    _row_by_id: dict = PrivateAttr()
+    _filter_rows: dict = PrivateAttr()
+
+    def __init__(self, persist_dir: str, embeddings=None, records=None, **kwargs: Any):
+        super().__init__(persist_dir=persist_dir, **kwargs)
+        self._embeddings = embeddings
+        self._records = records or []
+        self._reindex()
+
+    @staticmethod
+    def _current_dir(persist_dir: str) -> str:
+        """Directory of the live version; stores persisted before versioning keep their files at the top level"""
+        try:
+            with open(os.path.join(persist_dir, CURRENT_FILE)) as f:
+                return os.path.join(persist_dir, f.read().strip())
+        except FileNotFoundError:
+            return persist_dir
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str) -> "LocalVectorStore":
+        """Load the store from persist_dir, or return an empty one if nothing is saved there yet"""
+        version_dir = cls._current_dir(persist_dir)
+        embeddings_path = os.path.join(version_dir, EMBEDDINGS_FILE)
+        records_path = os.path.join(version_dir, RECORDS_FILE)
+        if not os.path.exists(embeddings_path) or not os.path.exists(records_path):
+            return cls(persist_dir=persist_dir)
+        with open(records_path) as f:
+            records = json.load(f)
+        embeddings = np.load(embeddings_path, mmap_mode="r") if records else None
+        if embeddings is not None and embeddings.shape[0] != len(records):
+            raise ValueError(
+                f"Local vector store in {version_dir} is inconsistent: {embeddings.shape[0]} embeddings "
+                f"but {len(records)} records. Rebuild it with `python -m rag.ingest --full`"
+            )
+        logger.info(f"Loaded local vector store from {version_dir} ({len(records)} vectors)")
+        return cls(persist_dir=persist_dir, embeddings=embeddings, records=records)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LocalVectorStore"
+
+    @property
+    def client(self) -> None:
+        return None
+
+    @property
+    def vector_count(self) -> int:
+        return len(self._records)
+
+    def _reindex(self):
+        self._row_by_id = {record["id"]: row for row, record in enumerate(self._records)}
+        self._filter_rows = {}
+
+    def _rows_matching(self, filters) -> np.ndarray:
+        """Rows passing filters, cached per filter set until the store is modified"""
+        key = filters.model_dump_json()
+        rows = self._filter_rows.get(key)
+        if rows is None:
+            filter_fn = _build_metadata_filter_fn(lambda row: self._records[row]["metadata"], filters)
+            rows = np.array([row for row in range(len(self._records)) if filter_fn(row)], dtype=np.int64)
+            self._filter_rows[key] = rows
+        return rows
+
+    def _keep_rows(self, keep: np.ndarray):
+        """Drops every row whose mask entry is False"""
+        self._embeddings = np.asarray(self._embeddings)[keep] if self._embeddings is not None else None
+        self._records = [record for record, kept in zip(self._records, keep) if kept]
+        self._reindex()
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        vectors = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        # Adding an existing id replaces it
+        ids = [node.node_id for node in nodes]
+        existing = [self._row_by_id[node_id] for node_id in ids if node_id in self._row_by_id]
+        if existing:
+            keep = np.ones(len(self._records), dtype=bool)
+            keep[existing] = False
+            self._keep_rows(keep)
+
+        records = [{"id": node.node_id, "metadata": node_to_metadata_dict(node, remove_text=False)} for node in nodes]
+        self._embeddings = vectors if self._embeddings is None else np.vstack([np.asarray(self._embeddings), vectors])
+        self._records.extend(records)
+        self._reindex()
+        return ids
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        keep = np.array([record["metadata"].get("ref_doc_id") != ref_doc_id for record in self._records], dtype=bool)
+        self._keep_rows(keep)
+
+    def delete_nodes(self, node_ids: Optional[List[str]] = None, filters=None, **delete_kwargs: Any) -> None:
+        node_ids = set(node_ids or [])
+        keep = np.array([record["id"] not in node_ids for record in self._records], dtype=bool)
+        self._keep_rows(keep)
+
+    def clear(self) -> None:
+        self._embeddings = None
+        self._records = []
+        self._reindex()
+
+    def get_nodes(self, node_ids: Optional[List[str]] = None, filters=None) -> List[BaseNode]:
+        rows = [self._row_by_id[i] for i in node_ids if i in self._row_by_id] if node_ids else range(len(self._records))
+        return [metadata_dict_to_node(self._records[row]["metadata"]) for row in rows]
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if self._embeddings is None or not self._records or query.query_embedding is None:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        vector = np.asarray(query.query_embedding, dtype=np.float32)
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+
+        # Filtered queries only score the matching subset of rows
+        rows = None
+        if query.filters is not None:
+            rows = self._rows_matching(query.filters)
+        if query.node_ids:
+            allowed = np.array([self._row_by_id[i] for i in query.node_ids if i in self._row_by_id], dtype=np.int64)
+            rows = allowed if rows is None else np.intersect1d(rows, allowed)
+        if rows is not None and len(rows) == 0:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        embeddings = self._embeddings if rows is None else np.asarray(self._embeddings)[rows]
+        scores = embeddings @ vector
+        top_k = min(query.similarity_top_k, len(scores))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        similarities = [float(scores[i]) for i in top]
+        if rows is not None:
+            top = rows[top]
+
+        return VectorStoreQueryResult(
+            nodes=[metadata_dict_to_node(self._records[row]["metadata"]) for row in top],
+            similarities=similarities,
+            ids=[self._records[row]["id"] for row in top],
+        )
+
+    def persist(self, persist_path: Optional[str] = None, fs=None) -> None:
+        """
+        Write embeddings and records to a new version directory under persist_dir,
+        then point CURRENT at it with a single atomic rename
+        """
+        persist_dir = persist_path or self.persist_dir
+        embeddings = self._embeddings if self._embeddings is not None else np.zeros((0, 0), dtype=np.float32)
+
+        version = f"v{time.time_ns()}"
+        version_dir = os.path.join(persist_dir, version)
+        os.makedirs(version_dir)
+        with open(os.path.join(version_dir, EMBEDDINGS_FILE), "wb") as f:
+            np.save(f, np.ascontiguousarray(embeddings, dtype=np.float32))
+        with open(os.path.join(version_dir, RECORDS_FILE), "w") as f:
+            json.dump(self._records, f)
+
+        pointer_tmp = os.path.join(persist_dir, CURRENT_FILE + ".tmp")
+        with open(pointer_tmp, "w") as f:
+            f.write(version)
+        os.replace(pointer_tmp, os.path.join(persist_dir, CURRENT_FILE))
+
+        # Versions are named by creation time, so the oldest sort first
+        versions = sorted(name for name in os.listdir(persist_dir) if name.startswith("v") and name[1:].isdigit())
+        for name in versions[:-KEEP_VERSIONS]:
+            shutil.rmtree(os.path.join(persist_dir, name), ignore_errors=True)
+        for name in (EMBEDDINGS_FILE, RECORDS_FILE):
+            # Files from before versioning are superseded
+            if os.path.exists(os.path.join(persist_dir, name)):
+                os.remove(os.path.join(persist_dir, name))
+        logger.info(f"Persisted local vector store to {version_dir} ({len(self._records)} vectors)")
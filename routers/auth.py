@@ -3,12 +3,15 @@ from datetime import timedelta
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
 
-from config.database import get_session
+from config.database import get_async_session
 from dependencies.error import httpError
+from dependencies.metrics import Histogram, traced_stage
 from dependencies.auth import (
     check_userSignupSchema,
     create_access_token,
@@ -28,10 +31,16 @@ token_expiration = int(os.getenv("JWT_TOKEN_EXPIRY_MINUTES", 24 * 60))
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+AUTH_STAGE_SECONDS = Histogram(
+    "auth_stage_seconds",
+    "Time spent authenticating a request, by stage (jwt_decode, user_lookup)",
+    labelnames=("stage",),
+)
+
 
-def get_current_user(
+async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
 ) -> User:
     """
     Dependency to get the current authenticated user from the JWT token.
@@ -43,7 +52,8 @@ def get_current_user(
     )
     try:
         # Decode the JWT token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with traced_stage(AUTH_STAGE_SECONDS, "jwt_decode"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: int = payload.get("userId")
         if user_id is None:
             raise credentials_exception
@@ -51,22 +61,26 @@ def get_current_user(
         raise credentials_exception
 
     # Fetch the user from the database
-    user = db.query(User).filter(User.id == user_id).first()
+    with traced_stage(AUTH_STAGE_SECONDS, "user_lookup"):
+        user = await db.get(User, user_id)
     if user is None:
         raise credentials_exception
     return user
 
 
+# bcrypt hashing is CPU-bound, so signup and login run it in the threadpool; the
+# async session keeps their DB I/O off the event loop
 @router.post("/auth/signup", status_code=201)
-async def user_signup(userSchema: UserSignupSchema, db: Session = Depends(get_session)):
+async def user_signup(userSchema: UserSignupSchema, db: AsyncSession = Depends(get_async_session)):
     """Endpoint for user registration"""
     try:
         userDict: dict[str, str] = userSchema.model_dump()
-        check_userSignupSchema(userDict, db)
-        userDict["password"] = hash_password(userDict["password"])
-        user = User(**userDict)
-        user.save(db)
-        newUser: User = db.query(User).filter(User.email == userDict["email"]).first()  # type: ignore
+        await check_userSignupSchema(userDict, db)
+        userDict["password"] = await run_in_threadpool(hash_password, userDict["password"])
+        newUser = User(**userDict)
+        db.add(newUser)
+        await db.commit()
+        await db.refresh(newUser)
         newUserDict: dict[str, str | bool] = newUser.__dict__
         del newUserDict["password"]
         return {
@@ -84,14 +98,16 @@ async def user_signup(userSchema: UserSignupSchema, db: Session = Depends(get_se
 @router.post("/auth/login", status_code=200, response_model=loginResponseSchema)
 async def user_login(
     userSchema: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
 ):
     """Endpoint for user login"""
     try:
-        user = db.query(User).filter(User.email == userSchema.username).first()
+        user = (await db.execute(select(User).where(User.email == userSchema.username))).scalars().first()
         if not user:
             raise httpError(status_code=404, detail="User with email provided not found")
-        if not verify_password(userSchema.password, hashed=str(user.password)):
+        # Hand the connection back to the pool instead of holding it through the bcrypt check
+        await db.close()
+        if not await run_in_threadpool(verify_password, userSchema.password, hashed=str(user.password)):
             raise httpError(status_code=401, detail="Invalid password")
         token = create_access_token(
             {"userEmail": userSchema.username, "userId": user.id},  # The user email will be passed as the username because the Oauth class only allows us to use the username and password parameters
@@ -1,53 +1,127 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from datetime import datetime, timezone
-from collections import deque
-from typing import Any, List
-
-from models.schema import ChatbotRequest, ChatbotResponse
-from config.database import get_session
-from models.models import ChatbotInteraction, User
-from rag.query_engine import get_query_engine
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import logging
+import os
+import time
+from fastapi import APIRouter, HTTPException, Depends, Header, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import Any, List, Optional
+
+from models.schema import ChatbotRequest, ChatbotResponse, utc_isoformat
+from config.database import AsyncSessionLocal, get_async_session
+from dependencies.metrics import Histogram, traced_stage
+from models.models import ChatbotInteraction, User, utc_now
+from rag.cache import get_answer_cache
+from rag.filters import filters_key, filters_scope, resolve_filters
+from rag.memory import Turn, count_tokens, get_conversation_memory
+from rag.query_engine import aquery_with_filters, get_index, get_query_engine, get_streaming_query_engine
 from routers.auth import get_current_user
 
 router = APIRouter()
+logger = logging.getLogger("chatbot")
+
+TIME_TO_FIRST_TOKEN = Histogram(
+    "chatbot_time_to_first_token_seconds",
+    "Time from receiving a streaming chat request to sending its first token",
+)
+CHATBOT_STAGE_SECONDS = Histogram(
+    "chatbot_stage_seconds",
+    "Time spent in each stage of a /chatbot/ request (history, condense, cache_lookup, query, cache_store, commit)",
+    labelnames=("stage",),
+)
+CHATBOT_TOKENS = Histogram(
+    "chatbot_tokens",
+    "Tokens per chat request, by kind (question, response)",
+    labelnames=("kind",),
+    buckets=(16, 32, 64, 128, 256, 512, 1024, 2048),
+)
 
 MAX_HISTORY = 5  # Maximum conversation history
+HISTORY_PAGE_SIZE = 20  # Default interactions per /chatbot/history/ page
+MAX_HISTORY_PAGE_SIZE = 100
+HISTORY_FIELDS = ("id", "user_input", "response", "timestamp")
+MAX_CONCURRENT_QUERIES = int(os.getenv("MAX_CONCURRENT_QUERIES", 8))  # Upper bound on in-flight RAG queries per worker
 
-prompt = """
-You are Mark Musk, a GenAI developer assistant bot designed to assist software engineers in integrating REST API products efficiently. You provide guidance and generate sample code in various programming languages, including Python, Node.js (or NestJS), PHP Laravel, and GoLang, among others. Your goal is to help developers integrate APIs 10 times faster.
+# Limits how many LLM/vector-store round-trips a single worker runs at once so a
+# burst of chat traffic queues here instead of exhausting the Groq/Pinecone clients
+query_semaphore = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
 
-When a developer asks about integrating a specific REST API, follow these steps:
+async def load_history(db: AsyncSession, user_id: str):
+    """
+    Returns the user's recent turns (oldest first) and any turn that has just
+    dropped out of the MAX_HISTORY window and should be folded into the summary
+    """
+    rows = (await db.execute(
+        select(ChatbotInteraction).where(
+            ChatbotInteraction.user_id == user_id
+        ).order_by(ChatbotInteraction.timestamp.desc()).limit(MAX_HISTORY + 1)
+    )).scalars().all()
+    turns = [Turn(row.user_input, row.response, row.timestamp) for row in reversed(rows)]
+    return turns[-MAX_HISTORY:], turns[:-MAX_HISTORY]
 
-1. **Understand the API**: Analyze the API's functionality and its endpoints.
+async def condense(memory, user_id: str, question: str, recent: list) -> str:
+    """Condenses a follow-up question, holding a query slot only when that calls the LLM"""
+    if not memory.needs_condensing(user_id, question, recent):
+        return question
+    async with query_semaphore:
+        return await memory.condense_question(user_id, question, recent)
 
-2. **Identify the Programming Language**: Determine the developer's preferred programming language. If not specified, ask for it.
+def record_chat_tokens(question: str, response: str):
+    CHATBOT_TOKENS.observe(count_tokens(question), kind="question")
+    CHATBOT_TOKENS.observe(count_tokens(response), kind="response")
 
-3. **Provide Integration Steps**: Outline the necessary steps to integrate the API in the chosen language.
+# Token counts still running in the threadpool, referenced until they finish
+pending_token_counts: set = set()
 
-4. **Generate Sample Code**: Provide a complete, functional code snippet demonstrating the integration.
+def token_count_done(future: asyncio.Future):
+    pending_token_counts.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Error recording chat token counts: {str(future.exception())}", exc_info=future.exception())
 
-5. **Offer Additional Assistance**: Ask if the developer needs further help or clarification.
+def schedule_token_count(question: str, response: str):
+    """Counts tokens in the threadpool; tokenizing costs ~0.5us per token, so the response never waits on it"""
+    future = asyncio.get_running_loop().run_in_executor(None, record_chat_tokens, question, response)
+    pending_token_counts.add(future)
+    future.add_done_callback(token_count_done)
 
-Ensure that your responses are clear, concise, and tailored to the developer's needs.
-"""
+def retrieval_filters(query: ChatbotRequest, question: str) -> tuple:
+    """Country/service filters for retrieval: explicit request fields, else inferred from the question"""
+    try:
+        return filters_key(resolve_filters(question, query.country, query.service))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # POST endpoint: expects a JSON body conforming to ChatbotRequest
 @router.post("/chatbot/", response_model=None)
 async def chatbot_post(
     query: ChatbotRequest,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user),
-    query_engine=Depends(get_query_engine)
+    query_engine=Depends(get_query_engine),
+    index=Depends(get_index),
+    answer_cache=Depends(get_answer_cache),
+    memory=Depends(get_conversation_memory)
 )-> Any:
     """
     API endpoint for the chatbot via POST.
 
     Request (JSON body):
     {
-        "user_input": "What CreditChek?"
+        "user_input": "What CreditChek?",
+        "country": "nigeria",   (optional)
+        "service": "identity"   (optional)
     }
 
+    When country/service are omitted they are inferred from the question where it
+    is unambiguous, and retrieval only searches the matching chunks.
+
     Response:
     {
         "user_input": "What CreditChek?",
@@ -59,29 +133,53 @@ async def chatbot_post(
     if not user_input:
         raise HTTPException(status_code=400, detail="User input cannot be empty")
 
-    # Retrieve user's past conversation history
-    past_messages = db.query(ChatbotInteraction).filter(
-        ChatbotInteraction.user_id == current_user.id
-    ).order_by(ChatbotInteraction.timestamp.desc()).limit(MAX_HISTORY).all()
+    # Retrieve user's past conversation history, then end the read transaction so the
+    # pooled connection is not held while the question is answered
+    with traced_stage(CHATBOT_STAGE_SECONDS, "history"):
+        recent, expired = await load_history(db, current_user.id)
+        await db.commit()
+
+    # Follow-ups are rewritten into a standalone question from the budgeted history,
+    # so retrieval and the answer cache only ever see a short, self-contained query.
+    # Self-contained questions skip the LLM call and go straight to the cache
+    with traced_stage(CHATBOT_STAGE_SECONDS, "condense"):
+        standalone_question = await condense(memory, current_user.id, user_input, recent)
+    filters = retrieval_filters(query, standalone_question)
+    scope = filters_scope(filters)
 
-    history = deque(maxlen=MAX_HISTORY)
-    for msg in reversed(past_messages):
-        history.append(msg.user_input)
-        history.append(msg.response)
+    # Serve repeated questions from the answer cache before paying for retrieval and the LLM.
+    # The lookup embeds the question, so its time is the query embedding time
+    with traced_stage(CHATBOT_STAGE_SECONDS, "cache_lookup"):
+        cache_version = answer_cache.index_version if answer_cache else None
+        cached_response, query_embedding = await answer_cache.lookup(standalone_question, scope) if answer_cache else (None, None)
+    if cached_response is not None:
+        response: str = cached_response
+    else:
+        # Generate chatbot response using the async query API so the event loop stays free.
+        # rag_query_stage_seconds breaks this down into retrieve/rerank/pack/synthesize
+        with traced_stage(CHATBOT_STAGE_SECONDS, "query"):
+            async with query_semaphore:
+                bot_response = await aquery_with_filters(
+                    query_engine, index, standalone_question, filters, embedding=query_embedding
+                )
+        response = bot_response.response
+        schedule_token_count(standalone_question, response)
+        if answer_cache:
+            with traced_stage(CHATBOT_STAGE_SECONDS, "cache_store"):
+                await answer_cache.store(standalone_question, response, query_embedding, scope, cache_version)
 
-    # Generate chatbot response using the query engine
-    bot_response = query_engine.query(prompt + user_input)
-    response: str = bot_response.response
+    memory.schedule_fold(current_user.id, expired)
 
     # Save interaction to the database
     chat_record = ChatbotInteraction(
         user_id=current_user.id,
         user_input=user_input,
-        response=bot_response.response,
-        timestamp=datetime.now(timezone.utc)
+        response=response,
+        timestamp=utc_now()
     )
     db.add(chat_record)
-    db.commit()
+    with traced_stage(CHATBOT_STAGE_SECONDS, "commit"):
+        await db.commit()
 
     return ChatbotResponse(
         user_input=user_input,
@@ -90,14 +188,225 @@ async def chatbot_post(
     )
 
 
+def encode_cursor(timestamp: datetime, interaction_id: str) -> str:
+    """Opaque history cursor for the (timestamp, id) position of an interaction"""
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{interaction_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        timestamp, interaction_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(timestamp), interaction_id
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid history cursor")
+
+def parse_history_fields(fields: str | None) -> list:
+    """Requested history fields; id and timestamp are always included since cursors need them"""
+    if fields is None:
+        return list(HISTORY_FIELDS)
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(HISTORY_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown history fields: {', '.join(sorted(unknown))}")
+    return [field for field in HISTORY_FIELDS if field in requested | {"id", "timestamp"}]
+
+async def history_page_keys(db: AsyncSession, user_id: str, limit: int, before: tuple | None, after: tuple | None):
+    """
+    (id, timestamp) of one page of the user's history, oldest first, and whether more
+    rows lie beyond it. Seeks on (timestamp, id) so the cost does not grow with history.
+    """
+    position = tuple_(ChatbotInteraction.timestamp, ChatbotInteraction.id)
+    query = select(ChatbotInteraction.id, ChatbotInteraction.timestamp).where(ChatbotInteraction.user_id == user_id)
+    if after is not None:
+        query = query.where(position > tuple_(*after)).order_by(ChatbotInteraction.timestamp.asc(), ChatbotInteraction.id.asc())
+    else:
+        if before is not None:
+            query = query.where(position < tuple_(*before))
+        query = query.order_by(ChatbotInteraction.timestamp.desc(), ChatbotInteraction.id.desc())
+    keys = list((await db.execute(query.limit(limit + 1))).all())
+    has_more = len(keys) > limit
+    keys = keys[:limit]
+    if after is None:
+        keys.reverse()
+    return keys, has_more
+
+async def load_history_rows(db: AsyncSession, keys: list, fields: list) -> list:
+    """Loads only the requested columns of the interactions in keys, in keys order"""
+    if not keys:
+        return []
+    rows = (await db.execute(select(*(getattr(ChatbotInteraction, field) for field in fields)).where(
+        ChatbotInteraction.id.in_([key.id for key in keys])
+    ))).all()
+    by_id = {row.id: row._asdict() for row in rows}
+    return [by_id[key.id] for key in keys]
+
+def history_etag(keys: list, fields: list, has_more: bool) -> str:
+    """Interactions are never edited, so a page is identified by its keys and projection"""
+    digest = hashlib.sha1(",".join(fields).encode())
+    digest.update(str(has_more).encode())
+    for key in keys:
+        digest.update(f"|{key.timestamp.isoformat()}|{key.id}".encode())
+    return f'"{digest.hexdigest()}"'
+
 @router.get("/chatbot/history/", response_model=None)
 async def get_chat_history(
-    db: Session = Depends(get_session),
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=MAX_HISTORY_PAGE_SIZE),
+    before: Optional[str] = Query(None, description="Cursor: return interactions older than this one"),
+    after: Optional[str] = Query(None, description="Cursor: return interactions newer than this one"),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of id,user_input,response,timestamp"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 )-> Any:
-    chat_history = db.query(ChatbotInteraction).filter(
-        ChatbotInteraction.user_id == current_user.id
-    ).order_by(ChatbotInteraction.timestamp.asc()).all()
+    """
+    One page of the user's chat history, oldest first.
+
+    Without cursors the latest `limit` interactions are returned. Pass `before` to page
+    back through older interactions and `after` to fetch only newer ones. `fields`
+    projects the items, e.g. `fields=user_input,timestamp` leaves out response bodies.
+
+    Response:
+    {
+        "items": [{"id": "...", "user_input": "...", "response": "...", "timestamp": "2024-01-29T12:34:56"}],
+        "has_more": true,      (more interactions exist beyond this page in the requested direction)
+        "before": "<cursor>",  (cursor of the first item, to request older interactions)
+        "after": "<cursor>"    (cursor of the last item, to request newer interactions)
+    }
 
-    return chat_history
+    The ETag header identifies the page; sending it back in If-None-Match returns 304
+    without loading any interaction bodies when nothing changed.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Pass either before or after, not both")
+    field_list = parse_history_fields(fields)
+    before_key = decode_cursor(before) if before else None
+    after_key = decode_cursor(after) if after else None
+
+    keys, has_more = await history_page_keys(db, current_user.id, limit, before_key, after_key)
+    etag = history_etag(keys, field_list, has_more)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
 
+    items = await load_history_rows(db, keys, field_list)
+    page = {
+        "items": items,
+        "has_more": has_more,
+        "before": encode_cursor(keys[0].timestamp, keys[0].id) if keys else before,
+        "after": encode_cursor(keys[-1].timestamp, keys[-1].id) if keys else after,
+    }
+    return JSONResponse(jsonable_encoder(page), headers=headers)
+
+
+
+async def save_interaction(user_id: str, user_input: str, response: str, timestamp: datetime):
+    """Persists a finished chat interaction using a fresh session"""
+    async with AsyncSessionLocal() as db:
+        db.add(ChatbotInteraction(
+            user_id=user_id,
+            user_input=user_input,
+            response=response,
+            timestamp=timestamp
+        ))
+        await db.commit()
+
+
+def sse_event(data: dict, event: str | None = None) -> str:
+    """Formats a server-sent event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+# POST endpoint: same body as /chatbot/, but the answer is streamed as server-sent events
+@router.post("/chatbot/stream", response_model=None)
+async def chatbot_stream(
+    query: ChatbotRequest,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+    query_engine=Depends(get_streaming_query_engine),
+    index=Depends(get_index),
+    answer_cache=Depends(get_answer_cache),
+    memory=Depends(get_conversation_memory)
+) -> StreamingResponse:
+    """
+    Streaming variant of the chatbot endpoint.
+
+    Emits one `data: {"token": "..."}` event per generated chunk, followed by
+    `event: done` carrying the full interaction once it has been saved:
+
+    event: done
+    data: {"user_input": "...", "response": "...", "timestamp": "2024-01-29T12:34:56Z"}
+    """
+    user_input = query.user_input.strip()
+    if not user_input:
+        raise HTTPException(status_code=400, detail="User input cannot be empty")
+
+    # Reject unknown explicit filters before the response starts streaming
+    retrieval_filters(query, user_input)
+
+    # The request-scoped session is closed before the body streams, so keep only the id
+    user_id = current_user.id
+    start = time.perf_counter()
+    recent, expired = await load_history(db, user_id)
+
+    async def event_stream():
+        tokens: List[str] = []
+        try:
+            standalone_question = await condense(memory, user_id, user_input, recent)
+            filters = retrieval_filters(query, standalone_question)
+            scope = filters_scope(filters)
+            cache_version = answer_cache.index_version if answer_cache else None
+            cached_response, query_embedding = await answer_cache.lookup(standalone_question, scope) if answer_cache else (None, None)
+            if cached_response is not None:
+                # A cached answer is sent as a single token
+                TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - start)
+                tokens.append(cached_response)
+                yield sse_event({"token": cached_response})
+            else:
+                # Generation runs in its own task and holds the query slot only until the
+                # LLM is done, so a slow client reading the stream does not keep it
+                generated: asyncio.Queue = asyncio.Queue()
+
+                async def generate():
+                    try:
+                        async with query_semaphore:
+                            streaming_response = await aquery_with_filters(
+                                query_engine, index, standalone_question, filters, streaming=True,
+                                embedding=query_embedding,
+                            )
+                            async for token in streaming_response.async_response_gen():
+                                generated.put_nowait(token)
+                    finally:
+                        generated.put_nowait(None)
+
+                generation = asyncio.create_task(generate())
+                try:
+                    while (token := await generated.get()) is not None:
+                        if not tokens:
+                            TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - start)
+                        tokens.append(token)
+                        yield sse_event({"token": token})
+                    # Raises if generation failed
+                    await generation
+                finally:
+                    # The client disconnected: stop generating
+                    generation.cancel()
+
+            response = "".join(tokens)
+            if answer_cache and cached_response is None:
+                await answer_cache.store(standalone_question, response, query_embedding, scope, cache_version)
+            memory.schedule_fold(user_id, expired)
+            timestamp = utc_now()
+            await save_interaction(user_id, user_input, response, timestamp)
+            yield sse_event(
+                {"user_input": user_input, "response": response, "timestamp": utc_isoformat(timestamp)},
+                event="done"
+            )
+        except Exception as e:
+            logger.error(f"Error while streaming chat response: {str(e)}", exc_info=True)
+            yield sse_event({"detail": "Error generating response"}, event="error")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
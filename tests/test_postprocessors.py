@@ -0,0 +1,20 @@
+import json
+
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from rag.memory import count_tokens
+from rag.postprocessors import ContextPackingPostprocessor
+
+
+def test_oversized_code_block_is_truncated_not_dropped():
+    payload = json.dumps({"data": [{"field": f"value_{i}", "status": "verified"} for i in range(200)]}, indent=2)
+    text = f"## Verify BVN response\n\n```json\n{payload}\n```"
+    node = NodeWithScore(node=TextNode(text=text, metadata={"url": "https://docs.example.com/bvn"}), score=1.0)
+    packer = ContextPackingPostprocessor(token_budget=256)
+    assert count_tokens(payload) > packer.token_budget
+
+    packed, used = packer.pack([node], QueryBundle("What does the verify BVN response contain?"))
+
+    assert len(packed) == 1
+    assert packed[0].node.get_content().startswith("## Verify BVN response")
+    assert 0 < used <= packer.token_budget